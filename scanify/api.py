@@ -3,6 +3,7 @@ import json
 from frappe import _
 from frappe.utils import flt, nowdate, add_months, get_first_day
 from scanify.permissions import require_process, require
+from scanify.report_cache import cached_report
 import requests
 import os
 import base64
@@ -976,16 +977,8 @@ def get_stockist_code_map(pks):
     reports must show the human-facing Stockist Code. Falls back to the id when a stockist
     has no code set so nothing renders blank.
     """
-    pks = [p for p in set(pks or []) if p]
-    if not pks:
-        return {}
-    rows = frappe.get_all(
-        "Stockist Master",
-        filters={"name": ["in", pks]},
-        fields=["name", "stockist_code"],
-        limit_page_length=0,
-    )
-    return {r.name: (r.stockist_code or r.name) for r in rows}
+    from scanify import master_dict
+    return master_dict.resolve("Stockist Master", [p for p in pks or [] if p])
 
 
 def get_product_code_map(pks):
@@ -995,16 +988,8 @@ def get_product_code_map(pks):
     id, but screens, reports, and exports must show the human-facing Product Code.
     Falls back to the id when a product has no code set (or for legacy rows where
     the id IS the code) so nothing renders blank."""
-    pks = [p for p in set(pks or []) if p]
-    if not pks:
-        return {}
-    rows = frappe.get_all(
-        "Product Master",
-        filters={"name": ["in", pks]},
-        fields=["name", "product_code"],
-        limit_page_length=0,
-    )
-    return {r.name: (r.product_code or r.name) for r in rows}
+    from scanify import master_dict
+    return master_dict.resolve("Product Master", [p for p in pks or [] if p])
 
 
 def _apply_product_display_codes(rows, *keys):
@@ -2011,7 +1996,7 @@ def get_bulk_jobs_list(division=None):
     try:
         user_division = division
         if not user_division:
-            user_division = frappe.db.get_value("User", frappe.session.user, "division") or "Prima"
+            user_division = get_user_division()
 
         filters = {"docstatus": ["in", [0, 1]]}
         if user_division:
@@ -2045,7 +2030,7 @@ def create_bulk_ocr_job(statement_month, zip_file_url, division=None, job_name=N
     """
     try:
         if not division:
-            division = frappe.db.get_value("User", frappe.session.user, "division") or "Prima"
+            division = get_user_division()
 
         # A non-admin may only restrict to a region they're mapped to. When they pick
         # none, extraction still confines matching to their regions (see
@@ -2217,6 +2202,7 @@ def process_bulk_extraction(docname, month, zip_file_url):
         
         # Get ZIP file
         from frappe.utils.file_manager import get_file_path
+        from scanify.statement_unique import insert_statement
         file_path = get_file_path(zip_file_url)
         
         if not os.path.exists(file_path):
@@ -2320,6 +2306,12 @@ def process_bulk_extraction(docname, month, zip_file_url):
             except Exception as map_err:
                 frappe.logger().warning(f"Gemini batch mapping failed, using fuzzy fallback: {map_err}")
 
+            # Previous-month closings for every stockist the batch mapping found, in one
+            # batch. Files matched only by the fuzzy fallback below load their own.
+            from scanify.statement_chain import load_previous_closings, month_start
+            prev_closings = load_previous_closings(
+                [(code, month) for code in set(gemini_mapping.values()) if code])
+
             for idx, (file, file_full_path, file_ext) in enumerate(all_files, 1):
                 try:
                     # Identify stockist - Gemini mapping first, fuzzy fallback
@@ -2346,12 +2338,6 @@ def process_bulk_extraction(docname, month, zip_file_url):
                         frappe.db.commit()
                         continue
                     
-                    # Check if already exists
-                    existing = frappe.db.exists("Stockist Statement", {
-                        "stockist_code": stockist_code,
-                        "statement_month": month
-                    })
-                    
                     # Resolve stockist name for display
                     stockist_name, stockist_status = frappe.db.get_value(
                         "Stockist Master", stockist_code, ["stockist_name", "status"]
@@ -2376,6 +2362,15 @@ def process_bulk_extraction(docname, month, zip_file_url):
                         frappe.db.commit()
                         continue
 
+                    # Create the statement first: the unique key rejects a month that
+                    # is already taken before the file is stored or extracted.
+                    statement, existing = insert_statement(frappe.get_doc({
+                        "doctype": "Stockist Statement",
+                        "stockist_code": stockist_code,
+                        "statement_month": month,
+                        "extracted_data_status": "Pending"
+                    }), ignore_permissions=True)
+
                     if existing:
                         results.append({
                             "file": file,
@@ -2394,26 +2389,9 @@ def process_bulk_extraction(docname, month, zip_file_url):
                         frappe.db.commit()
                         continue
                     
-                    # Create statement
-                    statement_name = f"TEMP-{frappe.generate_hash(length=8)}"
-                    
-                    # Save file
-                    from frappe.utils.file_manager import save_file_on_filesystem
-                    file_doc = save_file_to_public(file, file_full_path, "Stockist Statement", statement_name)
-                    
-                    # Create statement doc
-                    statement = frappe.get_doc({
-                        "doctype": "Stockist Statement",
-                        "stockist_code": stockist_code,
-                        "statement_month": month,
-                        "uploaded_file": file_doc.file_url,
-                        "extracted_data_status": "Pending"
-                    })
-                    statement.insert(ignore_permissions=True)
-                    
-                    # Update file attachment
-                    file_doc.attached_to_name = statement.name
-                    file_doc.save(ignore_permissions=True)
+                    # Save file and attach it to the statement
+                    file_doc = save_file_to_public(file, file_full_path, "Stockist Statement", statement.name)
+                    statement.db_set("uploaded_file", file_doc.file_url, update_modified=False)
                     
                     # Extract data using enhanced method (reuse already-configured client)
                     extracted_data = call_gemini_extraction_with_catalog(
@@ -2450,7 +2428,8 @@ def process_bulk_extraction(docname, month, zip_file_url):
                         statement.extracted_data_status = "Failed"
                         statement.extraction_notes = "No data extracted from file"
                     
-                    statement.populate_previous_month_closing()
+                    statement.populate_previous_month_closing(
+                        prev_closings.get((stockist_code, month_start(month))))
                     statement.calculate_closing_and_totals()
                     statement.calculate_qc_confidence()
                     statement.save(ignore_permissions=True)
@@ -2532,6 +2511,7 @@ def bulk_extract_statements(month, zip_file_url):
 
         # Get ZIP file
         from frappe.utils.file_manager import get_file_path
+        from scanify.statement_unique import insert_statement
         file_path = get_file_path(zip_file_url)
 
         if not os.path.exists(file_path):
@@ -2545,7 +2525,24 @@ def bulk_extract_statements(month, zip_file_url):
             
             # Process each file
             results = []
-            
+
+            # Identify every file's stockist up front (scoped to the active division so
+            # a filename only matches stockists in that division), so the previous-month
+            # closings for the whole ZIP load in one batch rather than per statement.
+            supported_extensions = ['.pdf', '.jpg', '.jpeg', '.png', '.csv', '.txt', '.xls', '.xlsx']
+            identified = {}
+            for root, dirs, files in os.walk(temp_dir):
+                for file in files:
+                    if file.startswith('.') or file.startswith('__MACOSX') or file == 'Thumbs.db':
+                        continue
+                    if os.path.splitext(file)[1].lower() in supported_extensions:
+                        identified[os.path.join(root, file)] = identify_stockist_from_filename(
+                            file, division=_bulk_division)
+
+            from scanify.statement_chain import load_previous_closings, month_start
+            prev_closings = load_previous_closings(
+                [(code, month) for code in set(identified.values()) if code])
+
             for root, dirs, files in os.walk(temp_dir):
                 for file in files:
                     # Skip hidden/system files
@@ -2556,7 +2553,6 @@ def bulk_extract_statements(month, zip_file_url):
                     file_ext = os.path.splitext(file)[1].lower()
                     
                     # Skip unsupported files
-                    supported_extensions = ['.pdf', '.jpg', '.jpeg', '.png', '.csv', '.txt', '.xls', '.xlsx']
                     if file_ext not in supported_extensions:
                         results.append({
                             "file": file,
@@ -2565,9 +2561,7 @@ def bulk_extract_statements(month, zip_file_url):
                         })
                         continue
                     
-                    # Try to identify stockist (scoped to the active division so a
-                    # filename only matches stockists in that division)
-                    stockist_code = identify_stockist_from_filename(file, division=_bulk_division)
+                    stockist_code = identified.get(file_full_path)
 
                     if not stockist_code:
                         results.append({
@@ -2578,11 +2572,14 @@ def bulk_extract_statements(month, zip_file_url):
                         continue
                     
                     try:
-                        # Check if statement already exists
-                        existing = frappe.db.exists("Stockist Statement", {
+                        # Create the statement first (insert-or-detect on the unique
+                        # stockist + month key), then store the file against it.
+                        statement, existing = insert_statement(frappe.get_doc({
+                            "doctype": "Stockist Statement",
                             "stockist_code": stockist_code,
-                            "statement_month": month
-                        })
+                            "statement_month": month,
+                            "extracted_data_status": "Pending"
+                        }), ignore_permissions=True)
                         
                         if existing:
                             results.append({
@@ -2593,26 +2590,8 @@ def bulk_extract_statements(month, zip_file_url):
                             })
                             continue
                         
-                        # Create statement document (WITHOUT saving yet - to get name)
-                        statement_name = f"TEMP-{frappe.generate_hash(length=8)}"
-                        
-                        # Copy file to public folder first
-                        file_doc = save_file_to_public(file, file_full_path, "Stockist Statement", statement_name)
-                        
-                        # Now create the actual statement
-                        statement = frappe.get_doc({
-                            "doctype": "Stockist Statement",
-                            "stockist_code": stockist_code,
-                            "statement_month": month,
-                            "uploaded_file": file_doc.file_url,
-                            "extracted_data_status": "Pending"
-                        })
-                        
-                        statement.insert(ignore_permissions=True)
-                        
-                        # Update file attachment to correct docname
-                        file_doc.attached_to_name = statement.name
-                        file_doc.save(ignore_permissions=True)
+                        file_doc = save_file_to_public(file, file_full_path, "Stockist Statement", statement.name)
+                        statement.db_set("uploaded_file", file_doc.file_url, update_modified=False)
                         
                         # Extract data using the active Gemini extraction path
                         sync_api_key, sync_model_name, _ = get_gemini_settings()
@@ -2651,7 +2630,8 @@ def bulk_extract_statements(month, zip_file_url):
                             statement.extracted_data_status = "Failed"
                             statement.extraction_notes = "No data extracted from file"
                         
-                        statement.populate_previous_month_closing()
+                        statement.populate_previous_month_closing(
+                            prev_closings.get((stockist_code, month_start(month)), {}))
                         statement.calculate_closing_and_totals()
                         statement.save(ignore_permissions=True)
                         
@@ -3015,30 +2995,22 @@ def save_file_to_public(filename, file_path, doctype, docname):
 def fetch_previous_month_closing(stockist_code, current_month):
     """Fetch previous month's closing balance to set as opening balance"""
     try:
-        from dateutil.relativedelta import relativedelta
-
         if not stockist_code or not current_month:
             return []
 
-        current_date = frappe.utils.getdate(current_month)
-        previous_month = current_date - relativedelta(months=1)
-        previous_month_first = get_first_day(previous_month)
+        from scanify.statement_chain import load_previous_statement_items, month_start
 
-        # Find previous month's statement
-        prev_statement = frappe.db.get_value("Stockist Statement", {
-            "stockist_code": stockist_code,
-            "statement_month": previous_month_first,
-            "docstatus": 1
-        }, "name")
+        # Previous month's submitted statement items (same loader the batch paths use)
+        prev_items = load_previous_statement_items(
+            [(stockist_code, current_month)],
+            fields=("parent", "product_code", "product_name", "pack", "closing_qty", "pts", "closing_value"),
+        ).get((stockist_code, month_start(current_month)))
 
-        if not prev_statement:
+        if not prev_items:
             frappe.msgprint("No previous month statement found", indicator='orange')
             return []
-
-        # Get items from previous statement
-        prev_items = frappe.get_all("Stockist Statement Item",
-            filters={"parent": prev_statement},
-            fields=["product_code", "product_name", "pack", "closing_qty", "pts", "closing_value"])
+        for it in prev_items:
+            it.pop("parent", None)
 
         # Items link by the Product Master id; the statement view matches these
         # rows against the display business codes, so remap before returning.
@@ -3050,6 +3022,81 @@ def fetch_previous_month_closing(stockist_code, current_month):
         frappe.log_error(frappe.get_traceback(), "Fetch Previous Month Error")
         return []
 
+
+@frappe.whitelist()
+@require_process("secondary_admin")
+def start_opening_chain_repair(from_month, stockist_codes=None, division=None, dry_run=0):
+    """Queue a month-chain repair: after `from_month` was corrected, carry every later
+    month's opening forward from the previous month's closing for the given stockists
+    (editable codes or ids; JSON list or comma/newline separated — blank = the whole
+    division). Runs scanify.statement_chain in the background and records a change
+    report on an Opening Chain Repair record, which get_opening_chain_repair_status polls."""
+    from frappe.utils import cint
+
+    if not division:
+        division = _effective_division()
+    if not from_month:
+        return {"success": False, "message": "Corrected month is required."}
+    from_month = str(from_month)[:7] + "-01"
+
+    codes = []
+    if stockist_codes:
+        if isinstance(stockist_codes, str):
+            try:
+                codes = json.loads(stockist_codes)
+            except Exception:
+                codes = re.split(r"[,\n]", stockist_codes)
+        else:
+            codes = list(stockist_codes)
+    pks, unknown = [], []
+    for code in [str(c).strip() for c in codes if str(c).strip()]:
+        pk = _resolve_stockist_pk(code, division)
+        (pks if pk else unknown).append(pk or code)
+    if unknown:
+        return {"success": False, "message": f"Stockist(s) not found in {division}: {', '.join(unknown[:10])}"}
+
+    doc = frappe.get_doc({
+        "doctype": "Opening Chain Repair",
+        "division": division,
+        "from_month": from_month,
+        "dry_run": 1 if cint(dry_run) else 0,
+        "stockist_codes": "\n".join(pks),
+        "requested_by": frappe.session.user,
+        "requested_on": frappe.utils.now(),
+        "status": "Queued",
+    })
+    doc.insert(ignore_permissions=True)
+    frappe.db.commit()
+
+    job = enqueue(
+        method="scanify.statement_chain.run_opening_chain_repair",
+        queue="long",
+        timeout=3600,
+        job_name=f"opening_chain_{doc.name}",
+        docname=doc.name,
+    )
+    frappe.db.set_value("Opening Chain Repair", doc.name, "job_id", job.id if job else None)
+    frappe.db.commit()
+    return {"success": True, "name": doc.name,
+            "message": f"Opening chain repair queued ({doc.name})."}
+
+
+@frappe.whitelist()
+@require_process("secondary_admin")
+def get_opening_chain_repair_status(name):
+    """Live status + change report for an Opening Chain Repair record."""
+    row = frappe.db.get_value(
+        "Opening Chain Repair", name,
+        ["name", "status", "progress", "division", "from_month", "dry_run",
+         "stockists_scanned", "statements_scanned", "statements_updated",
+         "items_updated", "report"],
+        as_dict=True,
+    )
+    if not row:
+        return {"success": False, "message": "Repair record not found"}
+    row["from_month"] = str(row.get("from_month") or "")
+    return {"success": True, "data": row}
+
 @frappe.whitelist()
 def reroute_scheme_request(doc_name, comments):
     try:
@@ -3827,53 +3874,19 @@ def search_stockists(search_term, team=None):
 
 @frappe.whitelist()
 def get_dashboard_data():
-    """Get dashboard KPI data with null safety"""
+    """Get dashboard KPI data with null safety (from the cached KPI snapshot of all
+    divisions; see scanify.kpi_snapshot)"""
     try:
-        # Total stockists
-        total_stockists = frappe.db.count("Stockist Master", {"status": "Active"}) or 0
-
-        # Total schemes this month
-        from frappe.utils import get_first_day, get_last_day, today
-        first_day = get_first_day(today())
-        last_day = get_last_day(today())
-
-        total_schemes = frappe.db.count("Scheme Request", {
-            "application_date": ["between", [first_day, last_day]]
-        }) or 0
-
-        pending_schemes = frappe.db.count("Scheme Request", {
-            "approval_status": "Pending",
-            "application_date": ["between", [first_day, last_day]]
-        }) or 0
-
-        approved_schemes = frappe.db.count("Scheme Request", {
-            "approval_status": "Approved",
-            "application_date": ["between", [first_day, last_day]]
-        }) or 0
-
-        # Total scheme value this month
-        result = frappe.db.sql("""
-            SELECT COALESCE(SUM(total_scheme_value), 0) as total
-            FROM `tabScheme Request`
-            WHERE application_date BETWEEN %s AND %s
-            AND approval_status = 'Approved'
-        """, (first_day, last_day), as_dict=True)
-
-        total_scheme_value = flt(result[0].total) if result and result[0] else 0
-
-        # Statements processed this month
-        statements_processed = frappe.db.count("Stockist Statement", {
-            "statement_month": ["between", [first_day, last_day]],
-            "docstatus": 1
-        }) or 0
+        from scanify import kpi_snapshot
+        kpis = kpi_snapshot.dashboard()
 
         return {
-            "total_stockists": total_stockists,
-            "total_schemes": total_schemes,
-            "pending_schemes": pending_schemes,
-            "approved_schemes": approved_schemes,
-            "total_scheme_value": total_scheme_value,
-            "statements_processed": statements_processed
+            "total_stockists": kpis["active_stockists"],
+            "total_schemes": kpis["month_schemes"],
+            "pending_schemes": kpis["month_pending_schemes"],
+            "approved_schemes": kpis["month_approved_schemes"],
+            "total_scheme_value": kpis["month_approved_value"],
+            "statements_processed": kpis["month_submitted_statements"]
         }
     except Exception as e:
         frappe.log_error(frappe.get_traceback(), "Get Dashboard Data Error")
@@ -4404,25 +4417,17 @@ def set_user_division(division):
 @frappe.whitelist()
 def get_user_division():
     """Get user's current division with proper fallback logic"""
-    
+    from scanify.permissions import get_default_division
+
     # Priority 1: Check session first (for current page load)
     if hasattr(frappe.session, "user_division") and frappe.session.user_division:
         return frappe.session.user_division
-    
-    # Priority 2: Check User document (persistent storage)
-    try:
-        user_doc = frappe.get_doc("User", frappe.session.user)
-        if hasattr(user_doc, "division") and user_doc.division:
-            # Sync to session
-            frappe.session.user_division = user_doc.division
-            return user_doc.division
-    except:
-        pass
-    
-    # Default: Prima
-    default_division = "Prima"
-    frappe.session.user_division = default_division
-    return default_division
+
+    # Priority 2: User.division, read through the cached portal scope (one field,
+    # cleared on User update) rather than loading the whole User document
+    division = get_default_division() or "Prima"
+    frappe.session.user_division = division
+    return division
 
 
 @frappe.whitelist()
@@ -8923,6 +8928,60 @@ def get_audit_trail_detail(event_id=None, version_name=None):
         return {"success": False, "message": str(e)}
 
 
+@frappe.whitelist()
+@require_process("audit")
+def get_db_index_usage():
+    """Hot-path index health for the admin DB Indexes page: every secondary index on
+    the report tables (with usage counters when userstat is on), curated indexes still
+    missing, and the EXPLAIN plan of each representative report query."""
+    from scanify import db_indexes
+    try:
+        usage = db_indexes.index_usage()
+        return {
+            "success": True,
+            "indexes": usage["indexes"],
+            "missing": usage["missing"],
+            "userstat": usage["userstat"],
+            "plans": db_indexes.explain_hot_paths(),
+        }
+    except Exception as e:
+        frappe.log_error(frappe.get_traceback(), "DB Index Usage Error")
+        return {"success": False, "message": str(e)}
+
+
+@frappe.whitelist()
+@require_process("audit")
+def create_missing_db_indexes():
+    """Create the curated hot-path indexes that are not there yet."""
+    from scanify import db_indexes
+    try:
+        created = db_indexes.ensure_indexes()
+        return {"success": True, "created": created}
+    except Exception as e:
+        frappe.log_error(frappe.get_traceback(), "DB Index Create Error")
+        return {"success": False, "message": str(e)}
+
+
+@frappe.whitelist()
+@require_process("audit")
+def get_report_cache_stats():
+    """Per-report hit / miss counts and hit rate of the report result cache."""
+    from scanify import report_cache
+    return {"success": True, "reports": report_cache.stats()}
+
+
+@frappe.whitelist()
+@require_process("audit")
+def clear_report_cache(reset_stats=0):
+    """Drop every cached report result (and, with reset_stats, the counters)."""
+    from frappe.utils import cint
+    from scanify import report_cache
+    report_cache.bump()
+    if cint(reset_stats):
+        report_cache.reset_stats()
+    return {"success": True}
+
+
 # =============================================================================
 # EXPORT MASTERS
 # =============================================================================
@@ -9022,81 +9081,43 @@ def _fetch_export_data(config, division):
     return data
 
 
-def _generate_excel(config, data, division):
-    """Generate a professional Excel file for a master."""
-    import openpyxl
-    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-    from openpyxl.utils import get_column_letter
+def _generate_excel(config, data, division, target=None):
+    """Generate a professional Excel file for a master; saved to `target` (a path or
+    file object), or returned as bytes."""
+    from scanify.xlsx_stream import XlsxStream
 
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = config["title"]
+    ncols = len(config["headers"])
+    # Column widths from the headers and the first 100 rows
+    widths = []
+    for col_idx, col_key in enumerate(config["columns"]):
+        max_len = len(config["headers"][col_idx])
+        for row in data[:100]:
+            max_len = max(max_len, len(str(row.get(col_key, "") or "")))
+        widths.append(min(max_len + 4, 40))
+
+    book = XlsxStream()
+    sheet = book.sheet(config["title"], widths=widths)
 
     # Company header
-    ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=len(config["headers"]))
-    ws["A1"] = "Stedman Pharmaceuticals Pvt Ltd"
-    ws["A1"].font = Font(bold=True, size=14, color="1e293b")
-    ws["A1"].alignment = Alignment(horizontal="center")
-
-    ws.merge_cells(start_row=2, start_column=1, end_row=2, end_column=len(config["headers"]))
-    ws["A2"] = config["title"]
-    ws["A2"].font = Font(bold=True, size=12, color="4f46e5")
-    ws["A2"].alignment = Alignment(horizontal="center")
-
-    ws.merge_cells(start_row=3, start_column=1, end_row=3, end_column=len(config["headers"]))
-    ws["A3"] = f"Division: {division or 'All'}  |  Exported: {frappe.utils.now_datetime().strftime('%d %b %Y, %I:%M %p')}"
-    ws["A3"].font = Font(size=10, color="64748b")
-    ws["A3"].alignment = Alignment(horizontal="center")
-
-    # Column headers at row 5
-    header_fill = PatternFill(start_color="1e293b", end_color="1e293b", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF", size=10)
-    header_align = Alignment(horizontal="center", vertical="center", wrap_text=True)
-    thin_border = Border(
-        left=Side(style="thin", color="d1d5db"),
-        right=Side(style="thin", color="d1d5db"),
-        top=Side(style="thin", color="d1d5db"),
-        bottom=Side(style="thin", color="d1d5db"),
+    banner_rows = sheet.title(
+        "Stedman Pharmaceuticals Pvt Ltd", config["title"],
+        f"Division: {division or 'All'}  |  Exported: {frappe.utils.now_datetime().strftime('%d %b %Y, %I:%M %p')}",
+        title_style="company", subtitle_style="heading", note_style="banner_note", gap=0,
     )
+    for row_num in banner_rows:
+        sheet.merge(1, ncols, row_num)
+    sheet.blank()
 
-    for col_idx, header in enumerate(config["headers"], 1):
-        cell = ws.cell(row=5, column=col_idx)
-        cell.value = header
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_align
-        cell.border = thin_border
-
-    # Data rows starting at row 6
-    alt_fill = PatternFill(start_color="f8fafc", end_color="f8fafc", fill_type="solid")
-    data_align = Alignment(vertical="center", wrap_text=True)
-
-    for row_idx, row in enumerate(data):
-        excel_row = row_idx + 6
-        for col_idx, col_key in enumerate(config["columns"], 1):
-            cell = ws.cell(row=excel_row, column=col_idx)
-            cell.value = row.get(col_key, "")
-            cell.alignment = data_align
-            cell.border = thin_border
-            if row_idx % 2 == 1:
-                cell.fill = alt_fill
-
-    # Auto-fit column widths
-    for col_idx, col_key in enumerate(config["columns"], 1):
-        max_len = len(config["headers"][col_idx - 1])
-        for row in data[:100]:  # Sample first 100 rows
-            val = str(row.get(col_key, "") or "")
-            if len(val) > max_len:
-                max_len = len(val)
-        ws.column_dimensions[get_column_letter(col_idx)].width = min(max_len + 4, 40)
+    # Column headers at row 5, data rows from row 6
+    sheet.header(config["headers"], style="header_dark")
+    count = sheet.rows(data, template=config["columns"], style="cell_wrap", alt_style="cell_wrap_alt")
 
     # Footer
-    footer_row = len(data) + 7
-    ws.merge_cells(start_row=footer_row, start_column=1, end_row=footer_row, end_column=len(config["headers"]))
-    ws.cell(row=footer_row, column=1).value = f"Total Records: {len(data)}"
-    ws.cell(row=footer_row, column=1).font = Font(bold=True, size=10, color="64748b")
+    sheet.blank()
+    sheet.row([f"Total Records: {count}"], style="footer")
+    sheet.merge(1, ncols, sheet.row_count)
 
-    return wb
+    return book.save(target)
 
 
 def _generate_csv_content(config, data):
@@ -9114,187 +9135,188 @@ def _generate_csv_content(config, data):
     return output.getvalue()
 
 
-def _generate_pdf_html(config, data, division):
-    """Generate professional HTML for PDF conversion via wkhtmltopdf."""
+def _generate_pdf(config, data, division, progress=None, workers=None):
+    """Render a master export as PDF through the chunked, parallel pipeline
+    (scanify.pdf_chunks), on at most `workers` wkhtmltopdf processes when given."""
+    from scanify import pdf_chunks
+
     export_date = frappe.utils.now_datetime().strftime("%d %b %Y, %I:%M %p")
-    num_cols = len(config["headers"])
-
-    # Build table rows
-    rows_html = ""
-    for idx, row in enumerate(data):
-        bg = "#f8fafc" if idx % 2 == 1 else "#ffffff"
-        rows_html += f'<tr style="background:{bg};">'
-        for col in config["columns"]:
-            val = row.get(col, "") or ""
-            rows_html += f'<td style="padding:6px 8px;border:1px solid #e2e8f0;font-size:9px;">{val}</td>'
-        rows_html += "</tr>"
-
-    # Build header cells
-    header_cells = ""
-    for h in config["headers"]:
-        header_cells += f'<th style="padding:8px;border:1px solid #334155;background:#1e293b;color:#fff;font-size:9px;text-align:center;">{h}</th>'
-
-    html = f"""
-    <html>
-    <head>
-        <meta charset="utf-8">
-        <style>
-            @page {{
-                size: {"landscape" if num_cols > 6 else "portrait"};
-                margin: 15mm;
-            }}
-            body {{
-                font-family: 'Inter', 'Helvetica Neue', Arial, sans-serif;
-                color: #1e293b;
-                margin: 0;
-            }}
-            .header {{
-                text-align: center;
-                margin-bottom: 20px;
-                border-bottom: 2px solid #4f46e5;
-                padding-bottom: 12px;
-            }}
-            .header h1 {{
-                font-size: 18px;
-                margin: 0;
-                color: #1e293b;
-            }}
-            .header h2 {{
-                font-size: 14px;
-                margin: 4px 0;
-                color: #4f46e5;
-                font-weight: 600;
-            }}
-            .header p {{
-                font-size: 10px;
-                color: #64748b;
-                margin: 4px 0 0 0;
-            }}
-            table {{
-                width: 100%;
-                border-collapse: collapse;
-                margin-top: 10px;
-            }}
-            .footer {{
-                text-align: center;
-                margin-top: 15px;
-                font-size: 9px;
-                color: #94a3b8;
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <h1>Stedman Pharmaceuticals Pvt Ltd</h1>
-            <h2>{config["title"]}</h2>
-            <p>Division: {division or "All"}  &bull;  Exported: {export_date}  &bull;  Total Records: {len(data)}</p>
-        </div>
-        <table>
-            <thead><tr>{header_cells}</tr></thead>
-            <tbody>{rows_html}</tbody>
-        </table>
-        <div class="footer">
-            &copy; {frappe.utils.now_datetime().year} Stedman Pharmaceuticals Pvt Ltd &bull; Generated by Scanify
-        </div>
-    </body>
-    </html>
-    """
-    return html
+    return pdf_chunks.render_table(
+        title=config["title"],
+        headers=config["headers"],
+        rows=([row.get(col, "") or "" for col in config["columns"]] for row in data),
+        subtitle=(f"Division: {division or 'All'}  &bull;  Exported: {export_date}"
+                  f"  &bull;  Total Records: {len(data)}"),
+        landscape=len(config["headers"]) > 6,
+        progress=progress,
+        workers=workers,
+    )
 
 
 @frappe.whitelist()
+@require_process("masters")
 def export_master_data(master_type, format_type="xlsx", division=None):
-    """Export a single master to Excel, CSV, or PDF."""
-    try:
-        if master_type not in _EXPORT_MASTER_CONFIGS:
-            return {"success": False, "message": f"Unknown master type: {master_type}"}
+    """Queue a single master export to Excel, CSV, or PDF (an Export Job; see
+    scanify.export_jobs)."""
+    from scanify import export_jobs
 
-        config = _EXPORT_MASTER_CONFIGS[master_type]
-        data = _fetch_export_data(config, division)
+    if master_type not in _EXPORT_MASTER_CONFIGS:
+        return {"success": False, "message": f"Unknown master type: {master_type}"}
+    if format_type not in ("xlsx", "csv", "pdf"):
+        return {"success": False, "message": f"Unsupported format: {format_type}"}
+    return export_jobs.start("master", master_type=master_type, format_type=format_type,
+                             division=division)
 
-        timestamp = frappe.utils.now_datetime().strftime("%Y%m%d_%H%M%S")
-        safe_title = config["title"].replace(" ", "_")
 
-        files_dir = frappe.get_site_path("public", "files")
-        os.makedirs(files_dir, exist_ok=True)
+def build_master_export(master_type, format_type="xlsx", division=None, progress=None):
+    """Export job builder: a single master as Excel, CSV, or PDF."""
+    config = _EXPORT_MASTER_CONFIGS[master_type]
+    data = _fetch_export_data(config, division)
 
-        if format_type == "xlsx":
-            wb = _generate_excel(config, data, division)
-            filename = f"{safe_title}_{timestamp}.xlsx"
-            wb.save(os.path.join(files_dir, filename))
-
-        elif format_type == "csv":
-            csv_content = _generate_csv_content(config, data)
-            filename = f"{safe_title}_{timestamp}.csv"
-            with open(os.path.join(files_dir, filename), "w", encoding="utf-8-sig") as f:
-                f.write(csv_content)
-
-        elif format_type == "pdf":
-            html = _generate_pdf_html(config, data, division)
-            from frappe.utils.pdf import get_pdf
-            pdf_content = get_pdf(html)
-            filename = f"{safe_title}_{timestamp}.pdf"
-            with open(os.path.join(files_dir, filename), "wb") as f:
-                f.write(pdf_content)
+    timestamp = frappe.utils.now_datetime().strftime("%Y%m%d_%H%M%S")
+    safe_title = config["title"].replace(" ", "_")
 
-        else:
-            return {"success": False, "message": f"Unsupported format: {format_type}"}
+    if format_type == "xlsx":
+        with tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False) as tmp:
+            _generate_excel(config, data, division, tmp.name)
+        return f"{safe_title}_{timestamp}.xlsx", tmp.name
 
-        return {
-            "success": True,
-            "message": f"{config['title']} exported successfully",
-            "file_url": f"/files/{filename}",
-        }
+    elif format_type == "csv":
+        return f"{safe_title}_{timestamp}.csv", _generate_csv_content(config, data)
 
-    except Exception as e:
-        frappe.log_error(frappe.get_traceback(), "Export Master Data Error")
-        return {"success": False, "message": str(e)}
+    return f"{safe_title}_{timestamp}.pdf", _generate_pdf(config, data, division, progress)
 
 
 @frappe.whitelist()
-def export_all_masters_zip(format_type="xlsx", division=None):
-    """Export all masters into individual files and bundle them in a ZIP."""
+@require_process("masters")
+def export_all_masters_zip(format_type="xlsx", division=None, parallel=1):
+    """Queue an export of all masters bundled in a ZIP (an Export Job; see
+    scanify.export_jobs). parallel=0 builds the masters one after another."""
+    from frappe.utils import cint
+
+    from scanify import export_jobs
+
+    if format_type not in ("xlsx", "csv", "pdf"):
+        return {"success": False, "message": f"Unsupported format: {format_type}"}
+    return export_jobs.start("all_masters", format_type=format_type, division=division,
+                             parallel=cint(parallel))
+
+
+def _write_master_file(config, data, division, format_type, pdf_workers=None):
+    """Write one master export to a temp file; returns its path."""
+    with tempfile.NamedTemporaryFile(suffix=f".{format_type}", delete=False) as tmp:
+        path = tmp.name
+    if format_type == "xlsx":
+        _generate_excel(config, data, division, path)
+    elif format_type == "csv":
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(_generate_csv_content(config, data))
+    else:
+        with open(path, "wb") as f:
+            f.write(_generate_pdf(config, data, division, workers=pdf_workers))
+    return path
+
+
+def _build_master_file(master_key, format_type, division, site=None, sites_path=None,
+                       user=None, pdf_workers=None):
+    """Build one master's export file. Given a `site`, runs on its own Frappe
+    connection (a worker process of a parallel all-masters export).
+
+    Returns (master_key, temp path, row count, seconds)."""
+    started = time.monotonic()
+    if site:
+        frappe.init(site=site, sites_path=sites_path)
+        frappe.connect()
+        frappe.set_user(user)
     try:
-        import zipfile
-        import tempfile
-
-        timestamp = frappe.utils.now_datetime().strftime("%Y%m%d_%H%M%S")
-        zip_filename = f"All_Masters_{timestamp}.zip"
-        files_dir = frappe.get_site_path("public", "files")
-        os.makedirs(files_dir, exist_ok=True)
-        zip_filepath = os.path.join(files_dir, zip_filename)
-
-        with zipfile.ZipFile(zip_filepath, "w", zipfile.ZIP_DEFLATED) as zf:
-            for master_key, config in _EXPORT_MASTER_CONFIGS.items():
-                data = _fetch_export_data(config, division)
-                safe_title = config["title"].replace(" ", "_")
-
-                if format_type == "xlsx":
-                    wb = _generate_excel(config, data, division)
-                    with tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False) as tmp:
-                        wb.save(tmp.name)
-                        zf.write(tmp.name, f"{safe_title}.xlsx")
-                        os.unlink(tmp.name)
-
-                elif format_type == "csv":
-                    csv_content = _generate_csv_content(config, data)
-                    zf.writestr(f"{safe_title}.csv", csv_content)
-
-                elif format_type == "pdf":
-                    html = _generate_pdf_html(config, data, division)
-                    from frappe.utils.pdf import get_pdf
-                    pdf_content = get_pdf(html)
-                    zf.writestr(f"{safe_title}.pdf", pdf_content)
+        config = _EXPORT_MASTER_CONFIGS[master_key]
+        data = _fetch_export_data(config, division)
+        path = _write_master_file(config, data, division, format_type, pdf_workers)
+        return master_key, path, len(data), round(time.monotonic() - started, 2)
+    finally:
+        if site:
+            frappe.destroy()
+
+
+def build_all_masters_export(format_type="xlsx", division=None, parallel=1, progress=None):
+    """Export job builder: all masters into individual files bundled in a ZIP.
+
+    In parallel mode every master is built in a spawned worker process with its own
+    Frappe connection — the Excel and CSV writers are pure Python, so threads would
+    share one core — and each file goes into the ZIP as soon as it is finished, so the
+    export takes about as long as its slowest master. The PDF renderers are split
+    between the masters instead of each master starting one per CPU. The details
+    carry per-master timings.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    from frappe.utils import cint
+
+    timestamp = frappe.utils.now_datetime().strftime("%Y%m%d_%H%M%S")
+    with tempfile.NamedTemporaryFile(suffix=".zip", delete=False) as zip_tmp:
+        zip_filepath = zip_tmp.name
+
+    masters = list(_EXPORT_MASTER_CONFIGS)
+    timings = {}
+    started = time.monotonic()
+
+    def _add(zf, result):
+        master_key, path, count, seconds = result
+        safe_title = _EXPORT_MASTER_CONFIGS[master_key]["title"].replace(" ", "_")
+        zf.write(path, f"{safe_title}.{format_type}")
+        os.unlink(path)
+        timings[master_key] = {"rows": count, "seconds": seconds}
+        if progress:
+            progress(100 * len(timings) / len(masters))
+
+    with zipfile.ZipFile(zip_filepath, "w", zipfile.ZIP_DEFLATED) as zf:
+        if cint(parallel):
+            workers = min(len(masters), frappe.conf.get("export_workers") or os.cpu_count() or 1)
+            renderers = frappe.conf.get("pdf_render_workers") or os.cpu_count() or 1
+            # spawn, not fork: a forked child would inherit the job's DB connection
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                futures = [pool.submit(_build_master_file, key, format_type, division,
+                                       frappe.local.site, frappe.local.sites_path,
+                                       frappe.session.user, max(1, renderers // workers))
+                           for key in masters]
+                # Written from the job only, as each master finishes
+                for future in as_completed(futures):
+                    _add(zf, future.result())
+        else:
+            for key in masters:
+                _add(zf, _build_master_file(key, format_type, division))
 
-        return {
-            "success": True,
-            "message": "All masters exported successfully",
-            "file_url": f"/files/{zip_filename}",
-        }
+    details = {
+        "parallel": bool(cint(parallel)),
+        "seconds": round(time.monotonic() - started, 2),
+        "masters": {key: timings[key] for key in masters},
+    }
+    return f"All_Masters_{timestamp}.zip", zip_filepath, details
 
-    except Exception as e:
-        frappe.log_error(frappe.get_traceback(), "Export All Masters ZIP Error")
-        return {"success": False, "message": str(e)}
+
+# ===================== EXPORT JOBS =====================
+
+@frappe.whitelist()
+def get_export_job(name):
+    """Status of one of the session user's export jobs (polled by the portal)."""
+    from scanify import export_jobs
+    return export_jobs.status(name)
+
+
+@frappe.whitelist()
+def download_export(name):
+    """Download the file of a completed export job."""
+    from scanify import export_jobs
+    return export_jobs.download(name)
+
+
+@frappe.whitelist()
+def get_my_exports(limit=20):
+    """The session user's recent export jobs."""
+    from scanify import export_jobs
+    return export_jobs.recent(limit)
 
 
 # ===================== DELETE STATEMENT APIs =====================
@@ -9302,6 +9324,8 @@ def export_all_masters_zip(format_type="xlsx", division=None):
 @frappe.whitelist()
 def search_stockist_statements(search_term="", division=None):
     """Search stockist statements by stockist name, code or statement name"""
+    from scanify import search_index
+
     if not division:
         division = get_user_division()
 
@@ -9326,18 +9350,22 @@ def search_stockist_statements(search_term="", division=None):
             params[f"scp{i}"] = pk
         code_clause = f" OR ss.stockist_code IN ({ph})"
 
+    like_clause = "ss.stockist_name LIKE %(term)s OR ss.stockist_code LIKE %(term)s OR ss.name LIKE %(term)s"
+    indexed = search_index.match_condition("Stockist Statement", "s", search_term, params, "ss.name")
+    if indexed:
+        like_clause = f"({indexed} AND ({like_clause}))"
+
     results = frappe.db.sql("""
         SELECT ss.name, ss.stockist_code, ss.stockist_name, ss.statement_month,
                ss.hq, ss.region, ss.docstatus, ss.division
         FROM `tabStockist Statement` ss
-        WHERE (ss.stockist_name LIKE %(term)s
-               OR ss.stockist_code LIKE %(term)s
-               OR ss.name LIKE %(term)s
+        WHERE ({like_clause}
                {code_clause})
         {division_clause}
         ORDER BY ss.modified DESC
         LIMIT 20
-    """.format(division_clause=division_clause, code_clause=code_clause), params, as_dict=True)
+    """.format(division_clause=division_clause, code_clause=code_clause, like_clause=like_clause),
+        params, as_dict=True)
 
     # Display the human-facing code instead of the internal id.
     code_map = get_stockist_code_map([r["stockist_code"] for r in results])
@@ -9827,7 +9855,8 @@ def check_statement_exists(stockist_code, statement_month, division=None):
 
     existing = frappe.db.exists("Stockist Statement", {
         "stockist_code": stockist_pk,
-        "statement_month": statement_month
+        "statement_month": statement_month,
+        "docstatus": ["<", 2],
     })
 
     if existing:
@@ -9875,12 +9904,7 @@ def create_ocr_statement(stockist_code, statement_month, uploaded_file=None, div
         if len(statement_month) == 7:
             statement_month = statement_month + "-01"
 
-        existing = frappe.db.exists("Stockist Statement", {
-            "stockist_code": stockist_pk,
-            "statement_month": statement_month,
-        })
-        if existing:
-            return {"success": False, "message": f"A statement already exists: {existing}"}
+        from scanify.statement_unique import insert_statement
 
         doc = frappe.new_doc("Stockist Statement")
         doc.stockist_code = stockist_pk
@@ -9889,7 +9913,10 @@ def create_ocr_statement(stockist_code, statement_month, uploaded_file=None, div
         if uploaded_file:
             doc.uploaded_file = uploaded_file
         doc.extracted_data_status = "Pending"
-        doc.insert(ignore_permissions=True)
+        # Insert-or-detect: the unique key reports a month that is already taken.
+        doc, existing = insert_statement(doc, ignore_permissions=True)
+        if existing:
+            return {"success": False, "message": f"A statement already exists: {existing}"}
 
         return {"success": True, "name": doc.name}
     except Exception as e:
@@ -9964,28 +9991,67 @@ def _parse_num(val):
         return 0
 
 
+# Rows per multi-row INSERT (and commit) in run_primary_sales_upload.
+_PRIMARY_INSERT_BATCH = 2000
+
+
+def _primary_upload_job_id(upload_name):
+    # Stable RQ job id per upload — enqueue(deduplicate=True) then refuses a second
+    # copy of the same upload while the first is queued or running.
+    return f"primary_sales_upload::{upload_name}"
+
+
+def _resolve_upload_file_path(file_url):
+    file_path = frappe.get_site_path(file_url.lstrip("/"))
+    if not os.path.exists(file_path):
+        # Try with 'private' prefix
+        file_path = frappe.get_site_path("private", "files", os.path.basename(file_url))
+    return file_path if os.path.exists(file_path) else None
+
+
+def _enqueue_primary_sales_upload(upload_name):
+    """Commit the upload record, then queue its job: a free worker may start at once
+    and must find the record."""
+    job_id = _primary_upload_job_id(upload_name)
+    frappe.db.set_value("Primary Sales Upload", upload_name, "job_id", job_id)
+    frappe.db.commit()
+    enqueue(
+        method="scanify.api.run_primary_sales_upload",
+        queue="long",
+        timeout=7200,
+        job_name=f"primary_upload_{upload_name}",
+        job_id=job_id,
+        deduplicate=True,
+        upload_name=upload_name,
+    )
+
+
 @frappe.whitelist()
 @require_process("primary_upload")
-def process_primary_sales_upload(upload_month, file_url):
+def process_primary_sales_upload(upload_month, file_url, mode="insert", delete_missing=0):
     """
-    Process an uploaded Excel file of primary sales data.
-    Validates columns, maps to masters, and creates Primary Sales Data records.
+    Queue an uploaded Excel file of primary sales data for processing.
+
+    Creates the Primary Sales Upload record (which doubles as the job document) and
+    enqueues run_primary_sales_upload; the browser polls
+    get_primary_sales_upload_status or listens for `primary_sales_upload_progress`.
+
+    mode="upsert" re-uploads a corrected month without deleting it first: rows are
+    matched on invoice no + product code + batch no within the division and month,
+    new ones inserted, changed ones (by content hash) updated, identical ones left
+    alone and — with delete_missing=1 — rows absent from the file removed.
     """
-    import openpyxl
-    from datetime import datetime
+    from frappe.utils import cint
 
     user_division = get_user_division() or "Prima"
 
     # Validate month format (YYYY-MM)
     if not upload_month or not re.match(r"^\d{4}-\d{2}$", str(upload_month)):
         return {"success": False, "error": "Invalid month format. Use YYYY-MM."}
+    if mode not in ("insert", "upsert"):
+        return {"success": False, "error": "Invalid mode. Use 'insert' or 'upsert'."}
 
-    # Get the file path
-    file_path = frappe.get_site_path(file_url.lstrip("/"))
-    if not os.path.exists(file_path):
-        # Try with 'private' prefix
-        file_path = frappe.get_site_path("private", "files", os.path.basename(file_url))
-    if not os.path.exists(file_path):
+    if not _resolve_upload_file_path(file_url):
         return {"success": False, "error": "Uploaded file not found on server."}
 
     # Create upload record
@@ -9996,18 +10062,133 @@ def process_primary_sales_upload(upload_month, file_url):
         "uploaded_by": frappe.session.user,
         "upload_date": frappe.utils.now(),
         "file": file_url,
-        "status": "Processing",
+        "status": "Queued",
+        "upload_mode": mode.title(),
+        "delete_missing": cint(delete_missing) if mode == "upsert" else 0,
     })
     upload_doc.insert(ignore_permissions=True)
-    frappe.db.commit()
+    _enqueue_primary_sales_upload(upload_doc.name)
+
+    return {"success": True, "queued": True, "upload_name": upload_doc.name}
+
+
+@frappe.whitelist()
+@require_process("primary_upload")
+def resume_primary_sales_upload(name):
+    """Re-queue an upload whose job died (worker restart, timeout). The job skips every
+    row up to the last committed batch, so nothing is loaded twice."""
+    from frappe.utils.background_jobs import is_job_enqueued
+
+    upload = frappe.db.get_value("Primary Sales Upload", name,
+                                 ["name", "division", "status"], as_dict=True)
+    if not upload:
+        return {"success": False, "error": "Upload record not found"}
+    if upload.division != (get_user_division() or "Prima") and "System Manager" not in frappe.get_roles():
+        return {"success": False, "error": "Not permitted for this division"}
+    if upload.status == "Completed":
+        return {"success": False, "error": "This upload has already completed."}
+    if is_job_enqueued(_primary_upload_job_id(name)):
+        return {"success": False, "error": "This upload is already queued or running."}
+
+    frappe.db.set_value("Primary Sales Upload", name, "status", "Queued")
+    _enqueue_primary_sales_upload(name)
+    return {"success": True, "queued": True, "upload_name": name}
+
 
-    errors = []
-    success_count = 0
+@frappe.whitelist()
+@require_process("primary_upload")
+def get_primary_sales_upload_status(name):
+    """Counters, current batch and ETA of a primary upload job — cheap enough to poll."""
+    row = frappe.db.get_value(
+        "Primary Sales Upload", name,
+        ["name", "upload_month", "division", "status", "progress", "expected_rows",
+         "total_rows", "success_count", "error_count", "current_batch",
+         "last_committed_row", "started_on", "eta", "error_log", "upload_mode",
+         "inserted_count", "updated_count", "unchanged_count", "deleted_count"],
+        as_dict=True,
+    )
+    if not row:
+        return {"success": False, "error": "Upload record not found"}
+    if row.division != (get_user_division() or "Prima") and "System Manager" not in frappe.get_roles():
+        return {"success": False, "error": "Not permitted for this division"}
+    errors = (row.pop("error_log") or "").splitlines()
+    row["errors"] = errors[:20]
+    row["error_lines"] = len(errors)
+    row["last_error"] = errors[-1] if row.status == "Failed" and errors else None
+    for key in ("started_on", "eta"):
+        row[key] = str(row[key]) if row.get(key) else None
+    return {"success": True, "data": row}
+
+
+def run_primary_sales_upload(upload_name):
+    """
+    Background job: validate the file's rows against masters and create Primary Sales
+    Data records.
+
+    Rows are validated once against the cached masters and written through
+    scanify.primary_sales_bulk in multi-row INSERTs of _PRIMARY_INSERT_BATCH rows. Each
+    batch commits together with the job document's counters (last committed row,
+    success count, error log), so a restarted job resumes after the last committed
+    batch instead of loading rows twice. A batch the database rejects is retried row by
+    row so the error report still points at the offending rows.
+
+    In Upsert mode the month's existing key index is loaded once; matched rows with an
+    unchanged row_hash are skipped, changed ones rewritten in place, and leftovers
+    deleted at the end when delete_missing is set.
+    """
+    import openpyxl
+    from datetime import datetime, timedelta
+    from frappe.utils import cint, now_datetime
+    from scanify import primary_rollup, primary_sales_bulk, report_cache
+    from scanify.primary_sales_query import invalidate_counts
+
+    upload_doc = frappe.get_doc("Primary Sales Upload", upload_name)
+    if upload_doc.status == "Completed":
+        return
+    upload_month = upload_doc.upload_month
+    user_division = upload_doc.division
+    notify_user = upload_doc.uploaded_by or frappe.session.user
+
+    # Resume point — everything up to this sheet row is already committed
+    resume_after = cint(upload_doc.last_committed_row)
+    errors = (upload_doc.error_log or "").splitlines() if resume_after else []
+    success_count = cint(upload_doc.success_count) if resume_after else 0
+    current_batch = cint(upload_doc.current_batch) if resume_after else 0
+    counts = {f: (cint(upload_doc.get(f)) if resume_after else 0)
+              for f in ("inserted_count", "updated_count", "unchanged_count", "deleted_count")}
+    upsert = upload_doc.upload_mode == "Upsert"
     total_rows = 0
 
+    upload_doc.status = "Processing"
+    if not resume_after:
+        upload_doc.started_on = now_datetime()
+    upload_doc.save(ignore_permissions=True)
+    frappe.db.commit()
+    run_started = now_datetime()
+    rows_this_run = 0
+    # Invoice months already loaded under this upload month — an upsert can move or
+    # delete their rows, so their rollup is refreshed too.
+    rollup_months = primary_rollup.months_of(user_division, upload_month)
+
+    def _fail(message):
+        upload_doc.reload()
+        upload_doc.status = "Failed"
+        upload_doc.error_log = "\n".join(errors + [message])[:140000]
+        upload_doc.save(ignore_permissions=True)
+        frappe.db.commit()
+        frappe.publish_realtime("primary_sales_upload_progress",
+                                {"upload_name": upload_name, "status": "Failed", "error": message},
+                                user=notify_user)
+
+    file_path = _resolve_upload_file_path(upload_doc.file or "")
+    if not file_path:
+        _fail("Uploaded file not found on server.")
+        return
+
     try:
         wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
         ws = wb.active
+        expected_rows = max((ws.max_row or 1) - 1, 0)
 
         # Read headers from row 1
         raw_headers = [cell.value for cell in ws[1]]
@@ -10024,11 +10205,9 @@ def process_primary_sales_upload(upload_month, file_url):
         found_cols = set(h for h in headers if h)
         missing = required_cols - found_cols
         if missing:
-            upload_doc.status = "Failed"
-            upload_doc.error_log = f"Missing required columns: {', '.join(missing)}"
-            upload_doc.save(ignore_permissions=True)
-            frappe.db.commit()
-            return {"success": False, "error": f"Missing required columns: {', '.join(missing)}"}
+            wb.close()
+            _fail(f"Missing required columns: {', '.join(missing)}")
+            return
 
         # Build caches for stockist resolution.
         # Primary match key: the editable Stockist Code; fallback: Stockist Name.
@@ -10057,8 +10236,74 @@ def process_primary_sales_upload(upload_month, file_url):
                 product_cache[p.product_code] = p.name
 
         # Process rows
-        batch_size = 100
-        batch = []
+        columns = primary_sales_bulk.insert_columns()
+        name_pos = [f for f, _df in columns].index("name")
+        hash_pos = [f for f, _df in columns].index("row_hash")
+        user, timestamp = upload_doc.uploaded_by or frappe.session.user, frappe.utils.now()
+        batch = []      # [(row_idx, values, is_update)]
+        # Upsert: natural key -> [(name, row_hash)] still unmatched by the file
+        existing = primary_sales_bulk.load_existing_keys(user_division, upload_month) if upsert else {}
+
+        def _checkpoint(last_row, status="Processing"):
+            # Written in the same transaction as the batch it follows
+            elapsed = (now_datetime() - run_started).total_seconds()
+            remaining = max(expected_rows - total_rows, 0)
+            eta = None
+            if rows_this_run and remaining:
+                eta = now_datetime() + timedelta(seconds=elapsed / rows_this_run * remaining)
+            progress = min(100.0, 100.0 * total_rows / expected_rows) if expected_rows else 0
+            state = {
+                "status": status,
+                "last_committed_row": last_row,
+                "current_batch": current_batch,
+                "expected_rows": expected_rows,
+                "total_rows": total_rows,
+                "success_count": success_count,
+                "error_count": len([e for e in errors if "not found" not in e]),
+                "error_log": "\n".join(errors)[:140000],
+                **counts,
+                "progress": 100 if status == "Completed" else progress,
+                "eta": eta,
+            }
+            frappe.db.set_value("Primary Sales Upload", upload_name, state, update_modified=True)
+            frappe.db.commit()
+            invalidate_counts()
+            report_cache.bump()
+            frappe.publish_realtime(
+                "primary_sales_upload_progress",
+                dict({k: v for k, v in state.items() if k != "error_log"},
+                     upload_name=upload_name, eta=str(eta) if eta else None),
+                user=notify_user,
+            )
+
+        def _write(rows, is_update):
+            write = primary_sales_bulk.upsert_rows if is_update else primary_sales_bulk.insert_rows
+            written = write(columns, rows)
+            counts["updated_count" if is_update else "inserted_count"] += written
+            return written
+
+        def _flush(batch):
+            nonlocal current_batch
+            current_batch += 1
+            before = dict(counts)
+            try:
+                return (_write([v for _idx, v, upd in batch if not upd], False)
+                        + _write([v for _idx, v, upd in batch if upd], True))
+            except Exception as e:
+                frappe.db.rollback()
+                counts.update(before)
+                errors.append(f"Rows {batch[0][0]}-{batch[-1][0]}: batch insert failed ({e}); retrying row by row")
+            # Savepoints rather than commits, so the good rows still land together
+            # with the checkpoint that follows.
+            written = 0
+            for row_idx, values, is_update in batch:
+                try:
+                    frappe.db.savepoint("primary_sales_row")
+                    written += _write([values], is_update)
+                except Exception as e:
+                    frappe.db.rollback(save_point="primary_sales_row")
+                    errors.append(f"Row {row_idx}: {e}")
+            return written
 
         for row_idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
             # Skip completely empty rows
@@ -10066,6 +10311,8 @@ def process_primary_sales_upload(upload_month, file_url):
                 continue
 
             total_rows += 1
+            if row_idx <= resume_after and not upsert:
+                continue    # committed by an earlier run of this job
             row_data = {}
 
             for col_idx, val in enumerate(row):
@@ -10088,6 +10335,16 @@ def process_primary_sales_upload(upload_month, file_url):
                     else:
                         row_data[field_name] = str(val).strip() if val else ""
 
+            # Upsert: claim the stored row for this key first (repeated keys pair up in
+            # file order), so it is never treated as missing from the file.
+            match = None
+            if upsert:
+                stored = existing.get(primary_sales_bulk.natural_key(row_data))
+                match = stored.pop(0) if stored else None
+            if row_idx <= resume_after:
+                continue    # committed by an earlier run of this job
+            rows_this_run += 1
+
             is_cancelled = row_data.get("iscancelled", 0)
 
             # Resolve stockist: match the Excel Stockist Code against the editable code in
@@ -10123,57 +10380,51 @@ def process_primary_sales_upload(upload_month, file_url):
             row_data["upload_month"] = upload_month
             row_data["division"] = user_division
             row_data["upload_ref"] = upload_doc.name
-            row_data["doctype"] = "Primary Sales Data"
-
-            batch.append(row_data)
-            success_count += 1
 
-            # Insert in batches
-            if len(batch) >= batch_size:
-                for rec in batch:
-                    doc = frappe.get_doc(rec)
-                    doc.insert(ignore_permissions=True)
+            values, row_error = primary_sales_bulk.prepare_row(row_data, columns, user, timestamp)
+            if row_error:
+                errors.append(f"Row {row_idx}: {row_error}")
+                continue
+            if match and match[1] == values[hash_pos]:
+                counts["unchanged_count"] += 1
+                success_count += 1
+                continue
+            if match:
+                values[name_pos] = match[0]
+            batch.append((row_idx, values, bool(match)))
+
+            # Insert in batches; the checkpoint commits the batch with the counters
+            if len(batch) >= _PRIMARY_INSERT_BATCH:
+                success_count += _flush(batch)
+                _checkpoint(row_idx)
                 batch = []
-                frappe.db.commit()
 
         # Insert remaining
         if batch:
-            for rec in batch:
-                doc = frappe.get_doc(rec)
-                doc.insert(ignore_permissions=True)
-            frappe.db.commit()
+            success_count += _flush(batch)
 
         wb.close()
 
+        # Upsert with delete_missing: whatever the file did not claim is gone
+        if upsert and upload_doc.delete_missing:
+            counts["deleted_count"] += primary_sales_bulk.delete_rows(
+                name for rows in existing.values() for name, _hash in rows)
+
     except Exception as e:
         frappe.db.rollback()
-        upload_doc.reload()
-        upload_doc.status = "Failed"
-        upload_doc.error_log = str(e)
-        upload_doc.save(ignore_permissions=True)
-        frappe.db.commit()
         frappe.log_error(f"Primary Sales Upload Error: {str(e)}", "Primary Sales Upload")
-        return {"success": False, "error": str(e)}
-
-    # Update upload record
-    upload_doc.reload()
-    upload_doc.total_rows = total_rows
-    upload_doc.success_count = success_count
-    upload_doc.error_count = len([e for e in errors if "not found" not in e])
-    upload_doc.status = "Completed"
-    if errors:
-        upload_doc.error_log = "\n".join(errors[:200])
-    upload_doc.save(ignore_permissions=True)
-    frappe.db.commit()
+        _fail(str(e))
+        return
 
-    return {
-        "success": True,
-        "total_rows": total_rows,
-        "success_count": success_count,
-        "error_count": len(errors),
-        "errors": errors[:20],
-        "upload_name": upload_doc.name,
-    }
+    # Final counters (commits the last partial batch)
+    _checkpoint(max(resume_after, row_idx if total_rows else 0), status="Completed")
+
+    # Monthly rollup (scanify.primary_rollup) for every invoice month touched
+    try:
+        primary_rollup.refresh_months(
+            user_division, rollup_months | primary_rollup.months_of(user_division, upload_month))
+    except Exception:
+        frappe.log_error(frappe.get_traceback(), "Primary Sales Rollup Refresh Error")
 
 
 @frappe.whitelist()
@@ -10181,26 +10432,31 @@ def get_primary_sales_data(division, page=1, page_size=50,
                            upload_month=None, zonee=None, region=None,
                            team=None, hq=None, product_head=None, iscancelled=None,
                            stockist_search=None, pcode=None, product_search=None,
-                           invoiceno=None):
+                           invoiceno=None, cursor=None, direction="next"):
     """Fetch paginated primary sales data with filters.
 
     zonee/region/team accept either the master *code* (preferred from the new
     cascading dropdowns) or the *name* (legacy callers). They are resolved to
     the stored display value below.
     hq must be the HQ Master *code* — filtered via Stockist Master.hq.
+
+    Rows are ordered by (invoicedate, name). Pass the `next_cursor` / `prev_cursor`
+    of the current page as `cursor` with direction "next" / "prev" to page by key
+    (constant cost at any depth); direction "prev" without a cursor returns the last
+    page. Without a cursor, `page` falls back to OFFSET paging. The total is cached
+    per filter set (scanify.primary_sales_query) until the data next changes.
+    Text filters are narrowed through the trigram index (scanify.search_index).
     """
+    from scanify import primary_sales_query, search_index
 
     page = int(page)
     page_size = min(int(page_size), 200)
     offset = (page - 1) * page_size
+    direction = "prev" if direction == "prev" else "next"
 
     # Resolve code → stored display name for the Data fields in Primary Sales Data.
-    def _resolve(doctype, value, name_field):
-        if not value:
-            return value
-        # If a Master record exists with that code, swap to its display name.
-        actual = frappe.db.get_value(doctype, value, name_field)
-        return actual or value
+    # If a Master record exists with that code, swap to its display name.
+    _resolve = _pri_master_name
 
     zone_filter = _resolve("Zone Master", zonee, "zone_name") if zonee else None
     region_filter = _resolve("Region Master", region, "region_name") if region else None
@@ -10247,6 +10503,10 @@ def get_primary_sales_data(division, page=1, page_size=50,
             pluck="name", limit_page_length=0,
         )
         search_conds = ["stockist_name LIKE %(stockist_search)s", "stockist_code LIKE %(stockist_search)s"]
+        # Narrow the LIKE to trigram-index candidates when the index can answer
+        indexed = search_index.match_condition("Primary Sales Data", "s", stockist_search, params)
+        if indexed:
+            search_conds = [f"({indexed} AND ({' OR '.join(search_conds)}))"]
         if code_pks:
             ph = ", ".join(f"%(scp{i})s" for i in range(len(code_pks)))
             for i, pk in enumerate(code_pks):
@@ -10266,12 +10526,25 @@ def get_primary_sales_data(division, page=1, page_size=50,
         conditions.append("invoiceno LIKE %(invoiceno)s")
         params["invoiceno"] = f"%{invoiceno}%"
 
+    for letter, term in (("c", pcode), ("p", product_search), ("i", invoiceno)):
+        indexed = term and search_index.match_condition("Primary Sales Data", letter, term, params)
+        if indexed:
+            conditions.append(indexed)
+
     where_clause = " AND ".join(conditions)
 
-    total = frappe.db.sql(
-        f"SELECT COUNT(*) FROM `tabPrimary Sales Data` WHERE {where_clause}",
-        params
-    )[0][0]
+    total = primary_sales_query.cached_count(
+        where_clause, {k: v for k, v in params.items() if k not in ("page_size", "offset")}
+    )
+
+    # Keyset paging: seek past the cursor instead of counting rows off
+    keyset = bool(cursor) or direction == "prev"
+    if cursor:
+        where_clause += " AND " + primary_sales_query.keyset_condition(cursor, direction, params)
+    order = "DESC" if direction == "prev" else "ASC"
+    params["page_size"] = page_size + 1     # one extra row tells us whether more follow
+    if keyset:
+        params["offset"] = 0
 
     rows = frappe.db.sql(
         f"""SELECT
@@ -10285,10 +10558,23 @@ def get_primary_sales_data(division, page=1, page_size=50,
             direct_party, iscancelled, upload_month, dsort
         FROM `tabPrimary Sales Data`
         WHERE {where_clause}
-        ORDER BY stockist_code, invoicedate, pcode
+        ORDER BY invoicedate {order}, name {order}
         LIMIT %(page_size)s OFFSET %(offset)s""",
         params, as_dict=True
     )
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if direction == "prev":
+        rows.reverse()
+
+    next_cursor = prev_cursor = None
+    if rows:
+        # Forward: more rows exist past the last one. Backward: we came from a later
+        # page, so there is always a next page; a previous one exists if we overflowed.
+        if direction == "next" and has_more or direction == "prev" and cursor:
+            next_cursor = primary_sales_query.encode_cursor(rows[-1])
+        if direction == "prev" and has_more or direction == "next" and (cursor or offset):
+            prev_cursor = primary_sales_query.encode_cursor(rows[0])
 
     # Display the human-facing Stockist Code instead of the internal id.
     code_map = get_stockist_code_map([r["stockist_code"] for r in rows])
@@ -10300,6 +10586,8 @@ def get_primary_sales_data(division, page=1, page_size=50,
         "total": total,
         "page": page,
         "page_size": page_size,
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor,
     }
 
 
@@ -10313,16 +10601,47 @@ def get_primary_sales_count(month, division):
     return count
 
 
+# Bulk sales export formats: styled Excel, or a raw gzipped CSV dump
+_SALES_EXPORT_FORMATS = ("xlsx", "csv.gz")
+
+
 @frappe.whitelist()
-def export_primary_sales_data(month, division):
-    """Export primary sales data as Excel for the given month and division."""
-    import openpyxl
-    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+@require_process("primary_view")
+def export_primary_sales_data(month, division, format_type="xlsx"):
+    """Queue a primary sales export for the month and division (an Export Job; see
+    scanify.export_jobs). format_type: "xlsx", or "csv.gz" for a raw gzipped CSV."""
+    from scanify import export_jobs
 
     if not month or not division:
         frappe.throw("Month and division are required")
+    if format_type not in _SALES_EXPORT_FORMATS:
+        frappe.throw(f"Invalid format: {format_type}")
+    return export_jobs.start("primary_sales", month=month, division=division,
+                             format_type=format_type)
+
+
+def build_primary_sales_export(month, division, format_type="xlsx", progress=None):
+    """Export job builder: primary sales data for the given month and division, as
+    Excel or a gzipped CSV, streamed from an unbuffered cursor (scanify.stream_export)."""
+    from scanify import master_dict
+    from scanify.export_jobs import track
+    from scanify.stream_export import iter_rows, temp_path, write_csv_gz
+    from scanify.xlsx_stream import XlsxStream
+
+    params = {"month": month, "division": division}
+    total = frappe.db.sql("""
+        SELECT COUNT(*) FROM `tabPrimary Sales Data`
+        WHERE upload_month = %(month)s AND division = %(division)s
+    """, params)[0][0]
 
-    rows = frappe.db.sql("""
+    if not total:
+        frappe.throw(f"No data found for {month} in {division} division")
+
+    # Export the human-facing Stockist Code so a re-upload matches by code. Resolved
+    # up front: nothing may query the database while the cursor streams.
+    code_map = master_dict.lookup("Stockist Master")
+
+    rows = iter_rows("""
         SELECT
             stockist_code, product_head, stockist_name, citypool,
             team, region, act_region, zonee,
@@ -10334,19 +10653,7 @@ def export_primary_sales_data(month, division):
         FROM `tabPrimary Sales Data`
         WHERE upload_month = %(month)s AND division = %(division)s
         ORDER BY stockist_code, invoicedate, pcode
-    """, {"month": month, "division": division}, as_dict=True)
-
-    if not rows:
-        frappe.throw(f"No data found for {month} in {division} division")
-
-    # Export the human-facing Stockist Code so a re-upload matches by code.
-    code_map = get_stockist_code_map([r["stockist_code"] for r in rows])
-    for r in rows:
-        r["stockist_code"] = code_map.get(r["stockist_code"], r["stockist_code"])
-
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = f"Primary Sales {month}"
+    """, params)
 
     # Excel column headers (matching original upload format)
     excel_headers = [
@@ -10370,65 +10677,30 @@ def export_primary_sales_data(month, division):
         "dsort", "direct_party", "iscancelled",
     ]
 
-    # Header styling
-    header_font = Font(bold=True, size=11, color="FFFFFF")
-    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-    header_alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-    thin_border = Border(
-        left=Side(style="thin"),
-        right=Side(style="thin"),
-        top=Side(style="thin"),
-        bottom=Side(style="thin"),
-    )
-
-    # Write headers
-    for col_idx, header in enumerate(excel_headers, 1):
-        cell = ws.cell(row=1, column=col_idx, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-        cell.border = thin_border
-
-    # Write data
-    for row_idx, row in enumerate(rows, 2):
-        for col_idx, key in enumerate(field_keys, 1):
+    def _values(row):
+        vals = []
+        for key in field_keys:
             val = row.get(key, "")
-            if key in ("direct_party", "iscancelled"):
+            if key == "stockist_code":
+                val = code_map.get(val, val)
+            elif key in ("direct_party", "iscancelled"):
                 val = True if val else False
             elif key == "invoicedate" and val:
                 val = str(val)
-            cell = ws.cell(row=row_idx, column=col_idx, value=val)
-            cell.border = thin_border
+            vals.append(val)
+        return vals
 
-    # Auto-width columns
-    for col in ws.columns:
-        max_length = 0
-        col_letter = col[0].column_letter
-        for cell in col:
-            if cell.value:
-                max_length = max(max_length, len(str(cell.value)))
-        ws.column_dimensions[col_letter].width = min(max_length + 3, 30)
+    rows = track(rows, total, progress)
+    if format_type == "csv.gz":
+        return f"Primary_Sales_{division}_{month}.csv.gz", write_csv_gz(
+            excel_headers, (_values(r) for r in rows))
 
-    # Freeze header row
-    ws.freeze_panes = "A2"
+    book = XlsxStream()
+    sheet = book.sheet(f"Primary Sales {month}", freeze="A2", pad=3, max_width=30)
+    sheet.header(excel_headers)
+    sheet.rows(rows, template=_values)
 
-    # Save to temp file and serve
-    fname = f"Primary_Sales_{division}_{month}.xlsx"
-    file_path = os.path.join(tempfile.gettempdir(), fname)
-    wb.save(file_path)
-
-    with open(file_path, "rb") as f:
-        file_content = f.read()
-
-    # Clean up
-    try:
-        os.remove(file_path)
-    except OSError:
-        pass
-
-    frappe.local.response.filename = fname
-    frappe.local.response.filecontent = file_content
-    frappe.local.response.type = "download"
+    return f"Primary_Sales_{division}_{month}.xlsx", book.save(temp_path(".xlsx"))
 
 
 @frappe.whitelist()
@@ -10549,6 +10821,9 @@ def delete_primary_sales_month(month, reason, stockist_codes=None, division=None
     set of stockists. A reason (>= 5 chars) is recorded on the month's upload record(s)
     for audit. Reversible by re-uploading the source Excel, so this is intentionally a
     light-touch bulk delete used to fix back-dated / mis-uploaded primary data."""
+    from scanify import primary_rollup, report_cache, search_index
+    from scanify.primary_sales_query import invalidate_counts
+
     if not division:
         division = get_user_division()
     month = str(month or "")[:7]
@@ -10603,8 +10878,20 @@ def delete_primary_sales_month(month, reason, stockist_codes=None, division=None
     except Exception:
         frappe.log_error(frappe.get_traceback(), "Primary Sales Delete Audit Error")
 
+    index_where = "t.division = %(division)s AND t.upload_month = %(month)s"
+    index_params = {"division": division, "month": month}
+    if codes:
+        index_where += f" AND t.stockist_code IN ({', '.join(f'%(sc{i})s' for i in range(len(codes)))})"
+        index_params.update({f"sc{i}": c for i, c in enumerate(codes)})
+    rollup_months = primary_rollup.months_of(division, month, codes)
+    search_index.remove_where("Primary Sales Data", index_where, index_params)
     frappe.db.delete("Primary Sales Data", filters)
     frappe.db.commit()
+    # Bulk delete skips doc events — drop the cached list totals and refresh the
+    # monthly rollup explicitly
+    invalidate_counts()
+    primary_rollup.refresh_months(division, rollup_months, codes)
+    report_cache.bump()
 
     frappe.logger().info(
         f"Primary Sales deleted: division={division} month={month} "
@@ -10710,6 +10997,7 @@ def get_stockist_report_filter_options(division=None):
 
 
 @frappe.whitelist()
+@cached_report
 def get_stockist_primary_sales_report(division=None, sales_type="primary", region=None,
                                        from_date=None, to_date=None, team=None, hq=None,
                                        product_codes=None):
@@ -10736,11 +11024,17 @@ def get_stockist_primary_sales_report(division=None, sales_type="primary", regio
     if hq:
         conditions.append("psd.stockist_code IN (SELECT name FROM `tabStockist Master` WHERE hq = %(hq)s)")
         params["hq"] = hq
+    # Whole-month ranges read the monthly rollup (scanify.primary_rollup), whose
+    # columns carry the Primary Sales Data names, so only the source and dates differ.
+    from scanify import primary_rollup
+    months = primary_rollup.is_ready() and primary_rollup.whole_months(from_date, to_date)
+    source = f"`{primary_rollup.TABLE}`" if months else "`tabPrimary Sales Data`"
+    date_col = "psd.sales_month" if months else "psd.invoicedate"
     if from_date:
-        conditions.append("psd.invoicedate >= %(from_date)s")
+        conditions.append(f"{date_col} >= %(from_date)s")
         params["from_date"] = from_date
     if to_date:
-        conditions.append("psd.invoicedate <= %(to_date)s")
+        conditions.append(f"{date_col} <= %(to_date)s")
         params["to_date"] = to_date
     if pcodes:
         ph = ", ".join([f"%(_pc{i})s" for i in range(len(pcodes))])
@@ -10756,7 +11050,7 @@ def get_stockist_primary_sales_report(division=None, sales_type="primary", regio
                psd.pcode AS product_code,
                psd.product AS product_name, psd.pack,
                SUM(psd.quantity) AS total_qty, SUM(psd.ptsvalue) AS total_value
-        FROM `tabPrimary Sales Data` psd
+        FROM {source} psd
         LEFT JOIN `tabStockist Master` sm ON sm.name = psd.stockist_code AND sm.division = %(division)s
         LEFT JOIN `tabHQ Master` hm ON hm.name = sm.hq AND hm.division = %(division)s
         WHERE {where}
@@ -10836,6 +11130,7 @@ def _normalise_code_list(value):
 
 
 @frappe.whitelist()
+@cached_report
 def get_stockist_secondary_sales_report(division=None, region=None,
                                          from_date=None, to_date=None, team=None, hq=None):
     """Report 2 – Stockist Wise Secondary Sales Report.
@@ -10981,6 +11276,7 @@ def get_stockist_secondary_sales_report(division=None, region=None,
 
 
 @frappe.whitelist()
+@cached_report
 def get_stockist_moving_trend_report(division=None, sales_type="secondary",
                                       stockist_code=None, product_codes=None):
     """Report 3 – Moving Trend (monthly pivot Apr-Mar) for a single stockist.
@@ -11129,6 +11425,7 @@ def get_stockist_moving_trend_report(division=None, sales_type="secondary",
 
 
 @frappe.whitelist()
+@cached_report
 def get_stockist_closing_stock_report(division=None, region=None,
                                        from_date=None, to_date=None, group_by="stockist", team=None, hq=None):
     """Report 4 – Stockist Wise Closing Stock Report (from Draft or submitted Stockist Statements).
@@ -11477,6 +11774,7 @@ def get_region_product_closing_stock(division=None, region=None, from_date=None,
 
 
 @frappe.whitelist()
+@cached_report
 def get_hq_wise_stockist_report(division=None, region=None, team=None, hq=None):
     """Report 5 – HQ Wise Stockist Report (active stockists grouped by HQ)."""
     if not division:
@@ -11531,6 +11829,7 @@ def get_hq_wise_stockist_report(division=None, region=None, team=None, hq=None):
 
 
 @frappe.whitelist()
+@cached_report
 def get_stockist_address_report(division=None, region=None, criteria="ALL", team=None, hq=None):
     """Report 6 – Stockist Address Report.
     criteria: ALL, HQ WISE, TEAM WISE, CITY WISE, STOCKIST NAME
@@ -11594,8 +11893,17 @@ def get_stockist_address_report(division=None, region=None, criteria="ALL", team
 
 
 @frappe.whitelist()
+@require_process("reports")
 def export_stockist_report_excel(report_type, division=None, **kwargs):
-    """Generate a styled Excel workbook for any of the 6 stockist report types."""
+    """Queue a stockist report Excel export (an Export Job; see scanify.export_jobs)."""
+    from scanify import export_jobs
+
+    return export_jobs.start("stockist_report", report_type=report_type,
+                             division=division or get_user_division(), **kwargs)
+
+
+def build_stockist_report_export(report_type, division=None, progress=None, **kwargs):
+    """Export job builder: a styled Excel workbook for any of the stockist report types."""
     import openpyxl
     from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 
@@ -12647,7 +12955,6 @@ def export_stockist_report_excel(report_type, division=None, **kwargs):
                 max_len = max(max_len, len(str(cell.value)))
         ws.column_dimensions[col_letter].width = min(max_len + 4, 40)
 
-    # Save to temp file and respond
     from io import BytesIO
     output = BytesIO()
     wb.save(output)
@@ -12677,11 +12984,7 @@ def export_stockist_report_excel(report_type, division=None, **kwargs):
     _today = _date.today().strftime("%Y-%m-%d")
     _safe = _re.sub(r'[^\w\s]', ' ', _title).strip()
     _safe = _re.sub(r'\s+', '_', _safe)
-    filename = f"{_safe}_{division}_{_today}.xlsx"
-    frappe.local.response.filename = filename
-    frappe.local.response.filecontent = xlsx_data
-    frappe.local.response.type = "download"
-    frappe.local.response.content_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    return f"{_safe}_{division}_{_today}.xlsx", xlsx_data
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -12784,6 +13087,7 @@ def _scheme_geo_conditions(alias, params, zone=None, region=None, team=None, hq=
 
 
 @frappe.whitelist()
+@cached_report
 def get_scheme_activity_trend_report(division=None, from_date=None, to_date=None,
                                       doctor_status="Active", reporting_criteria="Organization",
                                       zone=None, region=None, team=None, hq=None, doctor=None,
@@ -12870,6 +13174,7 @@ def get_scheme_activity_trend_report(division=None, from_date=None, to_date=None
 
 
 @frappe.whitelist()
+@cached_report
 def get_scheme_activity_track_report(division=None, from_date=None, to_date=None,
                                       doctor_status="Active", reporting_criteria="Organization",
                                       zone=None, region=None, team=None, hq=None, doctor=None,
@@ -12964,6 +13269,7 @@ def get_scheme_activity_track_report(division=None, from_date=None, to_date=None
 
 
 @frappe.whitelist()
+@cached_report
 def get_new_approval_doctors_report(division=None, from_date=None, to_date=None,
                                      reporting_criteria="Organization",
                                      zone=None, region=None, team=None, hq=None, doctor=None,
@@ -13038,6 +13344,7 @@ def get_new_approval_doctors_report(division=None, from_date=None, to_date=None,
 
 
 @frappe.whitelist()
+@cached_report
 def get_scheme_periodic_report(division=None, from_date=None, to_date=None,
                                 reporting_criteria="HQ", zone=None, region=None,
                                 team=None, hq=None, doctor=None,
@@ -13154,6 +13461,7 @@ def get_scheme_periodic_report(division=None, from_date=None, to_date=None,
 
 
 @frappe.whitelist()
+@cached_report
 def get_pending_scheme_deduction_report(division=None, month=None,
                                         reporting_criteria="Organization",
                                         zone=None, region=None, team=None, hq=None, doctor=None,
@@ -13306,53 +13614,23 @@ def get_pending_scheme_deduction_report(division=None, month=None,
 
 
 @frappe.whitelist()
+@require_process("reports")
 def export_scheme_report_excel(report_type, division=None, **kwargs):
-    """Generate a styled Excel workbook for scheme reports."""
-    import openpyxl
-    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+    """Queue a scheme report Excel export (an Export Job; see scanify.export_jobs)."""
+    from scanify import export_jobs
 
-    if not division:
-        division = get_user_division()
+    return export_jobs.start("scheme_report", report_type=report_type,
+                             division=division or get_user_division(), **kwargs)
 
-    thin_border = Border(
-        left=Side(style="thin"), right=Side(style="thin"),
-        top=Side(style="thin"), bottom=Side(style="thin"),
-    )
-    header_font = Font(bold=True, size=11, color="FFFFFF")
-    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-    header_align = Alignment(horizontal="center", vertical="center", wrap_text=True)
-    group_font = Font(bold=True, size=11)
-    group_fill = PatternFill(start_color="D9E2F3", end_color="D9E2F3", fill_type="solid")
 
-    wb = openpyxl.Workbook()
-    ws = wb.active
+def build_scheme_report_export(report_type, division=None, progress=None, **kwargs):
+    """Export job builder: a styled Excel workbook for scheme reports."""
+    from scanify.xlsx_stream import XlsxStream
 
-    def write_header_row(ws, row_num, headers):
-        for col, h in enumerate(headers, 1):
-            cell = ws.cell(row=row_num, column=col, value=h)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_align
-            cell.border = thin_border
-
-    def write_data_row(ws, row_num, values):
-        for col, v in enumerate(values, 1):
-            cell = ws.cell(row=row_num, column=col, value=v)
-            cell.border = thin_border
-
-    def write_group_row(ws, row_num, label, num_cols):
-        cell = ws.cell(row=row_num, column=1, value=label)
-        cell.font = group_font
-        cell.fill = group_fill
-        for c in range(1, num_cols + 1):
-            ws.cell(row=row_num, column=c).fill = group_fill
-            ws.cell(row=row_num, column=c).border = thin_border
+    if not division:
+        division = get_user_division()
 
-    def write_title_rows(ws, title, subtitle=""):
-        ws.cell(row=1, column=1, value=title).font = Font(bold=True, size=14)
-        if subtitle:
-            ws.cell(row=2, column=1, value=subtitle).font = Font(size=11, italic=True)
-        return 4
+    book = XlsxStream()
 
     from_date = kwargs.get("from_date", "")
     to_date = kwargs.get("to_date", "")
@@ -13373,7 +13651,7 @@ def export_scheme_report_excel(report_type, division=None, **kwargs):
     ml = ["Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec", "Jan", "Feb", "Mar"]
 
     if report_type == "activity_trend":
-        ws.title = "Activity Trend"
+        sheet = book.sheet("Activity Trend")
         result = get_scheme_activity_trend_report(
             division, from_date, to_date, doctor_status, reporting_criteria,
             zone_val, region_val, team_val, hq_val, doctor_val,
@@ -13381,22 +13659,19 @@ def export_scheme_report_excel(report_type, division=None, **kwargs):
         )
         data = result.get("data", [])
         fy_label = result.get("fy_label", "")
-        row = write_title_rows(ws, f"Activity Trend Report – {division}", f"{fy_label}")
+        sheet.title(f"Activity Trend Report – {division}", f"{fy_label}")
         headers = ["Region", "HQ", "Doctor Name"] + ml
-        write_header_row(ws, row, headers)
-        row += 1
+        sheet.header(headers)
         current_region = None
         for d in data:
             if d["region"] != current_region:
                 current_region = d["region"]
-                write_group_row(ws, row, f"{current_region} Region", len(headers))
-                row += 1
+                sheet.group(f"{current_region} Region")
             vals = [d["region"], d.get("hq_name") or d["hq"], d["doctor_name"]] + d["months"]
-            write_data_row(ws, row, vals)
-            row += 1
+            sheet.row(vals)
 
     elif report_type == "activity_track":
-        ws.title = "Activity Track"
+        sheet = book.sheet("Activity Track")
         result = get_scheme_activity_track_report(
             division, from_date, to_date, doctor_status, reporting_criteria,
             zone_val, region_val, team_val, hq_val, doctor_val,
@@ -13404,49 +13679,42 @@ def export_scheme_report_excel(report_type, division=None, **kwargs):
         )
         data = result.get("data", [])
         totals = result.get("totals", {})
-        row = write_title_rows(ws, f"Activity Track Report – {division}",
-                               f"Period: {period_label}")
+        sheet.title(f"Activity Track Report – {division}",
+                    f"Period: {period_label}")
         headers = ["S.No", "Date", "Region", "HQ", "Doctor Name", "Product",
                     "Qty", "Free Qty", "Rate", "Special Price", "Discount Value",
                     "Value", "Stockist"]
-        write_header_row(ws, row, headers)
-        row += 1
+        sheet.header(headers)
         for d in data:
-            write_data_row(ws, row, [d["sno"], d["date"], d["region"], d["hq"],
-                                     d["doctor_name"], d.get("product_name") or d["product_code"],
-                                     d["qty"], d["free_qty"], d["rate"],
-                                     d.get("special_rate", 0), d.get("discount_value", 0),
-                                     d["value"], d["stockist_name"]])
-            row += 1
+            sheet.row([d["sno"], d["date"], d["region"], d["hq"],
+                       d["doctor_name"], d.get("product_name") or d["product_code"],
+                       d["qty"], d["free_qty"], d["rate"],
+                       d.get("special_rate", 0), d.get("discount_value", 0),
+                       d["value"], d["stockist_name"]])
         # Totals row
-        write_group_row(ws, row, "Total", len(headers))
-        ws.cell(row=row, column=7, value=totals.get("qty", 0)).font = group_font
-        ws.cell(row=row, column=8, value=totals.get("free_qty", 0)).font = group_font
-        ws.cell(row=row, column=11, value=totals.get("discount_value", 0)).font = group_font
-        ws.cell(row=row, column=12, value=totals.get("value", 0)).font = group_font
+        sheet.totals("Total", {7: totals.get("qty", 0), 8: totals.get("free_qty", 0),
+                               11: totals.get("discount_value", 0), 12: totals.get("value", 0)})
 
     elif report_type == "new_approval_doctors":
-        ws.title = "New Approval Doctors"
+        sheet = book.sheet("New Approval Doctors")
         result = get_new_approval_doctors_report(
             division, from_date, to_date, reporting_criteria,
             zone_val, region_val, team_val, hq_val, doctor_val,
             product_codes, product_group, product_category
         )
         data = result.get("data", [])
-        row = write_title_rows(ws, f"New Approval Doctors – {division}",
-                               f"Period: {period_label}")
+        sheet.title(f"New Approval Doctors – {division}",
+                    f"Period: {period_label}")
         headers = ["S.No", "Approval Date", "Region", "HQ", "Doctor Name",
                     "Hospital", "City", "Approved By"]
-        write_header_row(ws, row, headers)
-        row += 1
+        sheet.header(headers)
         for d in data:
-            write_data_row(ws, row, [d["sno"], d["approval_date"], d["region"],
-                                     d["hq"], d["doctor_name"], d["hospital"],
-                                     d["city"], d["approved_by"]])
-            row += 1
+            sheet.row([d["sno"], d["approval_date"], d["region"],
+                       d["hq"], d["doctor_name"], d["hospital"],
+                       d["city"], d["approved_by"]])
 
     elif report_type == "periodic":
-        ws.title = "Periodic Report"
+        sheet = book.sheet("Periodic Report")
         result = get_scheme_periodic_report(
             division, from_date, to_date, reporting_criteria,
             zone_val, region_val, team_val, hq_val, doctor_val,
@@ -13454,18 +13722,16 @@ def export_scheme_report_excel(report_type, division=None, **kwargs):
         )
         data = result.get("data", [])
         gb = result.get("group_by", "HQ")
-        row = write_title_rows(ws, f"Periodic Report ({gb} Wise) – {division}",
-                               f"Period: {period_label}")
+        sheet.title(f"Periodic Report ({gb} Wise) – {division}",
+                    f"Period: {period_label}")
         headers = [gb, "Total Qty", "Free Qty", "Discount Value", "Total Value"]
-        write_header_row(ws, row, headers)
-        row += 1
+        sheet.header(headers)
         for d in data:
-            write_data_row(ws, row, [d["group_label"], d["total_qty"],
-                                     d["free_qty"], d.get("discount_value", 0), d["total_value"]])
-            row += 1
+            sheet.row([d["group_label"], d["total_qty"],
+                       d["free_qty"], d.get("discount_value", 0), d["total_value"]])
 
     elif report_type == "pending_deduction":
-        ws.title = "Pending Deduction"
+        sheet = book.sheet("Pending Deduction")
         result = get_pending_scheme_deduction_report(
             division, month, reporting_criteria,
             zone_val, region_val, team_val, hq_val, doctor_val,
@@ -13473,53 +13739,29 @@ def export_scheme_report_excel(report_type, division=None, **kwargs):
         )
         data = result.get("data", [])
         totals = result.get("totals", {})
-        row = write_title_rows(ws, f"Monthly Pending Scheme Deduction – {division}",
-                               f"Month: {month}  |  Criteria: {reporting_criteria}")
+        sheet.title(f"Monthly Pending Scheme Deduction – {division}",
+                    f"Month: {month}  |  Criteria: {reporting_criteria}")
         headers = ["S.No", "Date", "Region", "HQ", "Doctor Name", "Stockist",
                     "Product", "Order Qty", "Free Qty", "PTS", "Special Price",
                     "Discount Value", "Scheme Value"]
-        write_header_row(ws, row, headers)
-        row += 1
+        sheet.header(headers)
         current_group = None
         for d in data:
             if d["group_label"] != current_group:
                 current_group = d["group_label"]
-                write_group_row(ws, row, current_group, len(headers))
-                row += 1
-            write_data_row(ws, row, [d["sno"], d["date"], d["region"], d.get("hq_name") or d["hq"],
-                                     d["doctor_name"], d["stockist_name"],
-                                     d.get("product_name") or d["product_code"],
-                                     d["qty"], d["free_qty"], d["rate"],
-                                     d["special_rate"], d["discount_value"], d["value"]])
-            row += 1
-        write_group_row(ws, row, "Grand Total", len(headers))
-        ws.cell(row=row, column=9, value=totals.get("free_qty", 0)).font = group_font
-        ws.cell(row=row, column=12, value=totals.get("discount_value", 0)).font = group_font
-        ws.cell(row=row, column=13, value=totals.get("value", 0)).font = group_font
+                sheet.group(current_group)
+            sheet.row([d["sno"], d["date"], d["region"], d.get("hq_name") or d["hq"],
+                       d["doctor_name"], d["stockist_name"],
+                       d.get("product_name") or d["product_code"],
+                       d["qty"], d["free_qty"], d["rate"],
+                       d["special_rate"], d["discount_value"], d["value"]])
+        sheet.totals("Grand Total", {9: totals.get("free_qty", 0),
+                                     12: totals.get("discount_value", 0), 13: totals.get("value", 0)})
 
     else:
         frappe.throw("Invalid report type")
 
-    # Auto-fit column widths
-    for col in ws.columns:
-        max_len = 0
-        col_letter = col[0].column_letter
-        for cell in col:
-            if cell.value:
-                max_len = max(max_len, len(str(cell.value)))
-        ws.column_dimensions[col_letter].width = min(max_len + 4, 50)
-
-    from io import BytesIO
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    xlsx_data = output.getvalue()
-
-    filename = f"Scheme_Report_{report_type}_{division}.xlsx"
-    frappe.local.response.filename = filename
-    frappe.local.response.filecontent = xlsx_data
-    frappe.local.response.type = "download"
-    frappe.local.response.content_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    return f"Scheme_Report_{report_type}_{division}.xlsx", book.save()
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -13608,6 +13850,7 @@ def get_ranking_report_filter_options(division=None):
 # Report 1: Moving Trend Report
 # ─────────────────────────────────────────────────────────────
 @frappe.whitelist()
+@cached_report
 def get_ranking_moving_trend_report(division=None, sales_type="secondary",
                                      criteria="Region", from_date=None, to_date=None,
                                      region=None, zone=None):
@@ -13662,9 +13905,10 @@ def _pri_master_name(doctype, value, name_field):
     """Primary Sales Data stores region/zone/team by their DISPLAY NAME, while the
     ranking dropdowns send the Master's code (its PK). Resolve code → stored name so
     primary-sales filters actually match (mirrors the stockist primary report)."""
+    from scanify import master_dict
     if not value:
         return value
-    return frappe.db.get_value(doctype, value, name_field) or value
+    return master_dict.resolve(doctype, [value], name_field).get(value, value)
 
 
 def _name_lut(doctype, name_field):
@@ -13674,8 +13918,8 @@ def _name_lut(doctype, name_field):
     the printed sheets show only the human name. Callers do ``lut.get(value, value)``
     so a value that is already a name (e.g. Primary Sales stores region by name)
     passes straight through unchanged."""
-    rows = frappe.get_all(doctype, fields=["name", name_field])
-    return {r["name"]: (r.get(name_field) or r["name"]) for r in rows}
+    from scanify import master_dict
+    return master_dict.lookup(doctype, name_field)
 
 
 def _to_roman(n):
@@ -13704,8 +13948,14 @@ def _moving_trend_primary(division, criteria, from_date, to_date, region, zone):
     }
     criteria_col = criteria_col_map.get(criteria, "ps.region")
 
+    # Whole months read the monthly rollup (same column names) — scanify.primary_rollup.
+    from scanify import primary_rollup
+    months = primary_rollup.is_ready() and primary_rollup.whole_months(from_date, to_date)
+    source = f"`{primary_rollup.TABLE}`" if months else "`tabPrimary Sales Data`"
+    date_col = "ps.sales_month" if months else "ps.invoicedate"
+
     conditions = ["ps.division = %(division)s", "ps.iscancelled = 0",
-                   "ps.invoicedate >= %(from_date)s", "ps.invoicedate <= %(to_date)s"]
+                   f"{date_col} >= %(from_date)s", f"{date_col} <= %(to_date)s"]
     params = {"division": division, "from_date": from_date, "to_date": to_date}
 
     join_sm = ""
@@ -13720,17 +13970,21 @@ def _moving_trend_primary(division, criteria, from_date, to_date, region, zone):
     where = " AND ".join(conditions)
     return frappe.db.sql(f"""
         SELECT {criteria_col} AS criteria_name,
-               MONTH(ps.invoicedate) AS m,
+               MONTH({date_col}) AS m,
                SUM(ps.quantity) AS qty
-        FROM `tabPrimary Sales Data` ps
+        FROM {source} ps
         {join_sm}
         WHERE {where}
-        GROUP BY criteria_name, MONTH(ps.invoicedate)
+        GROUP BY criteria_name, MONTH({date_col})
     """, params, as_dict=True)
 
 
 def _moving_trend_secondary(division, criteria, from_date, to_date, region, zone):
     """Query Stockist Statement Items for Moving Trend grouped by criteria."""
+    from scanify import secondary_fact
+    if secondary_fact.is_ready():
+        return _moving_trend_secondary_fact(division, criteria, from_date, to_date, region, zone)
+
     criteria_col_map = {
         "Region": "ss.region",
         "HQ": "IFNULL(sm.hq, ss.team)",
@@ -13769,10 +14023,52 @@ def _moving_trend_secondary(division, criteria, from_date, to_date, region, zone
     """, params, as_dict=True)
 
 
+def _moving_trend_secondary_fact(division, criteria, from_date, to_date, region, zone):
+    """_moving_trend_secondary over the monthly fact table (scanify.secondary_fact)."""
+    from scanify.secondary_fact import TABLE
+
+    criteria_col_map = {
+        "Region": "f.region",
+        "HQ": "IFNULL(sm.hq, f.team)",
+        "Team": "f.team",
+        "Stockist": "CONCAT(f.stockist_code, ' – ', IFNULL(sn.stockist_name, ''))",
+        "Product": "CONCAT(COALESCE(pm.product_code, f.product_code), ' – ', IFNULL(pm.product_name, ''))",
+    }
+    criteria_col = criteria_col_map.get(criteria, "f.region")
+
+    conditions = ["f.division = %(division)s",
+                  "f.statement_month >= %(from_date)s", "f.statement_month <= %(to_date)s"]
+    params = {"division": division, "from_date": from_date, "to_date": to_date}
+
+    joins = ""
+    if criteria == "HQ":
+        joins = " LEFT JOIN `tabStockist Master` sm ON sm.name = f.stockist_code AND sm.status = 'Active'"
+    if criteria == "Stockist":
+        joins = " LEFT JOIN `tabStockist Master` sn ON sn.name = f.stockist_code"
+    if criteria == "Product":
+        joins = " LEFT JOIN `tabProduct Master` pm ON pm.name = f.product_code"
+    _scope_region_sql(conditions, params, "f.region", division, region)
+    if zone:
+        conditions.append("f.zone = %(zone)s")
+        params["zone"] = zone
+
+    where = " AND ".join(conditions)
+    return frappe.db.sql(f"""
+        SELECT {criteria_col} AS criteria_name,
+               MONTH(f.statement_month) AS m,
+               SUM(f.sales_boxes) AS qty
+        FROM `{TABLE}` f
+        {joins}
+        WHERE {where}
+        GROUP BY criteria_name, MONTH(f.statement_month)
+    """, params, as_dict=True)
+
+
 # ─────────────────────────────────────────────────────────────
 # Report 2: Rupee Wise Report
 # ─────────────────────────────────────────────────────────────
 @frappe.whitelist()
+@cached_report
 def get_ranking_rupee_wise_report(division=None, sales_type="secondary",
                                    value_condition="gt", sale_value=0,
                                    from_date=None, to_date=None):
@@ -13854,6 +14150,7 @@ def get_ranking_rupee_wise_report(division=None, sales_type="secondary",
 # Report 3: Productwise Ranking (Top N)
 # ─────────────────────────────────────────────────────────────
 @frappe.whitelist()
+@cached_report
 def get_ranking_productwise_topn(division=None, product_codes=None, top_n=5,
                                   from_date=None, to_date=None, sales_type="secondary"):
     """Rank selected products by total value, return top N with contribution %."""
@@ -13942,6 +14239,7 @@ def get_ranking_productwise_topn(division=None, product_codes=None, top_n=5,
 #   Product Code | Pack | Rank | Headquarters | Region | Sales.
 # ─────────────────────────────────────────────────────────────
 @frappe.whitelist()
+@cached_report
 def get_ranking_productwise_all(division=None, product_code=None, region=None,
                                  sales_type="secondary", from_date=None, to_date=None,
                                  top_n=2):
@@ -14071,6 +14369,7 @@ def get_ranking_productwise_all(division=None, product_code=None, region=None,
 # Report 5: Productwise Ranking Advanced
 # ─────────────────────────────────────────────────────────────
 @frappe.whitelist()
+@cached_report
 def get_ranking_productwise_advanced(division=None, sales_type="secondary",
                                       qty_filter=0, region=None, hq_wise=0,
                                       product_codes=None,
@@ -14220,6 +14519,7 @@ def get_ranking_productwise_advanced(division=None, sales_type="secondary",
 # Report 6: Moving Trend PCPM Tracker
 # ─────────────────────────────────────────────────────────────
 @frappe.whitelist()
+@cached_report
 def get_ranking_pcpm_tracker(division=None, sales_type="secondary",
                               region=None, product_codes=None):
     """Monthly pivot (Apr–Mar) per product with PCPM = total / sanctioned_strength / active_months."""
@@ -14331,51 +14631,28 @@ def get_ranking_pcpm_tracker(division=None, sales_type="secondary",
 # Ranking Reports – Excel Export
 # ─────────────────────────────────────────────────────────────
 @frappe.whitelist()
+@require_process("reports")
 def export_ranking_report_excel(report_type, division=None, **kwargs):
-    """Server-side Excel export for all 6 ranking report types."""
-    if not division:
-        division = get_user_division()
+    """Queue a ranking report Excel export (an Export Job; see scanify.export_jobs)."""
+    from scanify import export_jobs
 
-    import openpyxl
-    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+    return export_jobs.start("ranking_report", report_type=report_type,
+                             division=division or get_user_division(), **kwargs)
 
-    wb = openpyxl.Workbook()
-    ws = wb.active
 
-    header_fill = PatternFill(start_color="1e293b", end_color="1e293b", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF", size=10)
-    group_fill = PatternFill(start_color="e8edf3", end_color="e8edf3", fill_type="solid")
-    group_font = Font(bold=True, size=10)
-    thin_border = Border(
-        left=Side(style="thin", color="d1d5db"),
-        right=Side(style="thin", color="d1d5db"),
-        top=Side(style="thin", color="d1d5db"),
-        bottom=Side(style="thin", color="d1d5db"),
-    )
-
-    def write_header_row(ws, row_num, headers):
-        for col, h in enumerate(headers, 1):
-            cell = ws.cell(row=row_num, column=col, value=h)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-            cell.border = thin_border
+def build_ranking_report_export(report_type, division=None, progress=None, **kwargs):
+    """Export job builder: Excel export for all 6 ranking report types."""
+    if not division:
+        division = get_user_division()
 
-    def write_data_row(ws, row_num, values):
-        for col, v in enumerate(values, 1):
-            cell = ws.cell(row=row_num, column=col, value=v)
-            cell.border = thin_border
+    from scanify.xlsx_stream import XlsxStream
 
-    def write_title_rows(ws, title, subtitle=""):
-        ws.cell(row=1, column=1, value=title).font = Font(bold=True, size=14)
-        if subtitle:
-            ws.cell(row=2, column=1, value=subtitle).font = Font(size=11, italic=True)
-        return 4
+    book = XlsxStream()
 
     ml = ["Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec", "Jan", "Feb", "Mar"]
 
     if report_type == "moving_trend":
-        ws.title = "Moving Trend"
+        sheet = book.sheet("Moving Trend")
         result = get_ranking_moving_trend_report(
             division, kwargs.get("sales_type", "secondary"),
             kwargs.get("criteria", "Region"),
@@ -14383,18 +14660,15 @@ def export_ranking_report_excel(report_type, division=None, **kwargs):
             kwargs.get("region"), kwargs.get("zone"))
         data = result.get("data", [])
         criteria_label = result.get("criteria", "Region")
-        row = write_title_rows(ws, f"Moving Trend Report – {division}",
-                               result.get("fy_label", ""))
+        sheet.title(f"Moving Trend Report – {division}", result.get("fy_label", ""))
         headers = [criteria_label] + ml + ["Total", "Average"]
-        write_header_row(ws, row, headers)
-        row += 1
+        sheet.header(headers, style="header_dark")
         for d in data:
             vals = [d["criteria_name"]] + d["months"] + [d["total"], d["average"]]
-            write_data_row(ws, row, vals)
-            row += 1
+            sheet.row(vals, style="cell_light")
 
     elif report_type == "rupee_wise":
-        ws.title = "Rupee Wise"
+        sheet = book.sheet("Rupee Wise")
         result = get_ranking_rupee_wise_report(
             division, kwargs.get("sales_type", "secondary"),
             kwargs.get("value_condition", "gt"),
@@ -14404,42 +14678,38 @@ def export_ranking_report_excel(report_type, division=None, **kwargs):
         from_d = kwargs.get("from_date", "")
         to_d = kwargs.get("to_date", "")
         period_label = f"{from_d} to {to_d}" if from_d and to_d else ""
-        row = write_title_rows(ws, f"Rupee Wise Report – {division}", period_label)
+        sheet.title(f"Rupee Wise Report – {division}", period_label)
         headers = ["S.No", "Date", "Region", "HQ", "Stockist Code", "Stockist Name",
                     "Product Code", "Product", "Qty", "Rate", "Value", "Value ₹ Lakhs"]
-        write_header_row(ws, row, headers)
-        row += 1
+        sheet.header(headers, style="header_dark")
         for d in data:
-            write_data_row(ws, row, [d["sno"], d.get("date", ""), d.get("region", ""),
-                                      d.get("hq", ""), d.get("stockist_code", ""),
-                                      d.get("stockist_name", ""), d.get("product_code", ""),
-                                      d.get("product_name", ""), d.get("qty", 0),
-                                      d.get("rate", 0), d.get("value", 0),
-                                      round(flt(d.get("value", 0)) / 100000, 2)])
-            row += 1
+            sheet.row([d["sno"], d.get("date", ""), d.get("region", ""),
+                      d.get("hq", ""), d.get("stockist_code", ""),
+                      d.get("stockist_name", ""), d.get("product_code", ""),
+                      d.get("product_name", ""), d.get("qty", 0),
+                      d.get("rate", 0), d.get("value", 0),
+                      round(flt(d.get("value", 0)) / 100000, 2)], style="cell_light")
 
     elif report_type == "productwise_topn":
-        ws.title = "Product Ranking Top N"
+        sheet = book.sheet("Product Ranking Top N")
         result = get_ranking_productwise_topn(
             division, kwargs.get("product_codes"),
             kwargs.get("top_n", 5),
             kwargs.get("from_date"), kwargs.get("to_date"),
             kwargs.get("sales_type", "secondary"))
         data = result.get("data", [])
-        row = write_title_rows(ws, f"Productwise Ranking (Top N) – {division}", "")
+        sheet.title(f"Productwise Ranking (Top N) – {division}", "")
         headers = ["Rank", "Product Code", "Product Name", "Total Qty",
                     "Total Value", "Value ₹ Lakhs", "Contribution %"]
-        write_header_row(ws, row, headers)
-        row += 1
+        sheet.header(headers, style="header_dark")
         for d in data:
-            write_data_row(ws, row, [d["rank"], d["product_code"], d["product_name"],
-                                      d["total_qty"], d["total_value"],
-                                      round(flt(d["total_value"]) / 100000, 2),
-                                      d["contribution_pct"]])
-            row += 1
+            sheet.row([d["rank"], d["product_code"], d["product_name"],
+                      d["total_qty"], d["total_value"],
+                      round(flt(d["total_value"]) / 100000, 2),
+                      d["contribution_pct"]], style="cell_light")
 
     elif report_type == "productwise_all":
-        ws.title = "Product Wise Ranking Sheet"
+        sheet = book.sheet("Product Wise Ranking Sheet")
         result = get_ranking_productwise_all(
             division, kwargs.get("product_code"),
             kwargs.get("region"), kwargs.get("sales_type", "secondary"),
@@ -14448,18 +14718,16 @@ def export_ranking_report_excel(report_type, division=None, **kwargs):
         data = result.get("data", [])
         st = kwargs.get("sales_type", "secondary")
         st_label = "Primary Sales" if st == "primary" else "Secondary Sales"
-        row = write_title_rows(ws, f"Product Wise Ranking Sheet – {division}", st_label)
+        sheet.title(f"Product Wise Ranking Sheet – {division}", st_label)
         headers = ["Product Code", "Pack", "Rank", "Headquarters", "Region", "Sales"]
-        write_header_row(ws, row, headers)
-        row += 1
+        sheet.header(headers, style="header_dark")
         for d in data:
-            write_data_row(ws, row, [d.get("product_code", ""), d.get("pack", ""),
-                                      d.get("rank_roman", ""), d.get("hq", ""),
-                                      d.get("region", ""), d.get("sales", 0)])
-            row += 1
+            sheet.row([d.get("product_code", ""), d.get("pack", ""),
+                      d.get("rank_roman", ""), d.get("hq", ""),
+                      d.get("region", ""), d.get("sales", 0)], style="cell_light")
 
     elif report_type == "productwise_advanced":
-        ws.title = "Product Ranking Advanced"
+        sheet = book.sheet("Product Ranking Advanced")
         result = get_ranking_productwise_advanced(
             division, kwargs.get("sales_type", "secondary"),
             kwargs.get("qty_filter", 0), kwargs.get("region"),
@@ -14467,55 +14735,32 @@ def export_ranking_report_excel(report_type, division=None, **kwargs):
             kwargs.get("from_date"), kwargs.get("to_date"))
         data = result.get("data", [])
         gl = result.get("group_label", "HQ")
-        row = write_title_rows(ws, f"Productwise Ranking Advanced – {division}", "")
+        sheet.title(f"Productwise Ranking Advanced – {division}", "")
         headers = ["Rank", "Region", gl, "Product Code", "Product Name", "Qty", "Value", "Value ₹ Lakhs"]
-        write_header_row(ws, row, headers)
-        row += 1
+        sheet.header(headers, style="header_dark")
         for d in data:
-            write_data_row(ws, row, [d["rank"], d["region"], d["group_key"],
-                                      d["product_code"], d["product_name"],
-                                      d["qty"], d["value"],
-                                      round(flt(d["value"]) / 100000, 2)])
-            row += 1
+            sheet.row([d["rank"], d["region"], d["group_key"],
+                      d["product_code"], d["product_name"],
+                      d["qty"], d["value"],
+                      round(flt(d["value"]) / 100000, 2)], style="cell_light")
 
     elif report_type == "pcpm_tracker":
-        ws.title = "PCPM Tracker"
+        sheet = book.sheet("PCPM Tracker")
         result = get_ranking_pcpm_tracker(
             division, kwargs.get("sales_type", "secondary"),
             kwargs.get("region"), kwargs.get("product_codes"))
         data = result.get("data", [])
-        row = write_title_rows(ws, f"PCPM Tracker – {division}",
-                               f"{result.get('fy_label', '')}  |  Sanctioned Strength: {result.get('sanctioned_strength', 0)}")
+        sheet.title(f"PCPM Tracker – {division}",
+                    f"{result.get('fy_label', '')}  |  Sanctioned Strength: {result.get('sanctioned_strength', 0)}")
         headers = ["Product Code", "Product Name"] + ml + ["Total", "Average", "PCPM"]
-        write_header_row(ws, row, headers)
-        row += 1
+        sheet.header(headers, style="header_dark")
         for d in data:
             vals = [d["product_code"], d["product_name"]] + d["months"] + [d["total"], d["average"], d["pcpm"]]
-            write_data_row(ws, row, vals)
-            row += 1
+            sheet.row(vals, style="cell_light")
     else:
         frappe.throw("Invalid report type")
 
-    # Auto-fit column widths
-    for col in ws.columns:
-        max_len = 0
-        col_letter = col[0].column_letter
-        for cell in col:
-            if cell.value:
-                max_len = max(max_len, len(str(cell.value)))
-        ws.column_dimensions[col_letter].width = min(max_len + 4, 50)
-
-    from io import BytesIO
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    xlsx_data = output.getvalue()
-
-    filename = f"Ranking_Report_{report_type}_{division}.xlsx"
-    frappe.local.response.filename = filename
-    frappe.local.response.filecontent = xlsx_data
-    frappe.local.response.type = "download"
-    frappe.local.response.content_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    return f"Ranking_Report_{report_type}_{division}.xlsx", book.save()
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -14529,15 +14774,14 @@ def _resolve_entity_hqs(division, entity_type, entity_name):
     'Region', 'Team' or 'HQ' — following Division → Zone → Region → Team → HQ.
     sanctioned_strength sums HQ per-capita (Team uses its sanctioned_strength).
     """
+    from scanify import org_closure
+
     hq_list = []
     entity_display = entity_name
     sanctioned_strength = 0.0
 
     if entity_type == "Organization":
-        hqs = frappe.get_all("HQ Master",
-                             filters={"status": "Active", "division": division},
-                             fields=["name"])
-        hq_list = [h.name for h in hqs]
+        hq_list = org_closure.descendants("Organization", of_type="HQ", division=division)
         total_pc = frappe.db.sql(
             "SELECT COALESCE(SUM(per_capita), 0) FROM `tabHQ Master` "
             "WHERE status='Active' AND division=%s", (division,))
@@ -14560,15 +14804,7 @@ def _resolve_entity_hqs(division, entity_type, entity_name):
         entity_display = f"{team_name} ({', '.join(hq_names)})" if hq_names else team_name
 
     elif entity_type == "Region":
-        teams = frappe.get_all("Team Master",
-                               filters={"region": entity_name, "status": "Active",
-                                        "division": ["in", [division, "Both"]]},
-                               fields=["name"])
-        for t in teams:
-            sub_hqs = frappe.get_all("HQ Master",
-                                     filters={"team": t.name, "status": "Active", "division": division},
-                                     fields=["name"])
-            hq_list.extend([h.name for h in sub_hqs])
+        hq_list = org_closure.descendants("Region", entity_name, "HQ", division)
         total_pc = frappe.db.sql(
             "SELECT COALESCE(SUM(per_capita), 0) FROM `tabHQ Master` "
             "WHERE team IN (SELECT name FROM `tabTeam Master` WHERE region=%s AND status='Active') "
@@ -14577,20 +14813,7 @@ def _resolve_entity_hqs(division, entity_type, entity_name):
         entity_display = frappe.db.get_value("Region Master", entity_name, "region_name") or entity_name
 
     elif entity_type == "Zone":
-        regions = frappe.get_all("Region Master",
-                                 filters={"zone": entity_name, "status": "Active",
-                                          "division": ["in", [division, "Both"]]},
-                                 fields=["name"])
-        for reg in regions:
-            sub_teams = frappe.get_all("Team Master",
-                                       filters={"region": reg.name, "status": "Active",
-                                                "division": ["in", [division, "Both"]]},
-                                       fields=["name"])
-            for t in sub_teams:
-                sub_hqs = frappe.get_all("HQ Master",
-                                         filters={"team": t.name, "status": "Active", "division": division},
-                                         fields=["name"])
-                hq_list.extend([h.name for h in sub_hqs])
+        hq_list = org_closure.descendants("Zone", entity_name, "HQ", division)
         total_pc = frappe.db.sql(
             "SELECT COALESCE(SUM(hm.per_capita), 0) FROM `tabHQ Master` hm "
             "INNER JOIN `tabTeam Master` tm ON hm.team = tm.name "
@@ -14621,6 +14844,7 @@ def _resolve_entity_hqs(division, entity_type, entity_name):
 # ═══════════════════════════════════════════════════════════════
 
 @frappe.whitelist()
+@cached_report
 def get_secondary_sales_moving_trend(division=None, entity_type="Team",
                                      entity_name=None, financial_year=None, sales_mode="after_deduction",
                                      product_codes=None, product_group=None, product_category=None):
@@ -14676,24 +14900,38 @@ def get_secondary_sales_moving_trend(division=None, entity_type="Team",
 
     # ── Get secondary sales (Stockist Statement Items) ──
     hq_placeholders = ", ".join(["%s"] * len(hq_list))
-    if sales_mode == "before_deduction":
-        _qty_expr = "(si.sales_qty + si.free_qty) / IFNULL(NULLIF(si.conversion_factor, 0), 1)"
+    from scanify import secondary_fact
+    if secondary_fact.is_ready():
+        # Pre-aggregated (division, month, stockist, product) rows — scanify.secondary_fact.
+        _suffix = "before" if sales_mode == "before_deduction" else "after"
+        sec_rows = frappe.db.sql(f"""
+            SELECT f.product_code, MONTH(f.statement_month) AS m,
+                   SUM(f.qty_{_suffix}) AS qty,
+                   SUM(f.value_{_suffix}) AS value
+              FROM `{secondary_fact.TABLE}` f
+             WHERE f.division = %s AND f.hq IN ({hq_placeholders})
+               AND f.statement_month BETWEEN %s AND %s
+          GROUP BY f.product_code, MONTH(f.statement_month)
+        """, [division] + hq_list + [fy_start, fy_end], as_dict=True)
     else:
-        _qty_expr = "(si.sales_qty + si.free_qty - IFNULL(si.free_qty_scheme, 0)) / IFNULL(NULLIF(si.conversion_factor, 0), 1)"
-    _val_expr = f"({_qty_expr}) * IFNULL(si.pts, 0)"
-    sec_rows = frappe.db.sql(f"""
-        SELECT si.product_code, si.pack,
-               MONTH(ss.statement_month) AS m,
-             SUM({_qty_expr}) AS qty,
-             SUM({_val_expr}) AS value
-        FROM `tabStockist Statement` ss
-        INNER JOIN `tabStockist Statement Item` si
-            ON si.parent = ss.name AND si.parenttype = 'Stockist Statement'
-        WHERE ss.division = %s AND ss.docstatus IN (0, 1)
-              AND ss.hq IN ({hq_placeholders})
-              AND ss.statement_month BETWEEN %s AND %s
-        GROUP BY si.product_code, si.pack, MONTH(ss.statement_month)
-    """, [division] + hq_list + [fy_start, fy_end], as_dict=True)
+        if sales_mode == "before_deduction":
+            _qty_expr = "(si.sales_qty + si.free_qty) / IFNULL(NULLIF(si.conversion_factor, 0), 1)"
+        else:
+            _qty_expr = "(si.sales_qty + si.free_qty - IFNULL(si.free_qty_scheme, 0)) / IFNULL(NULLIF(si.conversion_factor, 0), 1)"
+        _val_expr = f"({_qty_expr}) * IFNULL(si.pts, 0)"
+        sec_rows = frappe.db.sql(f"""
+            SELECT si.product_code, si.pack,
+                   MONTH(ss.statement_month) AS m,
+                 SUM({_qty_expr}) AS qty,
+                 SUM({_val_expr}) AS value
+            FROM `tabStockist Statement` ss
+            INNER JOIN `tabStockist Statement Item` si
+                ON si.parent = ss.name AND si.parenttype = 'Stockist Statement'
+            WHERE ss.division = %s AND ss.docstatus IN (0, 1)
+                  AND ss.hq IN ({hq_placeholders})
+                  AND ss.statement_month BETWEEN %s AND %s
+            GROUP BY si.product_code, si.pack, MONTH(ss.statement_month)
+        """, [division] + hq_list + [fy_start, fy_end], as_dict=True)
     # Items link by the Product Master id; the pivot below is keyed by the
     # business code (matching the master list's product_code).
     _apply_product_display_codes(sec_rows)
@@ -14826,6 +15064,7 @@ def get_secondary_sales_moving_trend(division=None, entity_type="Team",
 # ═══════════════════════════════════════════════════════════════
 
 @frappe.whitelist()
+@cached_report
 def get_primary_sales_moving_trend(division=None, entity_type="Team",
                                    entity_name=None, financial_year=None,
                                    product_codes=None):
@@ -14900,16 +15139,22 @@ def get_primary_sales_moving_trend(division=None, entity_type="Team",
         pcode_clause = f" AND pcode IN ({pp})"
         pcode_args = pcodes
 
+    # A financial year is whole months — read the monthly rollup when it is built.
+    from scanify import primary_rollup
+    if primary_rollup.is_ready():
+        source, date_col = f"`{primary_rollup.TABLE}`", "sales_month"
+    else:
+        source, date_col = "`tabPrimary Sales Data`", "invoicedate"
     pri_rows = frappe.db.sql(f"""
         SELECT pcode AS product_code,
-               MONTH(invoicedate) AS m,
+               MONTH({date_col}) AS m,
                SUM(quantity) AS qty,
                SUM(ptsvalue) AS value
-        FROM `tabPrimary Sales Data`
+        FROM {source}
         WHERE division = %s AND iscancelled = 0
           AND stockist_code IN ({sp_ph})
-          AND invoicedate BETWEEN %s AND %s{pcode_clause}
-        GROUP BY pcode, MONTH(invoicedate)
+          AND {date_col} BETWEEN %s AND %s{pcode_clause}
+        GROUP BY pcode, MONTH({date_col})
     """, [division] + stockist_codes + [fy_start, fy_end] + pcode_args, as_dict=True)
 
     # ── Pivot ──
@@ -15031,6 +15276,7 @@ def get_primary_sales_moving_trend(division=None, entity_type="Team",
 # ═══════════════════════════════════════════════════════════════
 
 @frappe.whitelist()
+@cached_report
 def get_organizational_sales_report(division=None, sales_type="primary",
                                     from_date=None, to_date=None,
                                     product_codes=None, sales_mode="after_deduction"):
@@ -15271,6 +15517,7 @@ def get_organizational_sales_report(division=None, sales_type="primary",
 # ═══════════════════════════════════════════════════════════════
 
 @frappe.whitelist()
+@cached_report
 def get_gynae_report(division=None, entity_type="Organization", entity_name=None,
                      financial_year=None, sales_mode="after_deduction"):
     """Report 15 – Gynae Report (Gynae-group secondary sales moving trend)."""
@@ -15393,6 +15640,7 @@ def get_gynae_report(division=None, entity_type="Organization", entity_name=None
 # ═══════════════════════════════════════════════════════════════
 
 @frappe.whitelist()
+@cached_report
 def get_region_wise_stockist_moving_trend(division=None, region=None, financial_year=None, sales_mode="after_deduction",
                                           product_codes=None, product_group=None, product_category=None):
     """
@@ -15626,6 +15874,7 @@ def get_region_wise_stockist_moving_trend(division=None, region=None, financial_
 # ═══════════════════════════════════════════════════════════════
 
 @frappe.whitelist()
+@cached_report
 def get_secondary_vs_closing_value_report(division=None, from_month=None, to_month=None,
                                           region_codes=None, sales_mode="after_deduction",
                                           product_codes=None, product_group=None, product_category=None):
@@ -15830,6 +16079,7 @@ def get_secondary_vs_closing_value_report(division=None, from_month=None, to_mon
 # ═══════════════════════════════════════════════════════════════
 
 @frappe.whitelist()
+@cached_report
 def get_target_vs_sales_report(division=None, from_month=None, to_month=None,
                                region_codes=None, sales_type="secondary",
                                sales_mode="after_deduction",
@@ -15958,15 +16208,22 @@ def get_target_vs_sales_report(division=None, from_month=None, to_month=None,
         stk_codes = list(stk_hq.keys())
         if stk_codes:
             sp_ph = ", ".join(["%s"] * len(stk_codes))
+            # The range is whole months — read the monthly rollup when it is built
+            # (same column names as Primary Sales Data).
+            from scanify import primary_rollup
+            if primary_rollup.is_ready():
+                source, date_col = f"`{primary_rollup.TABLE}`", "psd.sales_month"
+            else:
+                source, date_col = "`tabPrimary Sales Data`", "psd.invoicedate"
             pri_rows = frappe.db.sql(f"""
                 SELECT psd.stockist_code AS stockist_code,
-                       YEAR(psd.invoicedate) AS y, MONTH(psd.invoicedate) AS m,
+                       YEAR({date_col}) AS y, MONTH({date_col}) AS m,
                        SUM(psd.ptsvalue) AS val
-                  FROM `tabPrimary Sales Data` psd
+                  FROM {source} psd
                  WHERE psd.division = %s AND psd.iscancelled = 0
                    AND psd.stockist_code IN ({sp_ph})
-                   AND psd.invoicedate BETWEEN %s AND %s{pri_prod_clause}
-              GROUP BY psd.stockist_code, YEAR(psd.invoicedate), MONTH(psd.invoicedate)
+                   AND {date_col} BETWEEN %s AND %s{pri_prod_clause}
+              GROUP BY psd.stockist_code, YEAR({date_col}), MONTH({date_col})
             """, [division] + stk_codes + [from_date_d, to_date_d] + pri_prod_params,
                 as_dict=True)
             for r in pri_rows:
@@ -16141,6 +16398,7 @@ def _resolve_product_filter(division, product_codes=None, product_group=None, pr
 # ═══════════════════════════════════════════════════════════════
 
 @frappe.whitelist()
+@cached_report
 def get_monthly_organizational_report(division=None, month=None, team=None, hq=None,
                                       product_codes=None, product_group=None,
                                       product_category=None, limit=None):
@@ -16412,14 +16670,6 @@ def create_manual_statement(stockist_code, statement_month, items, uploaded_file
         if stockist_status != "Active":
             return {"success": False, "message": f"Stockist '{stockist_code}' is inactive. Statement cannot be created for an inactive stockist."}
 
-        # Check for duplicates (statements link by the master id)
-        existing = frappe.db.exists("Stockist Statement", {
-            "stockist_code": stockist_pk,
-            "statement_month": statement_month,
-        })
-        if existing:
-            return {"success": False, "message": f"A statement already exists: {existing}"}
-
         doc = frappe.new_doc("Stockist Statement")
         doc.stockist_code = stockist_pk
         doc.statement_month = statement_month
@@ -16459,7 +16709,12 @@ def create_manual_statement(stockist_code, statement_month, items, uploaded_file
             return {"success": False, "message": "No valid product rows provided."}
 
         doc.calculate_closing_and_totals()
-        doc.save(ignore_permissions=True)
+        # Insert-or-detect against the one-statement-per-month key (statements link
+        # by the master id).
+        from scanify.statement_unique import insert_statement
+        doc, existing = insert_statement(doc, ignore_permissions=True)
+        if existing:
+            return {"success": False, "message": f"A statement already exists: {existing}"}
         frappe.db.commit()
 
         return {
@@ -17264,16 +17519,25 @@ def get_secondary_sales_count(month, division=None, zone=None, region=None, team
     return {"statements": int(row.get("statements") or 0), "rows": int(row.get("rows") or 0)}
 
 
+# Stockists created (and committed) per batch by the background upload job.
+_SECONDARY_UPLOAD_CHUNK = 50
+# Row-level errors kept per parse (the total is always counted).
+_SECONDARY_ROW_ERROR_CAP = 1000
+
+
 @frappe.whitelist()
-def process_secondary_sales_upload(upload_month, file_url):
+def process_secondary_sales_upload(upload_month, file_url, dry_run=0):
     """Backfill secondary sales (stockist statements) from one month's Excel file.
 
-    See module header above for the strictness rules. Returns a summary dict with
-    counts and a capped list of human-readable warnings/errors.
+    See module header above for the strictness rules. Validates the request, records
+    a Secondary Sales Upload log and queues run_secondary_sales_upload, which does the
+    work in the background — a full month no longer holds a web worker. Returns the
+    log name; poll get_secondary_sales_upload_status for progress and the summary.
+
+    With dry_run=1 the file is only validated (see _secondary_upload_dry_run) and the
+    would-be counts plus row-level errors are returned straight away.
     """
-    import openpyxl
-    from datetime import datetime
-    from frappe.utils import get_first_day
+    from frappe.utils import cint
 
     user_division = get_user_division() or "Prima"
 
@@ -17281,8 +17545,6 @@ def process_secondary_sales_upload(upload_month, file_url):
     if not upload_month or not re.match(r"^\d{4}-\d{2}$", str(upload_month)):
         return {"success": False, "error": "Invalid month format. Use YYYY-MM."}
 
-    statement_month = get_first_day(str(upload_month) + "-01")
-
     # Resolve the uploaded file path
     file_path = frappe.get_site_path(file_url.lstrip("/"))
     if not os.path.exists(file_path):
@@ -17290,6 +17552,10 @@ def process_secondary_sales_upload(upload_month, file_url):
     if not os.path.exists(file_path):
         return {"success": False, "error": "Uploaded file not found on server."}
 
+    # Validate only: parse + duplicate check, nothing is written (no log record either)
+    if cint(dry_run):
+        return _secondary_upload_dry_run(file_path, upload_month, user_division)
+
     # Persistent log record (browsable in desk + on the portal import page)
     log_doc = frappe.get_doc({
         "doctype": "Secondary Sales Upload",
@@ -17298,13 +17564,42 @@ def process_secondary_sales_upload(upload_month, file_url):
         "uploaded_by": frappe.session.user,
         "upload_date": frappe.utils.now(),
         "file": file_url,
-        "status": "Processing",
+        "status": "Queued",
     })
     log_doc.insert(ignore_permissions=True)
     frappe.db.commit()
 
+    job = enqueue(
+        method="scanify.api.run_secondary_sales_upload",
+        queue="long",
+        timeout=7200,
+        job_name=f"secondary_upload_{log_doc.name}",
+        log_name=log_doc.name,
+        file_path=file_path,
+    )
+    frappe.db.set_value("Secondary Sales Upload", log_doc.name, "job_id", job.id if job else None)
+    frappe.db.commit()
+
+    return {
+        "success": True,
+        "queued": True,
+        "log_name": log_doc.name,
+        "month": str(upload_month),
+        "division": user_division,
+    }
+
+
+def _read_secondary_sales_workbook(file_path, user_division):
+    """Parse a secondary sales workbook into per-stockist item groups.
+
+    Streams the sheet in read-only mode and resolves stockists / products against
+    master caches loaded once. Returns a dict with `groups` (stockist id -> item dicts)
+    and the skip counters; raises frappe.ValidationError when the stockistcode column
+    is missing."""
+    import openpyxl
+
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
     try:
-        wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
         ws = wb.active
 
         # Headers from row 1 (lower-cased, trimmed)
@@ -17314,13 +17609,7 @@ def process_secondary_sales_upload(upload_month, file_url):
         # Require the stockist code column — it's the match key (compared against the
         # editable Stockist Code in the master). Stockist name is an optional fallback.
         if "stockistcode" not in [h for h in headers if h]:
-            wb.close()
-            log_doc.reload()
-            log_doc.status = "Failed"
-            log_doc.log = "Missing required column: stockistcode"
-            log_doc.save(ignore_permissions=True)
-            frappe.db.commit()
-            return {"success": False, "error": "Missing required column: stockistcode", "log_name": log_doc.name}
+            frappe.throw("Missing required column: stockistcode")
 
         # ── Caches ──
         # Stockist resolution: primary match by the editable Stockist Code, fallback by
@@ -17359,8 +17648,24 @@ def process_secondary_sales_upload(upload_month, file_url):
         blank_rows = 0
         total_data_rows = 0
         skipped_zero_sales = 0   # rows where the sales (quantity) column is 0
-
-        for row in ws.iter_rows(min_row=2, values_only=True):
+        row_errors = []          # [{row, stockist, pcode, error}], capped — rows skipped
+        row_error_count = 0
+        row_warnings = []        # same shape — rows imported, but worth a look
+        row_warning_count = 0
+
+        def _row_error(row_no, ident, pcode, error):
+            nonlocal row_error_count
+            row_error_count += 1
+            if len(row_errors) < _SECONDARY_ROW_ERROR_CAP:
+                row_errors.append({"row": row_no, "stockist": ident, "pcode": pcode, "error": error})
+
+        def _row_warning(row_no, ident, pcode, warning):
+            nonlocal row_warning_count
+            row_warning_count += 1
+            if len(row_warnings) < _SECONDARY_ROW_ERROR_CAP:
+                row_warnings.append({"row": row_no, "stockist": ident, "pcode": pcode, "error": warning})
+
+        for row_no, row in enumerate(ws.iter_rows(min_row=2, values_only=True), 2):
             if all(v is None for v in row):
                 continue
 
@@ -17387,6 +17692,7 @@ def process_secondary_sales_upload(upload_month, file_url):
             ident = stk_code or stk_name
             if not ident:
                 unmatched_names["(blank stockist code/name)"] = unmatched_names.get("(blank stockist code/name)", 0) + 1
+                _row_error(row_no, "", pcode, "Blank stockist code and name")
                 continue
 
             match = None
@@ -17396,9 +17702,11 @@ def process_secondary_sales_upload(upload_month, file_url):
                 match = stockist_name_cache.get(stk_name.lower())
             if not match:
                 unmatched_names[ident] = unmatched_names.get(ident, 0) + 1
+                _row_error(row_no, ident, pcode, "Stockist not found in Stockist Master")
                 continue
             if (match.get("status") or "Active") != "Active":
                 inactive_names[ident] = match["id"]
+                _row_error(row_no, ident, pcode, "Stockist is inactive")
                 continue
 
             # Group by and link via the internal id (S####) — required for the
@@ -17421,6 +17729,7 @@ def process_secondary_sales_upload(upload_month, file_url):
                 product_code = None
                 mapping_status = "unmapped"
                 unmapped_products += 1
+                _row_warning(row_no, ident, pcode, "Product code not found in Product Master (kept as unmapped)")
 
             # Valuation rate = NRV (the net / final price rate). It equals PTS when no
             # discount was given and is lower when a discount was applied, so it is the
@@ -17445,16 +17754,147 @@ def process_secondary_sales_upload(upload_month, file_url):
 
             groups.setdefault(stockist_code, []).append(item)
 
+    finally:
         wb.close()
 
+    return {
+        "groups": groups,
+        "unmatched_names": unmatched_names,
+        "inactive_names": inactive_names,
+        "unmapped_products": unmapped_products,
+        "blank_rows": blank_rows,
+        "total_data_rows": total_data_rows,
+        "skipped_zero_sales": skipped_zero_sales,
+        "row_errors": row_errors,
+        "row_error_count": row_error_count,
+        "row_warnings": row_warnings,
+        "row_warning_count": row_warning_count,
+    }
+
+
+def _existing_secondary_statements(stockists, statement_month):
+    """{stockist id: statement name} for stockists that already have a live (draft or
+    submitted) statement for the month — one query per 500 stockists. Used by the dry
+    run; the upload itself relies on statement_unique's key."""
+    from frappe.utils import getdate
+    from scanify.statement_unique import find_live
+
+    month = str(getdate(statement_month))
+    found = find_live([(code, month) for code in stockists])
+    return {code: name for (code, _m), name in found.items()}
+
+
+def _secondary_upload_dry_run(file_path, upload_month, user_division):
+    """Validate a secondary sales workbook without writing anything.
+
+    Streams the file through the same parser as the import, checks every stockist in
+    it against existing statements in one pass and returns the counts the import would
+    produce plus row-level error and warning lists, so a bad file is rejected in seconds.
+    Warnings (unmapped products — the import keeps those rows) do not affect `valid`."""
+    from frappe.utils import get_first_day
+
+    try:
+        parsed = _read_secondary_sales_workbook(file_path, user_division)
+    except frappe.ValidationError as e:
+        return {"success": False, "dry_run": True, "error": str(e)}
     except Exception as e:
+        return {"success": False, "dry_run": True, "error": f"Could not read the Excel file: {str(e)}"}
+
+    groups = parsed["groups"]
+    existing = _existing_secondary_statements(list(groups), get_first_day(str(upload_month) + "-01"))
+    to_create = [code for code in groups if code not in existing]
+
+    messages = []
+    if existing:
+        names = [f"{code} ({name})" for code, name in list(existing.items())[:15]]
+        messages.append(
+            f"{len(existing)} stockist(s) already have a statement for this month and would be "
+            f"skipped — delete those first to re-import: " + "; ".join(names) +
+            (" ..." if len(existing) > 15 else "")
+        )
+    if parsed["row_error_count"] > len(parsed["row_errors"]):
+        messages.append(f"Showing the first {len(parsed['row_errors'])} of "
+                        f"{parsed['row_error_count']} row errors.")
+    if parsed["row_warning_count"] > len(parsed["row_warnings"]):
+        messages.append(f"Showing the first {len(parsed['row_warnings'])} of "
+                        f"{parsed['row_warning_count']} row warnings.")
+
+    return {
+        "success": True,
+        "dry_run": True,
+        "valid": not parsed["row_error_count"] and not existing and bool(to_create),
+        "month": str(upload_month),
+        "division": user_division,
+        "total_data_rows": parsed["total_data_rows"],
+        "stockists_in_file": len(groups),
+        "statements_to_create": len(to_create),
+        "items_to_create": sum(len(groups[code]) for code in to_create),
+        "skipped_existing": len(existing),
+        "unmatched_stockists": len(parsed["unmatched_names"]),
+        "inactive_stockists": len(parsed["inactive_names"]),
+        "unmapped_products": parsed["unmapped_products"],
+        "skipped_zero_sales": parsed["skipped_zero_sales"],
+        "row_error_count": parsed["row_error_count"],
+        "row_errors": parsed["row_errors"],
+        "row_warning_count": parsed["row_warning_count"],
+        "row_warnings": parsed["row_warnings"],
+        "messages": messages,
+    }
+
+
+def _secondary_upload_progress(log_name, user, progress, **counts):
+    """Persist + push live progress for a running secondary upload."""
+    frappe.db.set_value("Secondary Sales Upload", log_name, dict(counts, progress=progress),
+                        update_modified=False)
+    frappe.db.commit()
+    frappe.publish_realtime(
+        "secondary_sales_upload_progress",
+        dict(counts, log_name=log_name, progress=progress),
+        user=user,
+    )
+
+
+def run_secondary_sales_upload(log_name, file_path):
+    """Background job for process_secondary_sales_upload.
+
+    Statements are created in batches of _SECONDARY_UPLOAD_CHUNK stockists through the
+    bulk path in scanify.statement_bulk (cached masters, multi-row INSERTs, set-based
+    totals) and committed per batch, so progress is visible as it goes and a failure
+    only loses the batch in flight. A batch that fails as a whole is retried one
+    statement at a time to isolate the offending stockist, as the per-doc loop did."""
+    from frappe.utils import get_first_day
+    from scanify.statement_bulk import create_statements
+    from scanify.utils import chunked
+
+    log_doc = frappe.get_doc("Secondary Sales Upload", log_name)
+    upload_month = log_doc.upload_month
+    user_division = log_doc.division
+    user = log_doc.uploaded_by or frappe.session.user
+    statement_month = get_first_day(str(upload_month) + "-01")
+
+    log_doc.status = "Processing"
+    log_doc.progress = 0
+    log_doc.save(ignore_permissions=True)
+    frappe.db.commit()
+
+    try:
+        parsed = _read_secondary_sales_workbook(file_path, user_division)
+    except Exception as e:
+        error = str(e) if isinstance(e, frappe.ValidationError) else f"Could not read the Excel file: {str(e)}"
         frappe.log_error(f"Secondary Sales Upload (read) Error: {str(e)}", "Secondary Sales Upload")
         log_doc.reload()
         log_doc.status = "Failed"
-        log_doc.log = f"Could not read the Excel file: {str(e)}"
+        log_doc.log = error
         log_doc.save(ignore_permissions=True)
         frappe.db.commit()
-        return {"success": False, "error": f"Could not read the Excel file: {str(e)}", "log_name": log_doc.name}
+        return {"success": False, "error": error, "log_name": log_doc.name}
+
+    groups = parsed["groups"]
+    unmatched_names = parsed["unmatched_names"]
+    inactive_names = parsed["inactive_names"]
+    unmapped_products = parsed["unmapped_products"]
+    total_data_rows = parsed["total_data_rows"]
+    skipped_zero_sales = parsed["skipped_zero_sales"]
 
     # ── Create one Stockist Statement per stockist (DRAFT) ──
     statements_created = 0
@@ -17462,39 +17902,53 @@ def process_secondary_sales_upload(upload_month, file_url):
     skipped_existing = []       # list of {stockist, name}
     create_errors = []          # per-stockist failures
 
-    for stockist_code, items in groups.items():
+    # No existence pre-check: statement_unique's key rejects a stockist whose month
+    # already has a live statement and create_statements reports it as a duplicate.
+    notes = f"Backfilled via secondary sales bulk upload ({upload_month})."
+    pending = list(groups)
+    _secondary_upload_progress(log_name, user, 5, total_data_rows=total_data_rows,
+                               stockists_in_file=len(groups), skipped_existing=len(skipped_existing))
+
+    def _spec(code):
+        return ({
+            "stockist_code": code,
+            "extracted_data_status": "Completed",
+            "skip_conversion": 1,   # quantities are already final → value = qty x rate
+            "extraction_notes": notes,
+        }, groups[code])
+
+    for batch_no, batch in enumerate(chunked(pending, _SECONDARY_UPLOAD_CHUNK), 1):
         try:
-            existing = frappe.db.exists("Stockist Statement", {
-                "stockist_code": stockist_code,
-                "statement_month": statement_month,
-            })
-            if existing:
-                skipped_existing.append({
-                    "stockist": stockist_code,
-                    "name": existing,
-                })
-                continue
-
-            doc = frappe.new_doc("Stockist Statement")
-            doc.stockist_code = stockist_code
-            doc.statement_month = statement_month
-            doc.extracted_data_status = "Completed"
-            doc.skip_conversion = 1   # quantities are already final → value = qty x rate
-            doc.extraction_notes = f"Backfilled via secondary sales bulk upload ({upload_month})."
-            for it in items:
-                doc.append("items", it)
-
-            # Controller computes conversion factor, values and totals on validate.
-            doc.insert(ignore_permissions=True)   # saved as Draft (docstatus = 0)
+            created, errors, duplicates = create_statements(
+                [_spec(code) for code in batch], statement_month)
             frappe.db.commit()
-
-            statements_created += 1
-            items_created += len(items)
-
-        except Exception as e:
+        except Exception:
             frappe.db.rollback()
-            create_errors.append(f"{stockist_code}: {str(e)}")
-            frappe.log_error(frappe.get_traceback(), "Secondary Sales Upload (create) Error")
+            frappe.log_error(frappe.get_traceback(), "Secondary Sales Upload (batch) Error")
+            created, errors, duplicates = [], [], {}
+            for code in batch:
+                try:
+                    one, one_errors, one_duplicates = create_statements([_spec(code)], statement_month)
+                    frappe.db.commit()
+                    created += one
+                    errors += one_errors
+                    duplicates.update(one_duplicates)
+                except Exception as e:
+                    frappe.db.rollback()
+                    errors.append((code, str(e)))
+                    frappe.log_error(frappe.get_traceback(), "Secondary Sales Upload (create) Error")
+
+        statements_created += len(created)
+        items_created += sum(len(groups[code]) for code, _name in created)
+        create_errors += [f"{code}: {msg}" for code, msg in errors]
+        skipped_existing += [{"stockist": code, "name": name} for code, name in duplicates.items()]
+
+        _secondary_upload_progress(
+            log_name, user,
+            5 + 95 * min(batch_no * _SECONDARY_UPLOAD_CHUNK, len(pending)) / max(len(pending), 1),
+            statements_created=statements_created, items_created=items_created,
+            create_errors=len(create_errors), skipped_existing=len(skipped_existing),
+        )
 
     # ── Build human-readable messages (capped for the UI) ──
     messages = []
@@ -17564,6 +18018,7 @@ def process_secondary_sales_upload(upload_month, file_url):
     try:
         log_doc.reload()
         log_doc.status = "Completed"
+        log_doc.progress = 100
         log_doc.total_data_rows = total_data_rows
         log_doc.stockists_in_file = len(groups)
         log_doc.statements_created = statements_created
@@ -17574,44 +18029,84 @@ def process_secondary_sales_upload(upload_month, file_url):
         log_doc.unmapped_products = unmapped_products
         log_doc.create_errors = len(create_errors)
         log_doc.skipped_zero_sales = skipped_zero_sales
+        log_doc.messages = json.dumps(messages)
         log_doc.log = full_log[:140000]
         log_doc.save(ignore_permissions=True)
         frappe.db.commit()
     except Exception:
         frappe.log_error(frappe.get_traceback(), "Secondary Sales Upload (log save) Error")
 
-    return {
-        "success": True,
-        "log_name": log_doc.name,
-        "month": str(upload_month),
-        "division": user_division,
-        "total_data_rows": total_data_rows,
-        "statements_created": statements_created,
-        "items_created": items_created,
-        "stockists_in_file": len(groups),
-        "skipped_existing": len(skipped_existing),
-        "unmatched_stockists": len(unmatched_names),
-        "inactive_stockists": len(inactive_names),
-        "unmapped_products": unmapped_products,
-        "skipped_zero_sales": skipped_zero_sales,
-        "create_errors": len(create_errors),
-        "messages": messages,
-    }
+    frappe.publish_realtime(
+        "secondary_sales_upload_progress",
+        {"log_name": log_name, "progress": 100, "status": "Completed"},
+        user=user,
+    )
+    return {"success": True, "log_name": log_doc.name}
+
+
+@frappe.whitelist()
+def get_secondary_sales_upload_status(name):
+    """Cheap polling endpoint for a queued/running secondary upload: status, progress
+    and the summary counts (the full log stays on get_secondary_sales_upload_log)."""
+    if not name:
+        return {"success": False, "message": "Upload name is required"}
+    user_division = get_user_division() or "Prima"
+    row = frappe.db.get_value(
+        "Secondary Sales Upload", name,
+        ["name", "upload_month", "division", "status", "progress",
+         "total_data_rows", "stockists_in_file", "statements_created", "items_created",
+         "skipped_existing", "unmatched_stockists", "inactive_stockists",
+         "unmapped_products", "create_errors", "skipped_zero_sales", "messages"],
+        as_dict=True,
+    )
+    if not row:
+        return {"success": False, "message": "Upload record not found"}
+    if row.division and row.division != user_division and "System Manager" not in frappe.get_roles():
+        return {"success": False, "message": "Not permitted for this division"}
+    try:
+        row["messages"] = json.loads(row.get("messages") or "[]")
+    except Exception:
+        row["messages"] = []
+    row["month"] = row.get("upload_month")
+    if row.status == "Failed":
+        row["error"] = (frappe.db.get_value("Secondary Sales Upload", name, "log") or "")[:500]
+    return {"success": True, "data": row}
 
 
 @frappe.whitelist()
+@require_process("secondary")
 def export_secondary_sales_data(month, division=None, zone=None, region=None,
-                                team=None, hq=None, docstatus=None):
-    """Export secondary sales (stockist statement) data as Excel for a month.
+                                team=None, hq=None, docstatus=None, format_type="xlsx"):
+    """Queue a secondary sales export (an Export Job; see scanify.export_jobs).
+    format_type: "xlsx", or "csv.gz" for a raw gzipped CSV."""
+    from scanify import export_jobs
+
+    if not month:
+        frappe.throw("Month is required")
+    if format_type not in _SALES_EXPORT_FORMATS:
+        frappe.throw(f"Invalid format: {format_type}")
+    return export_jobs.start(
+        "secondary_sales", month=month, division=division or get_user_division() or "Prima",
+        zone=zone, region=region, team=team, hq=hq, docstatus=docstatus,
+        format_type=format_type)
+
+
+def build_secondary_sales_export(month, division=None, zone=None, region=None,
+                                 team=None, hq=None, docstatus=None, format_type="xlsx",
+                                 progress=None):
+    """Export job builder: secondary sales (stockist statement) data for a month, as
+    Excel or a gzipped CSV, streamed from an unbuffered cursor.
 
     Output columns mirror the import template so the file round-trips. Optional
     org filters (zone/region/team/hq) narrow the export. Value columns are
     recomputed from the stored quantities and per-line PTS.
     """
-    import openpyxl
-    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
     from frappe.utils import get_first_day, get_last_day
 
+    from scanify.export_jobs import track
+    from scanify.stream_export import iter_rows, temp_path, write_csv_gz
+    from scanify.xlsx_stream import XlsxStream
+
     if not division:
         division = get_user_division() or "Prima"
     if not month:
@@ -17640,7 +18135,28 @@ def export_secondary_sales_data(month, division=None, zone=None, region=None,
         conditions.append("ss.hq = %(hq)s"); params["hq"] = hq
 
     where = " AND ".join(conditions)
-    rows = frappe.db.sql(f"""
+    from_sql = f"""
+        FROM `tabStockist Statement` ss
+        INNER JOIN `tabStockist Statement Item` si
+            ON si.parent = ss.name AND si.parenttype = 'Stockist Statement'
+        WHERE {where}
+    """
+    total = frappe.db.sql(f"SELECT COUNT(*) {from_sql}", params)[0][0]
+
+    if not total:
+        frappe.throw(f"No secondary sales data found for {str(month)[:7]} in {division} division")
+
+    # Resolve org codes → display names through the shared master dictionaries
+    # (before streaming: nothing may query the database while the cursor is open)
+    from scanify import master_dict
+    stk_codes = master_dict.lookup("Stockist Master")   # PK (S####) -> real stockist_code
+    hq_names = master_dict.lookup("HQ Master")
+    team_names = master_dict.lookup("Team Master")
+    region_names = master_dict.lookup("Region Master")
+    zone_names = master_dict.lookup("Zone Master")
+    prod_meta = master_dict.rows("Product Master")    # id -> {product_code, mrp, ptr, pts, ...}
+
+    rows = iter_rows(f"""
         SELECT
             ss.stockist_code, ss.stockist_name, ss.statement_month,
             ss.hq, ss.team, ss.region, ss.zone,
@@ -17648,69 +18164,31 @@ def export_secondary_sales_data(month, division=None, zone=None, region=None,
             si.opening_qty, si.purchase_qty, si.sales_qty, si.free_qty,
             si.closing_qty, si.conversion_factor, si.pts,
             si.opening_value, si.sales_value_pts, si.sales_value_ptr, si.closing_value
-        FROM `tabStockist Statement` ss
-        INNER JOIN `tabStockist Statement Item` si
-            ON si.parent = ss.name AND si.parenttype = 'Stockist Statement'
-        WHERE {where}
+        {from_sql}
         ORDER BY ss.stockist_name, si.product_code
-    """, params, as_dict=True)
-
-    if not rows:
-        frappe.throw(f"No secondary sales data found for {str(month)[:7]} in {division} division")
-
-    # Resolve org codes → display names (cached)
-    team_names, region_names, zone_names, hq_names = {}, {}, {}, {}
-    stk_codes = {}   # Stockist Master PK (S####) -> real stockist_code
-    prod_meta = {}   # product_code -> {mrp, ptr, product_group, pts, pack, product_name}
+    """, params)
 
     def _stk_code(pk):
         # ss.stockist_code is a Link to Stockist Master, so it holds the PK (S####),
         # not the human stockist code. Resolve to the real code for export.
-        if not pk:
-            return ""
-        if pk not in stk_codes:
-            stk_codes[pk] = frappe.db.get_value("Stockist Master", pk, "stockist_code") or pk
-        return stk_codes[pk]
+        return stk_codes.get(pk, pk) if pk else ""
 
     def _hq_name(code):
-        if not code:
-            return ""
-        if code not in hq_names:
-            hq_names[code] = frappe.db.get_value("HQ Master", code, "hq_name") or code
-        return hq_names[code]
+        return hq_names.get(code, code) if code else ""
 
     def _team_name(code):
-        if not code:
-            return ""
-        if code not in team_names:
-            team_names[code] = frappe.db.get_value("Team Master", code, "team_name") or code
-        return team_names[code]
+        return team_names.get(code, code) if code else ""
 
     def _region_name(code):
-        if not code:
-            return ""
-        if code not in region_names:
-            region_names[code] = frappe.db.get_value("Region Master", code, "region_name") or code
-        return region_names[code]
+        return region_names.get(code, code) if code else ""
 
     def _zone_name(code):
-        if not code:
-            return ""
-        if code not in zone_names:
-            zone_names[code] = frappe.db.get_value("Zone Master", code, "zone_name") or code
-        return zone_names[code]
+        return zone_names.get(code, code) if code else ""
 
     def _prod(code):
-        # si.product_code is a Link (Product Master id); fetch the business
-        # product_code too so the export shows the human-facing code.
-        if not code:
-            return {}
-        if code not in prod_meta:
-            prod_meta[code] = frappe.db.get_value(
-                "Product Master", code,
-                ["product_code", "mrp", "ptr", "pts", "pack", "product_name", "product_group"],
-                as_dict=True) or {}
-        return prod_meta[code]
+        # si.product_code is a Link (Product Master id); the business product_code
+        # comes along so the export shows the human-facing code.
+        return (prod_meta.get(code) or {}) if code else {}
 
     # Output headers (match import template order)
     excel_headers = [
@@ -17721,25 +18199,9 @@ def export_secondary_sales_data(month, division=None, zone=None, region=None,
         "nrv", "nrvvalue", "clsvalue", "opsvalue", "product_head",
     ]
 
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = f"Secondary Sales {str(month)[:7]}"
-
-    header_font = Font(bold=True, size=11, color="FFFFFF")
-    header_fill = PatternFill(start_color="217346", end_color="217346", fill_type="solid")
-    header_alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-    thin_border = Border(left=Side(style="thin"), right=Side(style="thin"),
-                         top=Side(style="thin"), bottom=Side(style="thin"))
-
-    for col_idx, header in enumerate(excel_headers, 1):
-        cell = ws.cell(row=1, column=col_idx, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-        cell.border = thin_border
-
     stmt_date = str(last_day)
-    for r_idx, row in enumerate(rows, 2):
+
+    def _values(row):
         prod = _prod(row.get("product_code"))
         conv = flt(row.get("conversion_factor")) or 1
         sales_base = flt(row.get("sales_qty")) / conv
@@ -17750,7 +18212,7 @@ def export_secondary_sales_data(month, division=None, zone=None, region=None,
         mrp_rate = flt(prod.get("mrp") or 0)
         ptr_rate = flt(prod.get("ptr") or 0)
 
-        out = [
+        return [
             _stk_code(row.get("stockist_code")),                  # real stockist code, not Master PK
             row.get("stockist_name") or "",
             _hq_name(row.get("hq")),                              # citypool (mapped from stockist HQ)
@@ -17778,30 +18240,15 @@ def export_secondary_sales_data(month, division=None, zone=None, region=None,
             flt(row.get("opening_value")),                        # opsvalue (net-based)
             prod.get("product_group") or "",                      # product_head
         ]
-        for c_idx, val in enumerate(out, 1):
-            cell = ws.cell(row=r_idx, column=c_idx, value=val)
-            cell.border = thin_border
-
-    for col in ws.columns:
-        max_length = 0
-        col_letter = col[0].column_letter
-        for cell in col:
-            if cell.value is not None:
-                max_length = max(max_length, len(str(cell.value)))
-        ws.column_dimensions[col_letter].width = min(max_length + 3, 32)
 
-    ws.freeze_panes = "A2"
+    rows = track(rows, total, progress)
+    if format_type == "csv.gz":
+        return f"Secondary_Sales_{division}_{str(month)[:7]}.csv.gz", write_csv_gz(
+            excel_headers, (_values(r) for r in rows))
 
-    fname = f"Secondary_Sales_{division}_{str(month)[:7]}.xlsx"
-    out_path = os.path.join(tempfile.gettempdir(), fname)
-    wb.save(out_path)
-    with open(out_path, "rb") as f:
-        file_content = f.read()
-    try:
-        os.remove(out_path)
-    except OSError:
-        pass
+    book = XlsxStream()
+    sheet = book.sheet(f"Secondary Sales {str(month)[:7]}", freeze="A2", pad=3, max_width=32)
+    sheet.header(excel_headers, style="header_green")
+    sheet.rows(rows, template=_values)
 
-    frappe.local.response.filename = fname
-    frappe.local.response.filecontent = file_content
-    frappe.local.response.type = "download"
+    return f"Secondary_Sales_{division}_{str(month)[:7]}.xlsx", book.save(temp_path(".xlsx"))
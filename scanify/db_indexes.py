@@ -0,0 +1,138 @@
+"""Curated composite indexes for the hot report paths.
+
+No Scanify doctype declares search_index and Frappe only creates single-column keys
+for Links, so every report filtering on division + month + status scanned the whole
+table. HOT_PATH_INDEXES is the curated set; ensure_indexes() creates whatever is
+missing (run by the add_hot_path_indexes patch) and index_usage() / explain_hot_paths()
+feed the /portal/db-indexes admin page and the EXPLAIN regression test.
+"""
+
+import frappe
+
+# (doctype, index name, columns) — leftmost columns are the equality filters every
+# caller applies, the range / sort column comes last.
+HOT_PATH_INDEXES = [
+    ("Stockist Statement", "idx_ss_div_month_status_hq",
+     ("division", "statement_month", "docstatus", "hq")),
+    ("Stockist Statement", "idx_ss_stockist_month",
+     ("stockist_code", "statement_month")),
+    ("Stockist Statement Item", "idx_ssi_parent_product",
+     ("parent", "product_code")),
+    ("Primary Sales Data", "idx_psd_div_invdate_stockist",
+     ("division", "invoicedate", "stockist_code")),
+    ("Primary Sales Data", "idx_psd_div_month_invdate",
+     ("division", "upload_month", "invoicedate")),
+    ("Scheme Request", "idx_sr_div_appdate_status",
+     ("division", "application_date", "approval_status")),
+]
+
+# Representative report queries: (label, doctype, index expected, sql, params)
+HOT_PATH_QUERIES = [
+    ("Statements for a division and month", "Stockist Statement", "idx_ss_div_month_status_hq",
+     """SELECT name, stockist_code, total_closing_value FROM `tabStockist Statement`
+         WHERE division = %(division)s AND statement_month = %(month)s AND docstatus = 1""",
+     {"division": "Prima", "month": "2026-01-01"}),
+    ("Previous statement of a stockist", "Stockist Statement", "idx_ss_stockist_month",
+     """SELECT name FROM `tabStockist Statement`
+         WHERE stockist_code = %(stockist)s AND statement_month = %(month)s AND docstatus = 1""",
+     {"stockist": "S0001", "month": "2026-01-01"}),
+    ("Statement lines for a product", "Stockist Statement Item", "idx_ssi_parent_product",
+     """SELECT closing_qty FROM `tabStockist Statement Item`
+         WHERE parent = %(parent)s AND product_code = %(product)s""",
+     {"parent": "S0001-2026-01-01-0001", "product": "P0001"}),
+    ("Primary sales of a stockist over a date range", "Primary Sales Data", "idx_psd_div_invdate_stockist",
+     """SELECT SUM(ptsvalue) FROM `tabPrimary Sales Data`
+         WHERE division = %(division)s AND invoicedate BETWEEN %(start)s AND %(end)s
+           AND stockist_code = %(stockist)s""",
+     {"division": "Prima", "start": "2026-01-01", "end": "2026-03-31", "stockist": "S0001"}),
+    ("Primary sales list for a month", "Primary Sales Data", "idx_psd_div_month_invdate",
+     """SELECT name FROM `tabPrimary Sales Data`
+         WHERE division = %(division)s AND upload_month = %(month)s
+      ORDER BY invoicedate, name LIMIT 51""",
+     {"division": "Prima", "month": "2026-01"}),
+    ("Approved schemes over a date range", "Scheme Request", "idx_sr_div_appdate_status",
+     """SELECT name, total_scheme_value FROM `tabScheme Request`
+         WHERE division = %(division)s AND application_date BETWEEN %(start)s AND %(end)s
+           AND approval_status = 'Approved'""",
+     {"division": "Prima", "start": "2026-01-01", "end": "2026-03-31"}),
+]
+
+
+def ensure_indexes():
+    """Create every missing curated index. Returns the names created."""
+    created = []
+    for doctype, name, columns in HOT_PATH_INDEXES:
+        if not frappe.db.sql(f"SHOW INDEX FROM `tab{doctype}` WHERE Key_name = %s", name):
+            frappe.db.sql_ddl(
+                f"ALTER TABLE `tab{doctype}` ADD INDEX `{name}` ({', '.join(f'`{c}`' for c in columns)})"
+            )
+            created.append(name)
+    return created
+
+
+def _userstat_enabled():
+    """MariaDB only fills INDEX_STATISTICS while the userstat variable is ON."""
+    row = frappe.db.sql("SHOW GLOBAL VARIABLES LIKE 'userstat'")
+    return bool(row) and str(row[0][1]).upper() in ("ON", "1")
+
+
+def index_usage():
+    """Every secondary index on the hot tables with its columns, cardinality and —
+    when MariaDB's userstat is ON — rows read through it since the last flush."""
+    tables = sorted({f"tab{dt}" for dt, _n, _c in HOT_PATH_INDEXES})
+    curated = {name for _dt, name, _c in HOT_PATH_INDEXES}
+    stats = frappe.db.sql(f"""
+        SELECT TABLE_NAME AS table_name, INDEX_NAME AS index_name,
+               GROUP_CONCAT(COLUMN_NAME ORDER BY SEQ_IN_INDEX) AS columns,
+               MAX(CARDINALITY) AS cardinality, MIN(NON_UNIQUE) = 0 AS is_unique
+          FROM information_schema.STATISTICS
+         WHERE TABLE_SCHEMA = DATABASE()
+           AND TABLE_NAME IN ({', '.join(['%s'] * len(tables))})
+           AND INDEX_NAME != 'PRIMARY'
+      GROUP BY TABLE_NAME, INDEX_NAME
+      ORDER BY TABLE_NAME, INDEX_NAME
+    """, tuple(tables), as_dict=True)
+
+    reads = {}
+    userstat = _userstat_enabled()
+    if userstat:
+        for r in frappe.db.sql("""
+            SELECT TABLE_NAME, INDEX_NAME, ROWS_READ FROM information_schema.INDEX_STATISTICS
+             WHERE TABLE_SCHEMA = DATABASE()
+        """):
+            reads[(r[0], r[1])] = r[2]
+
+    for s in stats:
+        s["doctype"] = s.table_name[3:]
+        s["curated"] = s.index_name in curated
+        s["rows_read"] = reads.get((s.table_name, s.index_name)) if userstat else None
+    missing = [{"doctype": dt, "index_name": name, "columns": ",".join(cols)}
+               for dt, name, cols in HOT_PATH_INDEXES
+               if not any(s.index_name == name for s in stats)]
+    return {"indexes": stats, "missing": missing, "userstat": userstat}
+
+
+def explain(sql, params=None):
+    return frappe.db.sql(f"EXPLAIN {sql}", params or {}, as_dict=True)
+
+
+def explain_hot_paths():
+    """EXPLAIN each HOT_PATH_QUERIES entry: which key the optimiser picked and whether
+    the curated index is among its candidates."""
+    out = []
+    for label, doctype, expected, sql, params in HOT_PATH_QUERIES:
+        plan = [r for r in explain(sql, params) if r.get("table") in (f"tab{doctype}", None)]
+        row = plan[0] if plan else {}
+        possible = (row.get("possible_keys") or "").split(",")
+        out.append({
+            "label": label,
+            "doctype": doctype,
+            "expected": expected,
+            "key": row.get("key"),
+            "possible_keys": row.get("possible_keys"),
+            "type": row.get("type"),
+            "rows": row.get("rows"),
+            "extra": row.get("Extra"),
+            "candidate": expected in possible,
+        })
+    return out
@@ -0,0 +1,323 @@
+"""Background export jobs.
+
+The portal exports used to build their files inside the whitelisted request; a big
+month ran into the request timeout, users retried, and every retry started the whole
+export again on another web worker. Now an export endpoint only records an Export Job
+and queues it:
+
+    start(export_type, **params)   queue (or join) a job, return its status
+    run(export_job)                the RQ job: build the file, attach it, notify
+    status(name)                   what the portal polls
+
+A builder (EXPORTS) takes the export's params plus a progress(percent) callback (track()
+reports a row loop through it) and returns (filename, content) — content is the file's
+bytes / text, or the path of a temporary file it wrote — optionally followed by a
+details dict, kept on the job and returned with its status. The file is kept as a private
+File attached to the job and served to the requester through download(). Progress
+and completion are pushed to the user on the `scanify_export_progress` realtime event
+and also kept for polling — completion on the job, running progress in the cache.
+
+A user asking again for an export that is still queued or running joins that job
+instead of starting a second one. Finished files are also reused: every job carries a
+cache key of
+
+    export type + params + the requester's scope + data version
+
+(scope and version as report_cache keys its results, so any bump() there orphans the
+exports too). A request whose key matches an unexpired completed job gets a new job
+that is already Completed and points at the same file — a repeat download costs a file
+read, not a regeneration.
+
+Jobs and their files expire after EXPORT_TTL_HOURS (a cache hit expires with the job it
+reuses); cleanup_expired() (hourly) deletes them, and fails jobs stuck in the queue.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+import frappe
+from frappe.utils import add_to_date, cint, now_datetime
+from frappe.utils.background_jobs import enqueue
+
+EXPORT_TTL_HOURS = 24
+# A queued / running job older than this died with its worker.
+_STALE_HOURS = 3
+
+# export type -> builder (dotted path)
+EXPORTS = {
+    "primary_sales": "scanify.api.build_primary_sales_export",
+    "secondary_sales": "scanify.api.build_secondary_sales_export",
+    "master": "scanify.api.build_master_export",
+    "all_masters": "scanify.api.build_all_masters_export",
+    "scheme_report": "scanify.api.build_scheme_report_export",
+    "ranking_report": "scanify.api.build_ranking_report_export",
+    "stockist_report": "scanify.api.build_stockist_report_export",
+}
+
+_ACTIVE = ("Queued", "Processing")
+_PROGRESS_KEY = "scanify:export_progress:{}"
+
+
+def _params_json(params):
+    # Request plumbing (cmd, jQuery's "_" cache buster) that reaches **kwargs
+    # endpoints is not part of the export.
+    return json.dumps({k: v for k, v in params.items()
+                       if v not in (None, "") and k != "cmd" and not k.startswith("_")},
+                      sort_keys=True, default=str)
+
+
+def _cache_key(export_type, params_json, division):
+    from scanify import report_cache
+    return hashlib.md5(json.dumps(
+        [export_type, params_json, report_cache.scope_key(division), report_cache.generation()],
+        default=str).encode()).hexdigest()
+
+
+def _file_path(file_url):
+    return frappe.get_site_path(file_url.lstrip("/")) if file_url else None
+
+
+def _progress(job):
+    if job.status == "Processing":
+        return cint(frappe.cache().get_value(_PROGRESS_KEY.format(job.name)) or job.progress)
+    return job.progress or 0
+
+
+def _publish(job):
+    frappe.publish_realtime("scanify_export_progress", _summary(job), user=job.requested_by)
+
+
+def _summary(job):
+    return {
+        "success": job.status != "Failed",
+        "name": job.name,
+        "export_type": job.export_type,
+        "status": job.status,
+        "progress": _progress(job),
+        "file_name": job.file_name,
+        "download_url": (f"/api/method/scanify.api.download_export?name={job.name}"
+                         if job.status == "Completed" else None),
+        "message": job.error,
+        "details": json.loads(job.details) if job.details else None,
+    }
+
+
+def start(export_type, **params):
+    """Queue an export for the session user — or return the matching job already
+    queued or running for them."""
+    if export_type not in EXPORTS:
+        frappe.throw(f"Unknown export type: {export_type}")
+    params_json = _params_json(params)
+    user = frappe.session.user
+
+    existing = frappe.get_all("Export Job", filters={
+        "requested_by": user, "export_type": export_type,
+        "params": params_json, "status": ["in", _ACTIVE],
+    }, pluck="name", order_by="creation desc", limit=1)
+    if existing:
+        return _summary(frappe.get_doc("Export Job", existing[0]))
+
+    cache_key = _cache_key(export_type, params_json, params.get("division"))
+    hit = _cached_job(cache_key, user, export_type, params_json, params.get("division"))
+    if hit:
+        return _summary(hit)
+
+    job = frappe.get_doc({
+        "doctype": "Export Job",
+        "export_type": export_type,
+        "division": params.get("division"),
+        "params": params_json,
+        "cache_key": cache_key,
+        "requested_by": user,
+        "requested_on": now_datetime(),
+        "status": "Queued",
+        "progress": 0,
+    })
+    job.insert(ignore_permissions=True)
+    job_id = f"scanify_export::{job.name}"
+    frappe.db.set_value("Export Job", job.name, "job_id", job_id, update_modified=False)
+    frappe.db.commit()
+
+    enqueue(
+        "scanify.export_jobs.run",
+        queue="long",
+        timeout=3600,
+        job_name=f"export_{job.name}",
+        job_id=job_id,
+        deduplicate=True,
+        export_job=job.name,
+    )
+    return _summary(job)
+
+
+def _cached_job(cache_key, user, export_type, params_json, division):
+    """A Completed job for `user` reusing the file of an unexpired job with the same
+    cache key, or None."""
+    now = now_datetime()
+    for source in frappe.get_all("Export Job", filters={
+            "cache_key": cache_key, "status": "Completed", "expires_on": [">", now]},
+            fields=["name", "file", "file_name", "details", "expires_on"],
+            order_by="creation desc", limit=5):
+        if not source.file or not os.path.isfile(_file_path(source.file)):
+            continue
+        job = frappe.get_doc({
+            "doctype": "Export Job",
+            "export_type": export_type,
+            "division": division,
+            "params": params_json,
+            "cache_key": cache_key,
+            "cached_from": source.name,
+            "requested_by": user,
+            "requested_on": now,
+            "status": "Completed",
+            "progress": 100,
+            "file": source.file,
+            "file_name": source.file_name,
+            "details": source.details,
+            "completed_on": now,
+            "expires_on": source.expires_on,
+        })
+        job.insert(ignore_permissions=True)
+        frappe.db.commit()
+        return job
+    return None
+
+
+def _progress_callback(job):
+    last = [0]
+
+    def progress(percent):
+        percent = max(0, min(99, cint(percent)))
+        if percent - last[0] < 5:
+            return
+        last[0] = percent
+        # Kept in the cache, not on the job: a builder reading through an unbuffered
+        # cursor (stream_export) must not query the database mid-stream.
+        frappe.cache().set_value(_PROGRESS_KEY.format(job.name), percent, expires_in_sec=3600)
+        job.progress = percent
+        _publish(job)
+    return progress
+
+
+def track(rows, total, progress, start=0, end=95):
+    """Yield `rows` while reporting start..end percent through `progress` (a builder's
+    callback, or None)."""
+    for i, row in enumerate(rows, 1):
+        if progress and total and i % 1000 == 0:
+            progress(start + (end - start) * i / total)
+        yield row
+
+
+def _store_file(job, filename, content):
+    """Keep the export as a private File attached to the job. A temp-file path is
+    moved into place rather than read into memory."""
+    stored_name = f"{job.name}-{filename}"
+    target = frappe.get_site_path("private", "files", stored_name)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if isinstance(content, str) and os.path.isfile(content):
+        shutil.move(content, target)
+    else:
+        with open(target, "wb") as f:
+            f.write(content.encode("utf-8-sig") if isinstance(content, str) else content)
+    file_doc = frappe.get_doc({
+        "doctype": "File",
+        "file_name": filename,
+        "file_url": f"/private/files/{stored_name}",
+        "is_private": 1,
+        "attached_to_doctype": "Export Job",
+        "attached_to_name": job.name,
+        "attached_to_field": "file",
+    })
+    file_doc.insert(ignore_permissions=True)
+    return file_doc.file_url
+
+
+def run(export_job):
+    """RQ entry: build the export, store it and tell the user."""
+    job = frappe.get_doc("Export Job", export_job)
+    if job.status != "Queued":
+        return
+    job.db_set({"status": "Processing", "progress": 0}, update_modified=False)
+    frappe.db.commit()
+    _publish(job)
+
+    try:
+        builder = frappe.get_attr(EXPORTS[job.export_type])
+        filename, content, *details = builder(
+            progress=_progress_callback(job), **json.loads(job.params or "{}"))
+        file_url = _store_file(job, filename, content)
+        job.db_set({
+            "status": "Completed", "progress": 100, "file": file_url, "file_name": filename,
+            "details": json.dumps(details[0], default=str) if details else None,
+            "completed_on": now_datetime(),
+            "expires_on": add_to_date(now_datetime(), hours=EXPORT_TTL_HOURS),
+        })
+    except Exception as e:
+        frappe.db.rollback()
+        frappe.log_error(frappe.get_traceback(), f"Export Job {job.name} Failed")
+        job.db_set({
+            "status": "Failed", "error": str(e)[:1000],
+            "expires_on": add_to_date(now_datetime(), hours=EXPORT_TTL_HOURS),
+        })
+    frappe.db.commit()
+    _publish(job)
+
+
+def _get_own_job(name):
+    job = frappe.get_doc("Export Job", name)
+    if job.requested_by != frappe.session.user:
+        frappe.throw("Not permitted", frappe.PermissionError)
+    return job
+
+
+def status(name):
+    return _summary(_get_own_job(name))
+
+
+def download(name):
+    """A response sending the export's file to its requester. The file is served by path
+    after the ownership check rather than through the File's URL (a cache hit's file
+    belongs to another user's job): streamed from disk, or handed to nginx with
+    X-Accel-Redirect when the site runs behind it."""
+    from frappe.utils.response import send_private_file
+
+    job = _get_own_job(name)
+    if job.status != "Completed" or not job.file:
+        frappe.throw("This export is not ready")
+    if not os.path.isfile(_file_path(job.file)):
+        frappe.throw("This export has expired; please export again")
+    response = send_private_file(job.file.removeprefix("/private/"))
+    response.headers.set("Content-Disposition", "attachment", filename=job.file_name)
+    return response
+
+
+def recent(limit=20):
+    """The session user's unexpired export jobs, newest first."""
+    return [_summary(j) for j in frappe.get_all(
+        "Export Job", filters={"requested_by": frappe.session.user},
+        fields=["name", "export_type", "status", "progress", "file_name", "error", "details"],
+        order_by="creation desc", limit=cint(limit) or 20)]
+
+
+def cleanup_expired():
+    """Hourly: delete expired jobs with their files, and fail jobs whose worker died."""
+    now = now_datetime()
+    for name in frappe.get_all("Export Job", filters={"expires_on": ["<", now]}, pluck="name"):
+        for file_name in frappe.get_all("File", filters={
+                "attached_to_doctype": "Export Job", "attached_to_name": name}, pluck="name"):
+            frappe.delete_doc("File", file_name, ignore_permissions=True, force=True)
+        frappe.delete_doc("Export Job", name, ignore_permissions=True, force=True)
+        frappe.db.commit()
+
+    stale = frappe.get_all("Export Job", filters={
+        "status": ["in", _ACTIVE],
+        "requested_on": ["<", add_to_date(now, hours=-_STALE_HOURS)],
+    }, pluck="name")
+    for name in stale:
+        frappe.db.set_value("Export Job", name, {
+            "status": "Failed", "error": "The export did not finish in time.",
+            "expires_on": add_to_date(now, hours=EXPORT_TTL_HOURS),
+        }, update_modified=False)
+    frappe.db.commit()
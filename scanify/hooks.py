@@ -47,18 +47,110 @@ web_form_list_context = {
 
 # Document hooks
 doc_events = {
+    # Any write to a report source doctype invalidates the cached report results, any
+    # master write the cached master dictionaries, and scheme / statement / HQ /
+    # stockist writes refresh their section of the dashboard KPI snapshots
+    # (scanify.report_cache, scanify.master_dict and scanify.kpi_snapshot each filter
+    # to the doctypes they cover).
+    "*": {
+        "on_update": [
+            "scanify.report_cache.bump",
+            "scanify.master_dict.bump",
+            "scanify.kpi_snapshot.on_change",
+        ],
+        "on_update_after_submit": [
+            "scanify.report_cache.bump",
+            "scanify.kpi_snapshot.on_change",
+        ],
+        "on_cancel": [
+            "scanify.report_cache.bump",
+            "scanify.kpi_snapshot.on_change",
+        ],
+        "on_trash": [
+            "scanify.report_cache.bump",
+            "scanify.master_dict.bump",
+            "scanify.kpi_snapshot.on_change",
+        ],
+        "after_rename": "scanify.master_dict.bump",
+    },
+    # scanify.secondary_fact keeps the monthly rollup of each (stockist, month) in step.
     "Stockist Statement": {
         "validate": "scanify.scanify.doctype.stockist_statement.stockist_statement.validate_closing_balance",
+        "on_update": [
+            "scanify.search_index.on_update",
+            "scanify.secondary_fact.on_statement_change",
+        ],
+        "on_update_after_submit": "scanify.secondary_fact.on_statement_change",
+        "on_cancel": "scanify.secondary_fact.on_statement_change",
+        "on_trash": "scanify.search_index.on_trash",
+        "after_delete": "scanify.secondary_fact.on_statement_change",
     },
     "Scheme Request": {
         "on_submit": "scanify.scanify.doctype.scheme_request.scheme_request.create_stock_adjustment"
     },
+    "Scheme Deduction": {
+        "on_submit": "scanify.secondary_fact.on_deduction_change",
+        "on_cancel": "scanify.secondary_fact.on_deduction_change",
+    },
+    # Cached list totals (get_primary_sales_data) go stale on any single-row edit.
+    # The trigram search index (scanify.search_index) and the monthly rollup
+    # (scanify.primary_rollup) follow single-row edits too.
+    "Primary Sales Data": {
+        "after_insert": "scanify.primary_sales_query.invalidate_counts",
+        "on_update": [
+            "scanify.primary_sales_query.invalidate_counts",
+            "scanify.search_index.on_update",
+            "scanify.primary_rollup.on_change",
+        ],
+        "on_trash": [
+            "scanify.primary_sales_query.invalidate_counts",
+            "scanify.search_index.on_trash",
+        ],
+        "after_delete": "scanify.primary_rollup.on_change",
+    },
+    # The org hierarchy closure (scanify.org_closure) follows every master save and delete.
+    "Zone Master": {
+        "on_update": "scanify.org_closure.on_master_change",
+        "after_delete": "scanify.org_closure.on_master_change",
+    },
+    "Region Master": {
+        "on_update": [
+            "scanify.org_closure.on_master_change",
+            "scanify.permissions.clear_scope_cache",
+        ],
+        "after_delete": [
+            "scanify.org_closure.on_master_change",
+            "scanify.permissions.clear_scope_cache",
+        ],
+    },
+    "Team Master": {
+        "on_update": "scanify.org_closure.on_master_change",
+        "after_delete": "scanify.org_closure.on_master_change",
+    },
+    "HQ Master": {
+        "on_update": "scanify.org_closure.on_master_change",
+        "after_delete": "scanify.org_closure.on_master_change",
+    },
+    "Stockist Master": {
+        "on_update": "scanify.org_closure.on_master_change",
+        "after_delete": "scanify.org_closure.on_master_change",
+    },
     # Keep each portal user's Frappe roles in sync with their portal_role, whatever path
     # sets it (portal Users page, Desk User form, import, patch). Prevents the portal
     # Admin vs. System-Manager drift that breaks master saves / scheme deletes.
+    # The cached portal scope (scanify.permissions) follows User, role, region and
+    # division changes.
     "User": {
         "after_insert": "scanify.permissions.sync_user_frappe_roles",
-        "on_update": "scanify.permissions.sync_user_frappe_roles",
+        "on_update": [
+            "scanify.permissions.sync_user_frappe_roles",
+            "scanify.permissions.clear_scope_cache",
+        ],
+        "on_trash": "scanify.permissions.clear_scope_cache",
+    },
+    "Division": {
+        "on_update": "scanify.permissions.clear_scope_cache",
+        "after_delete": "scanify.permissions.clear_scope_cache",
     },
 }
 
@@ -75,6 +167,16 @@ add_to_apps_screen = [
     }
 ]
 
+scheduler_events = {
+    "hourly": [
+        "scanify.export_jobs.cleanup_expired",
+    ],
+    "daily": [
+        "scanify.secondary_fact.scheduled_drift_check",
+        "scanify.org_closure.rebuild",
+    ],
+}
+
 # Boot session
 boot_session = "scanify.boot.boot_session"
 
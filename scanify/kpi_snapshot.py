@@ -0,0 +1,238 @@
+"""Cached KPI snapshots for the dashboards.
+
+The portal home page (get_dashboard_stats) and get_dashboard_data counted schemes,
+statements, HQs and stockists with a dozen separate queries on every load. This module
+keeps one snapshot per division in the site cache, built with one grouped query per
+doctype:
+
+    Scheme Request       by region, hq and creation day (last ACTIVITY_DAYS days)
+    Scheme Approval Log  approvals this month, by region
+    Stockist Statement   by region and creation day
+    HQ Master            active HQs by region
+    Stockist Master      active stockists by region
+
+Every counter is kept per region, so one snapshot serves every user of the division:
+dashboard(division, regions) sums the rows of the regions a user may see (None = all)
+in Python, and a home page load costs one cache read.
+
+Snapshots expire after _TTL and are rebuilt when the day changes (the month and
+activity windows move). Writes keep them fresh in between without a full rebuild:
+on_change() (a doc event) re-runs only the written doctype's section for the doc's
+division and for the all-divisions snapshot, after the transaction commits. Bulk
+writers that skip doc events call refresh() themselves.
+"""
+
+import frappe
+from frappe.utils import add_days, add_months, cint, flt, get_first_day, get_last_day, nowdate
+
+_KEY = "scanify:kpi_snapshot:{}"
+_TTL = 300
+ACTIVITY_DAYS = 14
+TOP_HQS = 8
+
+
+def _window():
+    today = nowdate()
+    return {
+        "activity_start": add_days(today, -(ACTIVITY_DAYS - 1)),
+        "month_start": get_first_day(today),
+        "month_end": get_last_day(today),
+        "six_months": add_months(today, -6),
+    }
+
+
+def _division_sql(column, division):
+    return f" AND {column} = %(division)s" if division else ""
+
+
+def _scheme_rows(division, params):
+    return frappe.db.sql(f"""
+        SELECT region, hq,
+               IF(creation >= %(activity_start)s, DATE(creation), NULL) AS day,
+               COUNT(*) AS created,
+               SUM(approval_status = 'Pending' AND docstatus = 0) AS pending,
+               SUM(application_date BETWEEN %(month_start)s AND %(month_end)s) AS month_total,
+               SUM(approval_status = 'Pending'
+                   AND application_date BETWEEN %(month_start)s AND %(month_end)s) AS month_pending,
+               SUM(approval_status = 'Approved'
+                   AND application_date BETWEEN %(month_start)s AND %(month_end)s) AS month_approved,
+               SUM(IF(approval_status = 'Approved'
+                      AND application_date BETWEEN %(month_start)s AND %(month_end)s,
+                      total_scheme_value, 0)) AS month_approved_value,
+               SUM(approval_status = 'Approved' AND creation >= %(six_months)s) AS recent_approved,
+               SUM(IF(approval_status = 'Approved' AND creation >= %(six_months)s,
+                      total_scheme_value, 0)) AS recent_approved_value
+        FROM `tabScheme Request`
+        WHERE 1=1 {_division_sql("division", division)}
+        GROUP BY region, hq, day
+    """, params, as_dict=True)
+
+
+def _approval_rows(division, params):
+    return frappe.db.sql(f"""
+        SELECT sr.region, COUNT(DISTINCT sr.name) AS approved_this_month
+        FROM `tabScheme Request` sr
+        INNER JOIN `tabScheme Approval Log` sal ON sal.parent = sr.name
+        WHERE sal.action = 'Approved' AND sal.action_date >= %(month_start)s
+            {_division_sql("sr.division", division)}
+        GROUP BY sr.region
+    """, params, as_dict=True)
+
+
+def _statement_rows(division, params):
+    return frappe.db.sql(f"""
+        SELECT region,
+               IF(creation >= %(activity_start)s, DATE(creation), NULL) AS day,
+               COUNT(*) AS created,
+               SUM(extracted_data_status = 'Completed') AS extracted,
+               SUM(docstatus = 1
+                   AND statement_month BETWEEN %(month_start)s AND %(month_end)s) AS month_submitted
+        FROM `tabStockist Statement`
+        WHERE 1=1 {_division_sql("division", division)}
+        GROUP BY region, day
+    """, params, as_dict=True)
+
+
+def _active_rows(doctype):
+    def rows(division, params):
+        return frappe.db.sql(f"""
+            SELECT region, COUNT(*) AS active
+            FROM `tab{doctype}`
+            WHERE status = 'Active' {_division_sql("division", division)}
+            GROUP BY region
+        """, params, as_dict=True)
+    return rows
+
+
+# section -> (doctype whose writes refresh it, query)
+SECTIONS = {
+    "schemes": ("Scheme Request", _scheme_rows),
+    "approvals": ("Scheme Request", _approval_rows),
+    "statements": ("Stockist Statement", _statement_rows),
+    "hqs": ("HQ Master", _active_rows("HQ Master")),
+    "stockists": ("Stockist Master", _active_rows("Stockist Master")),
+}
+
+
+def _section(name, division):
+    params = dict(_window(), division=division)
+    rows = SECTIONS[name][1](division, params)
+    for r in rows:
+        if r.get("day"):
+            r["day"] = str(r["day"])
+    return [dict(r) for r in rows]
+
+
+def _key(division):
+    return _KEY.format(division or "*")
+
+
+def snapshot(division=None):
+    """{day, sections: {section: rows}} for `division` (None = all divisions)."""
+    cached = frappe.cache().get_value(_key(division))
+    if cached and cached.get("day") == nowdate():
+        return cached
+    data = {"day": nowdate(), "sections": {name: _section(name, division) for name in SECTIONS}}
+    frappe.cache().set_value(_key(division), data, expires_in_sec=_TTL)
+    return data
+
+
+def refresh(doctype, divisions=None):
+    """Re-run the sections fed by `doctype` in the cached snapshots of `divisions`
+    (and the all-divisions one). Snapshots not in the cache are left to build on read."""
+    names = [name for name, (source, _fn) in SECTIONS.items() if source == doctype]
+    if not names:
+        return
+    for division in {None, *(divisions or [])}:
+        cached = frappe.cache().get_value(_key(division))
+        if not cached or cached.get("day") != nowdate():
+            continue
+        for name in names:
+            cached["sections"][name] = _section(name, division)
+        frappe.cache().set_value(_key(division), cached, expires_in_sec=_TTL)
+
+
+def on_change(doc, method=None):
+    """Doc event for all doctypes, acting on those SECTIONS follow: refresh their
+    sections once the write is committed."""
+    if not any(doc.doctype == source for source, _fn in SECTIONS.values()):
+        return
+    divisions = {doc.get("division")}
+    before = doc.get_doc_before_save() if hasattr(doc, "get_doc_before_save") else None
+    if before:
+        divisions.add(before.get("division"))
+    # One refresh per doctype and commit, however many docs the request writes
+    from scanify.report_cache import after_commit_once
+
+    pending = frappe.flags.get("kpi_snapshot_pending")
+    if pending is None:
+        pending = frappe.flags.kpi_snapshot_pending = {}
+        frappe.db.after_rollback.add(_discard)
+    pending.setdefault(doc.doctype, set()).update(d for d in divisions if d)
+    after_commit_once("kpi_snapshot", _flush)
+
+
+def _flush():
+    for doctype, divisions in (frappe.flags.pop("kpi_snapshot_pending", None) or {}).items():
+        refresh(doctype, divisions)
+
+
+def _discard():
+    # The rolled-back writes never happened; the next write queues _flush again
+    frappe.flags.pop("kpi_snapshot_pending", None)
+
+
+def _in_scope(rows, regions):
+    if regions is None:
+        return rows
+    allowed = set(regions)
+    return [r for r in rows if r.get("region") in allowed]
+
+
+def _total(rows, field):
+    return sum(flt(r.get(field)) for r in rows)
+
+
+def _activity(rows):
+    by_day = {}
+    for r in rows:
+        if r.get("day"):
+            by_day[r["day"]] = by_day.get(r["day"], 0) + cint(r.get("created"))
+    return [{"date": day, "count": count} for day, count in sorted(by_day.items())]
+
+
+def _top_hqs(rows):
+    from scanify import master_dict
+
+    by_hq = {}
+    for r in rows:
+        if r.get("hq") and cint(r.get("recent_approved")):
+            hq = by_hq.setdefault(r["hq"], {"value": 0.0, "cnt": 0})
+            hq["value"] += flt(r.get("recent_approved_value"))
+            hq["cnt"] += cint(r.get("recent_approved"))
+    names = master_dict.lookup("HQ Master")
+    top = sorted(by_hq.items(), key=lambda item: item[1]["value"], reverse=True)[:TOP_HQS]
+    return [{"hq": names.get(code, code), **figures} for code, figures in top]
+
+
+def dashboard(division=None, regions=None):
+    """Every dashboard figure for `division` (None = all), limited to `regions`
+    (None = every region; an empty list sees nothing)."""
+    sections = {name: _in_scope(rows, regions)
+                for name, rows in snapshot(division)["sections"].items()}
+    schemes, statements = sections["schemes"], sections["statements"]
+    return {
+        "pending_schemes": cint(_total(schemes, "pending")),
+        "month_schemes": cint(_total(schemes, "month_total")),
+        "month_pending_schemes": cint(_total(schemes, "month_pending")),
+        "month_approved_schemes": cint(_total(schemes, "month_approved")),
+        "month_approved_value": _total(schemes, "month_approved_value"),
+        "approved_this_month": cint(_total(sections["approvals"], "approved_this_month")),
+        "completed_statements": cint(_total(statements, "extracted")),
+        "month_submitted_statements": cint(_total(statements, "month_submitted")),
+        "active_hqs": cint(_total(sections["hqs"], "active")),
+        "active_stockists": cint(_total(sections["stockists"], "active")),
+        "scheme_activity": _activity(schemes),
+        "statement_activity": _activity(statements),
+        "top_hqs": _top_hqs(schemes),
+    }
@@ -0,0 +1,106 @@
+"""Versioned code → name dictionaries for the masters.
+
+Reports and exports translate master ids into what a person reads — HQ / team /
+region / zone names, the editable stockist and product codes, doctor names — and
+each used to rebuild its own map with fresh queries on every call (or a get_value
+per code). This module keeps one dictionary per master:
+
+  * in the process (a module-level dict), checked against
+  * a version stamp in the site cache, bumped by bump() on every master write (and
+    once more after its commit), and
+  * the dictionary itself in the site cache, so a new worker loads it with one
+    Redis read instead of a table scan.
+
+    lookup(doctype, field=None)          {id: value} for every row of the master
+    resolve(doctype, codes, field=None)  the same, for the given ids only
+    rows(doctype)                        {id: {field: value}} with every cached field
+
+Values fall back to the id when the field is empty, and ids not in the master are
+left out — callers keep `.get(code, code)` so a value that is already a display
+name passes through unchanged.
+"""
+
+import functools
+
+import frappe
+
+# doctype -> cached fields; the first one is the default display field.
+DICTIONARIES = {
+    "HQ Master": ("hq_name",),
+    "Team Master": ("team_name",),
+    "Region Master": ("region_name",),
+    "Zone Master": ("zone_name",),
+    "Stockist Master": ("stockist_code", "stockist_name"),
+    "Product Master": ("product_code", "product_name", "pack", "product_group",
+                       "mrp", "ptr", "pts"),
+    "Doctor Master": ("doctor_code", "doctor_name"),
+}
+
+_VERSION_KEY = "scanify:master_dict_version:{}"
+_DATA_KEY = "scanify:master_dict:{}:{}"
+_DATA_TTL = 86400
+
+# (site, doctype) -> (version, {id: row})
+_local = {}
+
+
+def _version(doctype):
+    key = _VERSION_KEY.format(doctype)
+    version = frappe.cache().get_value(key)
+    if not version:
+        version = frappe.generate_hash(length=8)
+        frappe.cache().set_value(key, version)
+    return version
+
+
+def _move_version(doctype):
+    frappe.cache().set_value(_VERSION_KEY.format(doctype), frappe.generate_hash(length=8))
+
+
+def bump(doc=None, method=None):
+    """Doc event for the cached masters: orphan the master's dictionary everywhere.
+
+    The version moves now, so this request reads its own write, and again after the
+    commit: a worker that reloaded the master in between saw the old rows and cached
+    them under the new version."""
+    from scanify.report_cache import after_commit_once
+
+    for doctype in ([doc.doctype] if doc is not None else DICTIONARIES):
+        if doctype in DICTIONARIES:
+            _move_version(doctype)
+            after_commit_once(("master_dict", doctype), functools.partial(_move_version, doctype))
+
+
+def _load(doctype):
+    fields = DICTIONARIES[doctype]
+    return {r.name: r for r in frappe.get_all(
+        doctype, fields=["name", *fields], limit_page_length=0)}
+
+
+def rows(doctype):
+    """{id: {field: value}} for every row of a cached master."""
+    version = _version(doctype)
+    local_key = (frappe.local.site, doctype)
+    cached = _local.get(local_key)
+    if cached and cached[0] == version:
+        return cached[1]
+    data_key = _DATA_KEY.format(doctype, version)
+    data = frappe.cache().get_value(data_key)
+    if data is None:
+        data = _load(doctype)
+        frappe.cache().set_value(data_key, data, expires_in_sec=_DATA_TTL)
+    _local[local_key] = (version, data)
+    return data
+
+
+def lookup(doctype, field=None):
+    """{id: field value, or the id when empty} for every row of the master."""
+    field = field or DICTIONARIES[doctype][0]
+    return {name: (r.get(field) or name) for name, r in rows(doctype).items()}
+
+
+def resolve(doctype, codes, field=None):
+    """lookup() limited to the given ids (those not in the master are left out)."""
+    field = field or DICTIONARIES[doctype][0]
+    data = rows(doctype)
+    return {c: (data[c].get(field) or c) for c in set(codes or []) if c in data}
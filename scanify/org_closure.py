@@ -0,0 +1,279 @@
+"""Org hierarchy closure table.
+
+Zone → Region → Team → HQ → Stockist filters used to be resolved with a get_all per
+child entity (a zone-level filter could fire dozens of queries before the report ran).
+`__scanify_org_closure` holds one row per (ancestor, descendant) pair of the hierarchy,
+every node paired with itself at depth 0:
+
+    ancestor_type, ancestor, descendant_type, descendant, depth, division, active,
+    path_division
+
+`division` is the descendant's division and `active` is 1 when the descendant and every
+node between it and the ancestor are Active — the Active filter the per-level get_all
+loops applied at each step (the ancestor's own status is not part of it; on the depth-0
+row, active is the node's own status). `path_division` is the one division every node
+strictly between the two is compatible with — "Both" when there are none or all are
+shared, "" when they disagree — since the loops also required each intermediate team
+and region to be in the division or "Both".
+
+descendants() is the one resolver: one indexed lookup, memoised in the site cache under
+a version stamp that every change moves on (and again once it commits).
+
+Maintenance: a master save or delete recomputes the closure rows of the node's
+subtree (doc events on the five masters); rebuild() recomputes everything, marks the
+table ready and runs daily as a safety net. Until the first rebuild descendants()
+walks the masters in memory instead.
+
+    bench --site <site> execute scanify.org_closure.rebuild
+"""
+
+import hashlib
+import json
+
+import frappe
+
+from scanify import report_cache
+from scanify.utils import chunked
+
+TABLE = "__scanify_org_closure"
+_READY_KEY = "scanify_org_closure_ready"
+_VERSION_KEY = "scanify:org_closure_version"
+
+# node type -> (master doctype, link field to the parent node)
+LEVELS = {
+    "Zone": ("Zone Master", None),
+    "Region": ("Region Master", "zone"),
+    "Team": ("Team Master", "region"),
+    "HQ": ("HQ Master", "team"),
+    "Stockist": ("Stockist Master", "hq"),
+}
+DOCTYPE_LEVEL = {doctype: level for level, (doctype, _parent) in LEVELS.items()}
+_PARENT_LEVEL = {"Region": "Zone", "Team": "Region", "HQ": "Team", "Stockist": "HQ"}
+# Regions and teams may be shared by both divisions.
+_SHARED_LEVELS = ("Zone", "Region", "Team")
+
+
+def ensure_table():
+    frappe.db.sql_ddl(f"""
+        CREATE TABLE IF NOT EXISTS `{TABLE}` (
+            ancestor_type VARCHAR(20) NOT NULL,
+            ancestor VARCHAR(140) NOT NULL,
+            descendant_type VARCHAR(20) NOT NULL,
+            descendant VARCHAR(140) NOT NULL,
+            depth TINYINT NOT NULL,
+            division VARCHAR(140) NOT NULL DEFAULT '',
+            active TINYINT NOT NULL DEFAULT 1,
+            path_division VARCHAR(140) NOT NULL DEFAULT 'Both',
+            PRIMARY KEY (ancestor_type, ancestor, descendant_type, descendant),
+            KEY descendant (descendant_type, descendant),
+            KEY level_division (descendant_type, depth, division)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+    if not frappe.db.sql(f"SHOW COLUMNS FROM `{TABLE}` LIKE 'path_division'"):
+        frappe.db.sql_ddl(f"""
+            ALTER TABLE `{TABLE}`
+            ADD COLUMN path_division VARCHAR(140) NOT NULL DEFAULT 'Both' AFTER active
+        """)
+
+
+def _load_nodes(keys=None):
+    """{(type, name): (parent key or None, active, division)} for every master row, or
+    for the given (type, name) keys only."""
+    nodes = {}
+    for level, (doctype, parent_field) in LEVELS.items():
+        parent_col = f"`{parent_field}`" if parent_field else "NULL"
+        sql = f"SELECT name, {parent_col}, status, division FROM `tab{doctype}`"
+        if keys is None:
+            batches = [frappe.db.sql(sql)]
+        else:
+            names = sorted(n for t, n in keys if t == level)
+            batches = [frappe.db.sql(f"{sql} WHERE name IN ({', '.join(['%s'] * len(chunk))})",
+                                     tuple(chunk)) for chunk in chunked(names)]
+        for rows in batches:
+            for name, parent, status, division in rows:
+                parent_key = (_PARENT_LEVEL[level], parent) if parent else None
+                nodes[(level, name)] = (parent_key, status == "Active", division or "")
+    return nodes
+
+
+def _path_division(path, division):
+    """The division compatible with both `path` and a node of `division` ("Both" is
+    compatible with any; "" with none)."""
+    if path == "Both":
+        return division
+    if division == "Both" or division == path:
+        return path
+    return ""
+
+
+def _closure(nodes, outside_rows=lambda key: []):
+    """Closure rows of the given nodes, built top-down: a node's rows are its depth-0 row
+    plus its parent's rows one level deeper. A parent outside `nodes` is read through
+    outside_rows(key) -> [(ancestor_type, ancestor, depth, active, path_division,
+    division)]."""
+    order = list(LEVELS)
+    chains, divisions, rows = {}, {}, []
+    for key in sorted(nodes, key=lambda k: (order.index(k[0]), k[1])):
+        parent, active, division = nodes[key]
+        divisions[key] = division
+        if parent is None:
+            above = []
+        elif parent in chains:
+            above = chains[parent]
+        else:
+            outside = outside_rows(parent)
+            above = [r[:5] for r in outside]
+            divisions[parent] = outside[0][5] if outside else ""
+        # On the depth-0 row `active` is the node's own status; one level deeper it is
+        # "this node and everything between it and the ancestor". The parent sits
+        # between this node and every ancestor above it, so its division joins their path.
+        chain = [(key[0], key[1], 0, int(active), "Both")]
+        chain += [(t, a, depth + 1, int(active and act),
+                   path if depth == 0 else _path_division(path, divisions[parent]))
+                  for t, a, depth, act, path in above]
+        chains[key] = chain
+        rows += [(t, a, key[0], key[1], depth, division, act, path)
+                 for t, a, depth, act, path in chain]
+    return rows
+
+
+def _insert(rows):
+    for chunk in chunked(rows):
+        frappe.db.sql(f"""
+            INSERT INTO `{TABLE}` (ancestor_type, ancestor, descendant_type, descendant,
+                                   depth, division, active, path_division)
+            VALUES {", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s)"] * len(chunk))}
+        """, tuple(v for r in chunk for v in r))
+
+
+def _move_version():
+    frappe.cache().set_value(_VERSION_KEY, frappe.generate_hash(length=8))
+
+
+def _bump():
+    # Now, so this request sees its own change, and again after the commit: a reader
+    # in between resolved the old hierarchy and cached it under the new version.
+    _move_version()
+    report_cache.after_commit_once("org_closure", _move_version)
+
+
+def _version():
+    version = frappe.cache().get_value(_VERSION_KEY)
+    if not version:
+        version = frappe.generate_hash(length=8)
+        frappe.cache().set_value(_VERSION_KEY, version)
+    return version
+
+
+def refresh_node(level, name):
+    """Recompute the closure rows of a node's subtree (after it was saved, moved,
+    activated or deactivated, or deleted)."""
+    subtree = {(level, name)} | {(r[0], r[1]) for r in frappe.db.sql(f"""
+        SELECT descendant_type, descendant FROM `{TABLE}`
+         WHERE ancestor_type = %s AND ancestor = %s
+    """, (level, name))}
+    for chunk in chunked(sorted(subtree)):
+        cond = " OR ".join(["(descendant_type = %s AND descendant = %s)"] * len(chunk))
+        frappe.db.sql(f"DELETE FROM `{TABLE}` WHERE {cond}",
+                      tuple(v for key in chunk for v in key))
+
+    def parent_rows(key):
+        return frappe.db.sql(f"""
+            SELECT ancestor_type, ancestor, depth, active, path_division, division
+              FROM `{TABLE}`
+             WHERE descendant_type = %s AND descendant = %s
+        """, key)
+
+    _insert(_closure(_load_nodes(subtree), parent_rows))
+    _bump()
+
+
+def on_master_change(doc, method=None):
+    """Doc event for the Zone / Region / Team / HQ / Stockist masters."""
+    if is_ready():
+        refresh_node(DOCTYPE_LEVEL[doc.doctype], doc.name)
+    else:
+        _bump()
+
+
+def rebuild():
+    """Recompute the whole table and mark it ready."""
+    ensure_table()
+    nodes = _load_nodes()
+    frappe.db.sql_ddl(f"TRUNCATE TABLE `{TABLE}`")
+    _insert(_closure(nodes))
+    frappe.db.set_global(_READY_KEY, "1")
+    frappe.cache().delete_value(_READY_KEY)
+    frappe.db.commit()
+    _bump()
+    return {"nodes": len(nodes)}
+
+
+def is_ready():
+    return bool(frappe.cache().get_value(
+        _READY_KEY, generator=lambda: frappe.db.get_global(_READY_KEY) or ""))
+
+
+def _division_matches(level, row_division, path_division, division):
+    if not division:
+        return True
+    if path_division not in (division, "Both"):
+        return False
+    if level in _SHARED_LEVELS:
+        return row_division in (division, "Both")
+    return row_division == division
+
+
+def _resolve_in_memory(entity_type, entity_name, of_type, division, active_only):
+    found = set()
+    for (ancestor_type, ancestor, descendant_type, descendant, depth, row_division, active,
+         path_division) in _closure(_load_nodes()):
+        if descendant_type != of_type:
+            continue
+        if entity_type == "Organization" and depth != 0:
+            continue
+        if entity_type != "Organization" and (ancestor_type, ancestor) != (entity_type, entity_name):
+            continue
+        if (_division_matches(of_type, row_division, path_division, division)
+                and (active or not active_only)):
+            found.add(descendant)
+    return sorted(found)
+
+
+def _resolve(entity_type, entity_name, of_type, division, active_only):
+    if not is_ready():
+        return _resolve_in_memory(entity_type, entity_name, of_type, division, active_only)
+    if entity_type == "Organization":
+        conditions, params = ["descendant_type = %s", "depth = 0"], [of_type]
+    else:
+        conditions = ["ancestor_type = %s", "ancestor = %s", "descendant_type = %s"]
+        params = [entity_type, entity_name, of_type]
+    if division:
+        if of_type in _SHARED_LEVELS:
+            conditions.append("division IN (%s, 'Both')")
+        else:
+            conditions.append("division = %s")
+        params.append(division)
+        conditions.append("path_division IN (%s, 'Both')")
+        params.append(division)
+    if active_only:
+        conditions.append("active = 1")
+    return [r[0] for r in frappe.db.sql(f"""
+        SELECT descendant FROM `{TABLE}` WHERE {' AND '.join(conditions)} ORDER BY descendant
+    """, tuple(params))]
+
+
+def descendants(entity_type, entity_name=None, of_type="HQ", division=None, active_only=True):
+    """Names of the `of_type` nodes under `entity_type` / `entity_name` (a node is under
+    itself). entity_type "Organization" means every `of_type` node of the division.
+    active_only keeps nodes whose path down from the entity is all Active."""
+    if entity_type != "Organization" and not entity_name:
+        return []
+    digest = hashlib.md5(json.dumps(
+        [entity_type, entity_name, of_type, division, bool(active_only)]).encode()).hexdigest()
+    key = f"scanify:org_closure:{_version()}:{digest}"
+    found = frappe.cache().get_value(key)
+    if found is None:
+        found = _resolve(entity_type, entity_name, of_type, division, active_only)
+        frappe.cache().set_value(key, found, expires_in_sec=3600)
+    return found
@@ -0,0 +1,13 @@
+import frappe
+
+
+def execute():
+    """Add the curated composite indexes for the hot report paths (scanify.db_indexes)."""
+    from scanify import db_indexes
+
+    created = db_indexes.ensure_indexes()
+    for name in created:
+        print(f"✓ Added index {name}")
+    if not created:
+        print("✓ Hot-path indexes already present")
+    frappe.db.commit()
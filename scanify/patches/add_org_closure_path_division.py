@@ -0,0 +1,7 @@
+def execute():
+    """Add path_division to the org hierarchy closure (scanify.org_closure) and refill
+    it, so division scoping covers the teams and regions between an entity and its HQs."""
+    from scanify import org_closure
+
+    result = org_closure.rebuild()
+    print(f"✓ Rebuilt __scanify_org_closure with path divisions over {result['nodes']} nodes")
@@ -0,0 +1,28 @@
+import frappe
+
+
+def execute():
+    """Enforce one live Stockist Statement per stockist per month (scanify.statement_unique).
+
+    Existing duplicates are reported first; while any remain the key is not added and
+    the creation paths keep looking the month up before inserting. Resolve them
+    (cancel or delete the extras), then run
+    `bench execute scanify.statement_unique.ensure_unique_key`.
+    """
+    from scanify import statement_unique
+
+    duplicates = statement_unique.ensure_unique_key()
+    if not duplicates:
+        print(f"✓ Added unique key {statement_unique.KEY_NAME}")
+        frappe.db.commit()
+        return
+
+    lines = [f"{d.stockist_code} {d.statement_month}: {', '.join(d.names)}" for d in duplicates]
+    print(f"✗ {len(duplicates)} stockist/month pair(s) have more than one live statement — "
+          f"unique key not added:")
+    for line in lines[:50]:
+        print(f"  • {line}")
+    if len(lines) > 50:
+        print(f"  … {len(lines) - 50} more (see Error Log)")
+    frappe.log_error("\n".join(lines), "Duplicate Stockist Statements")
+    frappe.db.commit()
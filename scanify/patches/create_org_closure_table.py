@@ -0,0 +1,7 @@
+def execute():
+    """Create and fill the org hierarchy closure (scanify.org_closure). The masters are
+    small, so it is built inline."""
+    from scanify import org_closure
+
+    result = org_closure.rebuild()
+    print(f"✓ Built __scanify_org_closure over {result['nodes']} hierarchy nodes")
@@ -0,0 +1,16 @@
+import frappe
+
+
+def execute():
+    """Create the monthly primary sales rollup (scanify.primary_rollup) and queue its
+    first build. Reports keep the raw Primary Sales Data queries until it is ready."""
+    from scanify import primary_rollup
+
+    primary_rollup.ensure_table()
+    frappe.enqueue(
+        "scanify.primary_rollup.rebuild",
+        queue="long",
+        timeout=14400,
+        job_name="scanify_primary_rollup_rebuild",
+    )
+    print("✓ Created __scanify_primary_monthly; rebuild queued")
@@ -0,0 +1,19 @@
+import frappe
+
+
+def execute():
+    """Create the trigram search side table (scanify.search_index) and backfill it.
+
+    The backfill runs as a background job — Primary Sales Data can be millions of
+    rows. Searches keep using plain LIKE until each doctype is marked ready.
+    """
+    from scanify import search_index
+
+    search_index.ensure_table()
+    frappe.enqueue(
+        "scanify.search_index.rebuild",
+        queue="long",
+        timeout=14400,
+        job_name="scanify_search_index_rebuild",
+    )
+    print("✓ Created __scanify_search; backfill queued")
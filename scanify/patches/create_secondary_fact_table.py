@@ -0,0 +1,16 @@
+import frappe
+
+
+def execute():
+    """Create the monthly secondary sales fact table (scanify.secondary_fact) and
+    queue its first build. Reports keep the raw statement join until it is ready."""
+    from scanify import secondary_fact
+
+    secondary_fact.ensure_table()
+    frappe.enqueue(
+        "scanify.secondary_fact.rebuild",
+        queue="long",
+        timeout=14400,
+        job_name="scanify_secondary_fact_rebuild",
+    )
+    print("✓ Created __scanify_secondary_monthly; rebuild queued")
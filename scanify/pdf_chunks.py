@@ -0,0 +1,153 @@
+"""Chunked, parallel PDF rendering for the table exports.
+
+A master PDF used to be one HTML string — grown by `+=` for every cell — handed to a
+single wkhtmltopdf process. Thousands of rows took minutes on one core and could take
+wkhtmltopdf down with them. This module renders such a table in pieces instead:
+
+    content = render_table(
+        title="HQ Master", headers=[...], rows=[[...], ...],
+        subtitle="Division: Prima • Exported: ...", landscape=True,
+    )
+
+The rows are cut into CHUNK_ROWS-row chunks. Each chunk becomes a complete document from
+the shared TABLE_TEMPLATE: the banner goes on the first chunk, the footer on the last,
+and the column headers on every chunk. The chunks render in parallel wkhtmltopdf
+processes, and their pages are merged in order with pypdf, which Frappe already ships.
+
+wkhtmltopdf options are resolved once on the calling thread, through Frappe's own
+prepare_options (print settings, page size, cookies). The worker threads then only run
+wkhtmltopdf, because Frappe's request state is thread-local. The `pdf_render_workers`
+site config caps the number of concurrent renderers; it defaults to the CPU count.
+Callers that render several tables at once pass a smaller `workers` share.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from html import escape
+from io import BytesIO
+
+import frappe
+
+CHUNK_ROWS = 500
+
+TABLE_TEMPLATE = """<html>
+<head>
+    <meta charset="utf-8">
+    <style>
+        @page {{ size: {orientation}; margin: 15mm; }}
+        body {{ font-family: 'Inter', 'Helvetica Neue', Arial, sans-serif; color: #1e293b; margin: 0; }}
+        .header {{ text-align: center; margin-bottom: 20px; border-bottom: 2px solid #4f46e5;
+                   padding-bottom: 12px; }}
+        .header h1 {{ font-size: 18px; margin: 0; color: #1e293b; }}
+        .header h2 {{ font-size: 14px; margin: 4px 0; color: #4f46e5; font-weight: 600; }}
+        .header p {{ font-size: 10px; color: #64748b; margin: 4px 0 0 0; }}
+        table {{ width: 100%; border-collapse: collapse; margin-top: 10px; }}
+        thead {{ display: table-header-group; }}
+        tr {{ page-break-inside: avoid; }}
+        th {{ padding: 8px; border: 1px solid #334155; background: #1e293b; color: #fff;
+              font-size: 9px; text-align: center; }}
+        td {{ padding: 6px 8px; border: 1px solid #e2e8f0; font-size: 9px; }}
+        tr.alt {{ background: #f8fafc; }}
+        .footer {{ text-align: center; margin-top: 15px; font-size: 9px; color: #94a3b8; }}
+    </style>
+</head>
+<body>
+    {banner}
+    <table>
+        <thead><tr>{header_cells}</tr></thead>
+        <tbody>{body}</tbody>
+    </table>
+    {footer}
+</body>
+</html>"""
+
+COMPANY = "Stedman Pharmaceuticals Pvt Ltd"
+
+
+def _cell(value):
+    return escape(str(value)) if value not in (None, "") else ""
+
+
+def table_body(rows, start=0):
+    """<tr> markup for `rows` (value lists), striped from row index `start`."""
+    parts = []
+    for idx, row in enumerate(rows, start):
+        parts.append('<tr class="alt">' if idx % 2 else "<tr>")
+        parts.extend(f"<td>{_cell(v)}</td>" for v in row)
+        parts.append("</tr>")
+    return "".join(parts)
+
+
+def table_html(title, headers, rows, subtitle="", landscape=False, start=0,
+               banner=True, footer=True):
+    """One self-contained document of TABLE_TEMPLATE for `rows`."""
+    return TABLE_TEMPLATE.format(
+        orientation="landscape" if landscape else "portrait",
+        banner=(f'<div class="header"><h1>{COMPANY}</h1><h2>{escape(title)}</h2>'
+                f"<p>{subtitle}</p></div>") if banner else "",
+        header_cells="".join(f"<th>{escape(str(h))}</th>" for h in headers),
+        body=table_body(rows, start),
+        footer=(f'<div class="footer">&copy; {frappe.utils.now_datetime().year} {COMPANY}'
+                " &bull; Generated by Scanify</div>") if footer else "",
+    )
+
+
+def render_table(title, headers, rows, subtitle="", landscape=False,
+                 chunk_rows=CHUNK_ROWS, progress=None, workers=None):
+    """PDF bytes of a titled table, rendered in parallel chunks of `chunk_rows` rows."""
+    rows = list(rows)
+    starts = list(range(0, len(rows), chunk_rows)) or [0]
+    documents = [
+        table_html(title, headers, rows[s:s + chunk_rows], subtitle, landscape, start=s,
+                   banner=(i == 0), footer=(i == len(starts) - 1))
+        for i, s in enumerate(starts)
+    ]
+    return render(documents, progress=progress, workers=workers)
+
+
+def _options(sample_html, options=None):
+    # As frappe.utils.pdf.get_pdf() prepares them, for a document built like sample_html
+    from frappe.utils.pdf import get_wkhtmltopdf_version, prepare_options
+    from packaging.version import Version
+
+    _html, options = prepare_options(sample_html, dict(options or {}))
+    options.update({"disable-javascript": "", "disable-local-file-access": ""})
+    if Version(get_wkhtmltopdf_version()) > Version("0.12.3"):
+        options.update({"disable-smart-shrinking": ""})
+    return options
+
+
+def render(documents, options=None, progress=None, workers=None):
+    """Render HTML `documents` (all built from one template) in parallel wkhtmltopdf
+    processes — at most `workers` of them when given — and return the merged PDF bytes.
+    A single document goes through get_pdf() unchanged."""
+    from frappe.utils.pdf import cleanup, get_pdf
+
+    if len(documents) == 1:
+        return get_pdf(documents[0], options)
+
+    import pdfkit
+    from pypdf import PdfReader, PdfWriter
+
+    opts = _options(documents[0], options)
+    workers = min(len(documents),
+                  workers or frappe.conf.get("pdf_render_workers") or os.cpu_count() or 1)
+    parts = [None] * len(documents)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(pdfkit.from_string, html, False, options=opts): idx
+                       for idx, html in enumerate(documents)}
+            # Collected here, not in the workers: progress() publishes through frappe.local
+            for done, future in enumerate(as_completed(futures), 1):
+                parts[futures[future]] = future.result()
+                if progress:
+                    progress(100 * done / len(documents))
+    finally:
+        cleanup(opts)
+
+    writer = PdfWriter()
+    for part in parts:
+        writer.append(PdfReader(BytesIO(part)))
+    output = BytesIO()
+    writer.write(output)
+    return output.getvalue()
@@ -60,6 +60,7 @@ ROUTE_PROCESS = {
     "insights": "reports", "stockist-reports": "reports", "scheme-reports": "reports",
     "ranking-reports": "reports", "year-wise-report": "reports",
     "audit-trail": "audit",
+    "db-indexes": "audit",
     "users": "users",
 }
 
@@ -164,16 +165,90 @@ def sync_user_frappe_roles(doc, method=None):
         frappe.flags.in_sync_user_frappe_roles = False
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+# Scope service
+#
+# Role, divisions and mapped regions are read once per user and kept in the site cache
+# (and in frappe.local for the rest of the request): enforce_portal_access, the sidebar's
+# nav_access, require_process and _scope_region_sql all ask for them on every request.
+# clear_scope_cache drops them on User / Region Master / Division changes (and again
+# after their commit).
+# ─────────────────────────────────────────────────────────────────────────────
+
+_SCOPE_CACHE = "scanify_portal_scope"          # hash: user -> scope dict
+_DIVISION_REGIONS_CACHE = "scanify_division_regions"  # hash: division -> region codes
+_DIVISIONS_CACHE = "scanify_divisions"
+
+
+def _compute_scope(user):
+    row = frappe.db.get_value(
+        "User", user, ["portal_role", "allowed_divisions", "division", "allowed_regions"],
+        as_dict=True) or {}
+    if user == "Administrator" or "System Manager" in frappe.get_roles(user):
+        role = ROLE_ADMIN
+    else:
+        role = row.get("portal_role") or ROLE_R
+    divisions = _split(row.get("allowed_divisions"))
+    if not divisions and row.get("division"):
+        divisions = [row.get("division")]
+    return {"role": role, "divisions": divisions, "division": row.get("division"),
+            "regions": _split(row.get("allowed_regions"))}
+
+
+def _user_scope(user):
+    memo = getattr(frappe.local, "scanify_scope", None)
+    if memo is None:
+        memo = frappe.local.scanify_scope = {}
+    if user not in memo:
+        memo[user] = frappe.cache().hget(_SCOPE_CACHE, user,
+                                         generator=lambda: _compute_scope(user))
+    return memo[user]
+
+
+def _all_divisions():
+    return frappe.cache().get_value(
+        _DIVISIONS_CACHE, generator=lambda: frappe.get_all("Division", pluck="name"))
+
+
+def _division_region_codes(division):
+    return frappe.cache().hget(_DIVISION_REGIONS_CACHE, division, generator=lambda: frappe.get_all(
+        "Region Master", filters={"division": ["in", [division, "Both"]]}, pluck="name"))
+
+
+def clear_scope_cache(doc=None, method=None):
+    """Doc event for User (which also covers role changes: Has Role rows are saved with
+    their User), Region Master and Division. The cache is dropped now and again once the
+    write commits: a request reading in between would have cached the old scope."""
+    from scanify.report_cache import after_commit_once
+
+    frappe.local.scanify_scope = {}
+    doctype = getattr(doc, "doctype", None)
+    name = doc.name if doctype == "User" else None
+    _drop_scope_cache(doctype, name)
+    after_commit_once(("scope_cache", doctype, name),
+                      functools.partial(_drop_scope_cache, doctype, name))
+
+
+def _drop_scope_cache(doctype, name):
+    if doctype == "User":
+        frappe.cache().hdel(_SCOPE_CACHE, name)
+    elif doctype == "Region Master":
+        frappe.cache().delete_value(_DIVISION_REGIONS_CACHE)
+    elif doctype == "Division":
+        frappe.cache().delete_value(_DIVISIONS_CACHE)
+    else:
+        frappe.cache().delete_value([_SCOPE_CACHE, _DIVISION_REGIONS_CACHE, _DIVISIONS_CACHE])
+
+
+def get_default_division(user=None):
+    """User.division — the division the user last switched to (None when unset)."""
+    return _user_scope(user or frappe.session.user).get("division")
+
+
 def get_portal_role(user=None):
     """The user's single portal role. Administrator / any Frappe System Manager is Admin.
     Unmapped portal users default to the most restrictive role."""
-    user = user or frappe.session.user
-    if user == "Administrator":
-        return ROLE_ADMIN
-    roles = frappe.get_roles(user)
-    if "System Manager" in roles:
-        return ROLE_ADMIN
-    return frappe.db.get_value("User", user, "portal_role") or ROLE_R
+    return _user_scope(user or frappe.session.user)["role"]
 
 
 def is_portal_admin(user=None):
@@ -335,13 +410,8 @@ def get_allowed_divisions(user=None):
     """List of divisions a user may use. Admin → all divisions."""
     user = user or frappe.session.user
     if is_portal_admin(user):
-        return frappe.get_all("Division", pluck="name")
-    divs = _split(frappe.db.get_value("User", user, "allowed_divisions"))
-    if not divs:
-        d = frappe.db.get_value("User", user, "division")
-        if d:
-            divs = [d]
-    return divs
+        return list(_all_divisions())
+    return list(_user_scope(user)["divisions"])
 
 
 def get_allowed_region_codes(user=None, division=None):
@@ -350,10 +420,9 @@ def get_allowed_region_codes(user=None, division=None):
     user = user or frappe.session.user
     if is_portal_admin(user):
         return None
-    codes = _split(frappe.db.get_value("User", user, "allowed_regions"))
+    codes = list(_user_scope(user)["regions"])
     if division and codes:
-        valid = set(frappe.get_all(
-            "Region Master", filters={"division": ["in", [division, "Both"]]}, pluck="name"))
+        valid = set(_division_region_codes(division))
         codes = [c for c in codes if c in valid]
     return codes
 
@@ -0,0 +1,191 @@
+"""Monthly rollup of Primary Sales Data.
+
+The primary reports (stockist-wise primary sales, the moving trends, target vs
+sales) SUM raw invoice lines per request — millions of rows, often behind an IN list
+of every stockist under an HQ. `__scanify_primary_monthly` holds the same figures at
+
+    division, sales_month, stockist_code, region, team, pcode, iscancelled
+
+(sales_month = first day of the invoice month) with the stockist's HQ, zone, names
+and pack alongside, and SUMs of quantity, freeqty and ptsvalue. The HQ is read from
+Stockist Master when the rollup is refreshed; reports that filter by HQ keep resolving
+stockists through the master, so a re-assigned stockist never reports under a stale HQ.
+
+Maintenance:
+
+  * refresh(division, month, stockists=None) recomputes one division-month (or just
+    some of its stockists) with a DELETE and one INSERT ... SELECT.
+  * The upload job refreshes every invoice month its upload month touched, before and
+    after the write; delete_primary_sales_month refreshes the months it removed.
+  * Single-row edits refresh their stockist's month through doc events.
+  * rebuild() recomputes everything and marks the rollup ready — until then
+    is_ready() is False and reports keep the raw query.
+
+    bench --site <site> execute scanify.primary_rollup.rebuild
+"""
+
+import calendar
+
+import frappe
+from frappe.utils import getdate
+
+from scanify.statement_chain import month_start
+
+TABLE = "__scanify_primary_monthly"
+_READY_KEY = "scanify_primary_rollup_ready"
+
+_MONTH = "DATE_SUB(psd.invoicedate, INTERVAL DAYOFMONTH(psd.invoicedate) - 1 DAY)"
+
+
+def ensure_table():
+    frappe.db.sql_ddl(f"""
+        CREATE TABLE IF NOT EXISTS `{TABLE}` (
+            division VARCHAR(140) NOT NULL,
+            sales_month DATE NOT NULL,
+            stockist_code VARCHAR(140) NOT NULL,
+            region VARCHAR(140) NOT NULL DEFAULT '',
+            team VARCHAR(140) NOT NULL DEFAULT '',
+            pcode VARCHAR(140) NOT NULL,
+            iscancelled TINYINT NOT NULL DEFAULT 0,
+            hq VARCHAR(140) NOT NULL DEFAULT '',
+            zonee VARCHAR(140) NOT NULL DEFAULT '',
+            stockist_name VARCHAR(140) NOT NULL DEFAULT '',
+            product VARCHAR(140) NOT NULL DEFAULT '',
+            pack VARCHAR(140) NOT NULL DEFAULT '',
+            quantity DECIMAL(21, 6) NOT NULL DEFAULT 0,
+            freeqty DECIMAL(21, 6) NOT NULL DEFAULT 0,
+            ptsvalue DECIMAL(21, 6) NOT NULL DEFAULT 0,
+            PRIMARY KEY (division, sales_month, stockist_code, region, team, pcode, iscancelled),
+            KEY stockist_month (stockist_code, sales_month),
+            KEY division_hq_month (division, hq, sales_month),
+            KEY division_region_month (division, region, sales_month)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+
+
+def _month_bounds(month):
+    start = month_start(month)
+    end = start.replace(day=calendar.monthrange(start.year, start.month)[1])
+    return str(start), str(end)
+
+
+def refresh(division, month, stockists=None):
+    """Recompute the rollup rows of one division and invoice month, limited to
+    `stockists` when given."""
+    start, end = _month_bounds(month)
+    params = {"division": division, "start": start, "end": end}
+    delete_cond = insert_cond = ""
+    if stockists is not None:
+        stockists = sorted({s or "" for s in stockists})
+        if not stockists:
+            return
+        params.update({f"stk{i}": s for i, s in enumerate(stockists)})
+        ph = ", ".join(f"%(stk{i})s" for i in range(len(stockists)))
+        delete_cond = f" AND stockist_code IN ({ph})"
+        insert_cond = f" AND IFNULL(psd.stockist_code, '') IN ({ph})"
+
+    frappe.db.sql(f"""
+        DELETE FROM `{TABLE}`
+         WHERE division = %(division)s AND sales_month = %(start)s{delete_cond}
+    """, params)
+    frappe.db.sql(f"""
+        INSERT INTO `{TABLE}` (division, sales_month, stockist_code, region, team, pcode,
+                               iscancelled, hq, zonee, stockist_name, product, pack,
+                               quantity, freeqty, ptsvalue)
+        SELECT psd.division, {_MONTH}, IFNULL(psd.stockist_code, ''),
+               IFNULL(psd.region, ''), IFNULL(psd.team, ''), IFNULL(psd.pcode, ''),
+               IFNULL(psd.iscancelled, 0),
+               MAX(IFNULL(sm.hq, '')), MAX(IFNULL(psd.zonee, '')),
+               MAX(IFNULL(psd.stockist_name, '')), MAX(IFNULL(psd.product, '')),
+               MAX(IFNULL(psd.pack, '')),
+               SUM(IFNULL(psd.quantity, 0)), SUM(IFNULL(psd.freeqty, 0)),
+               SUM(IFNULL(psd.ptsvalue, 0))
+          FROM `tabPrimary Sales Data` psd
+     LEFT JOIN `tabStockist Master` sm ON sm.name = psd.stockist_code
+         WHERE psd.division = %(division)s
+           AND psd.invoicedate BETWEEN %(start)s AND %(end)s{insert_cond}
+      GROUP BY psd.division, {_MONTH}, IFNULL(psd.stockist_code, ''), IFNULL(psd.region, ''),
+               IFNULL(psd.team, ''), IFNULL(psd.pcode, ''), IFNULL(psd.iscancelled, 0)
+    """, params)
+
+
+def months_of(division, upload_month, stockists=None):
+    """Invoice months (first days) of the rows loaded under an upload month."""
+    params = {"division": division, "upload_month": upload_month}
+    cond = ""
+    if stockists:
+        params.update({f"stk{i}": s for i, s in enumerate(stockists)})
+        cond = f" AND psd.stockist_code IN ({', '.join(f'%(stk{i})s' for i in range(len(stockists)))})"
+    return {getdate(r[0]) for r in frappe.db.sql(f"""
+        SELECT DISTINCT {_MONTH} FROM `tabPrimary Sales Data` psd
+         WHERE psd.division = %(division)s AND psd.upload_month = %(upload_month)s
+           AND psd.invoicedate IS NOT NULL{cond}
+    """, params)}
+
+
+def refresh_months(division, months, stockists=None):
+    """refresh() each month, committing after each one."""
+    for month in sorted(months):
+        refresh(division, month, stockists)
+        frappe.db.commit()
+
+
+def on_change(doc, method=None):
+    """Doc event for Primary Sales Data: refresh the row's stockist-month, and the one
+    it moved from."""
+    keys = set()
+    for d in (doc, doc.get_doc_before_save() if hasattr(doc, "get_doc_before_save") else None):
+        if d and d.division and d.invoicedate:
+            keys.add((d.division, month_start(d.invoicedate), d.stockist_code or ""))
+    for division, month, stockist in keys:
+        refresh(division, month, [stockist])
+
+
+def rebuild(from_month=None):
+    """Recompute the rollup (from `from_month` on, or entirely), one division-month
+    per transaction, then mark it ready."""
+    ensure_table()
+    cond, params = "", {}
+    if from_month:
+        cond = " AND psd.invoicedate >= %(from_month)s"
+        params["from_month"] = str(month_start(from_month))
+    pairs = frappe.db.sql(f"""
+        SELECT DISTINCT psd.division, {_MONTH} FROM `tabPrimary Sales Data` psd
+         WHERE psd.invoicedate IS NOT NULL AND psd.division IS NOT NULL{cond}
+    """, params)
+    if from_month:
+        frappe.db.sql(f"DELETE FROM `{TABLE}` WHERE sales_month >= %(from_month)s", params)
+    else:
+        frappe.db.sql_ddl(f"TRUNCATE TABLE `{TABLE}`")
+    for division, month in sorted(pairs):
+        refresh(division, month)
+        frappe.db.commit()
+    frappe.db.set_global(_READY_KEY, "1")
+    frappe.cache().delete_value(_READY_KEY)
+    frappe.db.commit()
+    return {"months": len(pairs)}
+
+
+def is_ready():
+    return bool(frappe.cache().get_value(
+        _READY_KEY, generator=lambda: frappe.db.get_global(_READY_KEY) or ""))
+
+
+def whole_months(from_date, to_date):
+    """(first month, last month) when [from_date, to_date] covers whole calendar months
+    (an open end gives None), else None — the rollup cannot answer a range that starts
+    or ends mid-month. An unbounded range also gives None: the raw rows with no
+    invoicedate count there, and the rollup does not hold them."""
+    if not from_date and not to_date:
+        return None
+    start = end = None
+    if from_date:
+        start = getdate(from_date)
+        if start.day != 1:
+            return None
+    if to_date:
+        end = getdate(to_date)
+        if end.day != calendar.monthrange(end.year, end.month)[1]:
+            return None
+        end = month_start(end)
+    return start, end
@@ -0,0 +1,148 @@
+"""Bulk write path for Primary Sales Data.
+
+Primary Sales Data is a flat, hash-named doctype with no controller logic, so
+insert() per row only buys link checks, length checks and one INSERT per record —
+for a 150k-row month that is the whole upload time. The upload validates rows once
+against its cached masters; this module does the rest of what insert() would:
+
+  * prepare_row   — coerce a parsed row to the stored shape (hash name, standard
+                    fields, numeric defaults, ISO dates) and apply the column-length
+                    checks, returning an error instead of raising.
+  * insert_rows   — write prepared rows with multi-row INSERTs.
+
+Re-uploads of a corrected month can run as an upsert instead: rows are matched on
+the natural key (invoice no + product code + batch no, within division and month)
+and carry `row_hash`, a digest of their content, so only rows whose content changed
+are rewritten:
+
+  * natural_key / load_existing_keys — the key index of a month already loaded.
+  * upsert_rows   — INSERT ... ON DUPLICATE KEY UPDATE on name for changed rows.
+  * delete_rows   — remove rows that are missing from the new file.
+"""
+
+import hashlib
+import json
+
+import frappe
+from frappe.model import no_value_fields
+from frappe.utils import getdate, now
+
+from scanify import search_index
+
+DOCTYPE = "Primary Sales Data"
+
+_NUMERIC_TYPES = ("Check", "Int", "Float", "Currency", "Percent")
+_STANDARD_FIELDS = ("name", "owner", "creation", "modified", "modified_by", "docstatus", "idx")
+# Not part of a row's content: where it came from, and the digest itself.
+_HASH_EXCLUDE = {"upload_ref", "row_hash"}
+# Kept from the original row when an upsert rewrites it.
+_UPSERT_KEEP = {"name", "owner", "creation"}
+
+
+def insert_columns():
+    """[(fieldname, docfield or None)] written by insert_rows — standard fields first."""
+    meta = frappe.get_meta(DOCTYPE)
+    cols = [(f, None) for f in _STANDARD_FIELDS]
+    cols += [(df.fieldname, df) for df in meta.fields if df.fieldtype not in no_value_fields]
+    return cols
+
+
+def prepare_row(rec, columns, user=None, timestamp=None):
+    """(values in `columns` order, None) for one parsed row, or (None, error message)
+    when insert() would have rejected it."""
+    user = user or frappe.session.user
+    timestamp = timestamp or now()
+    standard = {
+        "name": frappe.generate_hash(length=10),
+        "owner": user, "modified_by": user,
+        "creation": timestamp, "modified": timestamp,
+        "docstatus": 0, "idx": 0,
+    }
+    values = []
+    for fieldname, df in columns:
+        if df is None:
+            values.append(standard[fieldname])
+            continue
+
+        value = rec.get(fieldname)
+        if df.fieldtype in _NUMERIC_TYPES:
+            value = value if value not in (None, "") else (df.default or 0)
+        elif df.fieldtype == "Date":
+            if value in (None, ""):
+                value = None
+            else:
+                try:
+                    value = getdate(value).isoformat()
+                except Exception:
+                    return None, f"Invalid {df.label or fieldname} '{value}'"
+        elif df.fieldtype in ("Data", "Link", "Select") and value is not None:
+            if len(str(value)) > (df.length or 140):
+                return None, f"{df.label or fieldname} exceeds {df.length or 140} characters"
+        values.append(value)
+
+    content = [v for (f, df), v in zip(columns, values, strict=True) if df is not None and f not in _HASH_EXCLUDE]
+    hash_pos = [f for f, _df in columns].index("row_hash")
+    values[hash_pos] = hashlib.md5(json.dumps(content, default=str).encode()).hexdigest()
+    return values, None
+
+
+def natural_key(rec):
+    """(invoice no, product code, batch no) of a parsed row — unique within a division
+    and month up to repeated lines, which are matched in file order."""
+    return tuple(str(rec.get(f) or "").strip().upper() for f in ("invoiceno", "pcode", "batchno"))
+
+
+def load_existing_keys(division, upload_month):
+    """{natural key: [(name, row_hash), ...]} for rows already loaded for the month,
+    in creation order."""
+    existing = {}
+    for r in frappe.db.sql("""
+        SELECT name, invoiceno, pcode, batchno, row_hash
+          FROM `tabPrimary Sales Data`
+         WHERE division = %s AND upload_month = %s
+      ORDER BY creation, name
+    """, (division, upload_month), as_dict=True):
+        existing.setdefault(natural_key(r), []).append((r.name, r.row_hash))
+    return existing
+
+
+def _index(columns, rows):
+    fields = [f for f, _df in columns]
+    search_index.index_rows(DOCTYPE, (dict(zip(fields, row, strict=True)) for row in rows))
+
+
+def insert_rows(columns, rows):
+    """Multi-row INSERT of prepared rows. Returns the number written."""
+    if rows:
+        frappe.db.bulk_insert(DOCTYPE, [f for f, _df in columns], rows, chunk_size=1000)
+        _index(columns, rows)
+    return len(rows)
+
+
+def upsert_rows(columns, rows, chunk_size=1000):
+    """Rewrite existing rows (prepared rows whose name is the stored row's name) with
+    multi-row INSERT ... ON DUPLICATE KEY UPDATE. Returns the number written."""
+    fields = [f for f, _df in columns]
+    col_sql = ", ".join(f"`{f}`" for f in fields)
+    update_sql = ", ".join(f"`{f}` = VALUES(`{f}`)" for f in fields if f not in _UPSERT_KEEP)
+    row_sql = "(" + ", ".join(["%s"] * len(fields)) + ")"
+    for i in range(0, len(rows), chunk_size):
+        chunk = rows[i:i + chunk_size]
+        frappe.db.sql(f"""
+            INSERT INTO `tab{DOCTYPE}` ({col_sql})
+            VALUES {", ".join([row_sql] * len(chunk))}
+            ON DUPLICATE KEY UPDATE {update_sql}
+        """, tuple(v for row in chunk for v in row))
+    _index(columns, rows)
+    return len(rows)
+
+
+def delete_rows(names, chunk_size=1000):
+    """Delete rows by name. Returns the number deleted."""
+    names = list(names)
+    for i in range(0, len(names), chunk_size):
+        chunk = names[i:i + chunk_size]
+        frappe.db.sql(f"DELETE FROM `tab{DOCTYPE}` WHERE name IN ({', '.join(['%s'] * len(chunk))})",
+                      tuple(chunk))
+    search_index.remove(DOCTYPE, names)
+    return len(names)
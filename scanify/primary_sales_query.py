@@ -0,0 +1,78 @@
+"""Paging helpers for the Primary Sales Data list.
+
+  * Keyset cursors — the list is ordered by (invoicedate, name) and a page is
+    fetched as "the next N rows after this key", so page 500 costs the same index
+    seek as page 1 instead of scanning and discarding 25,000 rows.
+  * Cached totals — the filtered COUNT(*) is cached under a hash of the filters and
+    a generation stamp. Anything that writes Primary Sales Data calls
+    invalidate_counts(), which moves the generation on and orphans every cached total.
+"""
+
+import base64
+import hashlib
+import json
+
+import frappe
+
+_COUNT_GEN_KEY = "scanify:primary_sales_count_gen"
+_COUNT_TTL = 600    # safety net for writes that bypass invalidate_counts()
+
+
+def encode_cursor(row):
+    """Opaque cursor for a row's (invoicedate, name) position."""
+    key = [str(row["invoicedate"]) if row.get("invoicedate") else None, row["name"]]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        invoicedate, name = json.loads(base64.urlsafe_b64decode(str(cursor).encode()))
+    except Exception:
+        frappe.throw("Invalid page cursor")
+    return invoicedate, name
+
+
+def keyset_condition(cursor, direction, params):
+    """SQL condition selecting rows strictly after (direction "next") or before
+    ("prev") the cursor in (invoicedate, name) order. NULL invoice dates sort first,
+    as MariaDB sorts them ascending."""
+    invoicedate, name = decode_cursor(cursor)
+    params["cursor_name"] = name
+    if invoicedate is None:
+        if direction == "prev":
+            return "(invoicedate IS NULL AND name < %(cursor_name)s)"
+        return "(invoicedate IS NOT NULL OR name > %(cursor_name)s)"
+    params["cursor_date"] = invoicedate
+    if direction == "prev":
+        return ("(invoicedate < %(cursor_date)s OR invoicedate IS NULL"
+                " OR (invoicedate = %(cursor_date)s AND name < %(cursor_name)s))")
+    return ("(invoicedate > %(cursor_date)s"
+            " OR (invoicedate = %(cursor_date)s AND name > %(cursor_name)s))")
+
+
+def _count_generation():
+    gen = frappe.cache().get_value(_COUNT_GEN_KEY)
+    if not gen:
+        gen = frappe.generate_hash(length=8)
+        frappe.cache().set_value(_COUNT_GEN_KEY, gen)
+    return gen
+
+
+def cached_count(where_clause, params):
+    """COUNT(*) of Primary Sales Data matching the filters, cached per filter set."""
+    digest = hashlib.md5(
+        json.dumps([where_clause, sorted(params.items())], default=str).encode()
+    ).hexdigest()
+    key = f"scanify:primary_sales_count:{_count_generation()}:{digest}"
+    total = frappe.cache().get_value(key)
+    if total is None:
+        total = frappe.db.sql(
+            f"SELECT COUNT(*) FROM `tabPrimary Sales Data` WHERE {where_clause}", params
+        )[0][0]
+        frappe.cache().set_value(key, total, expires_in_sec=_COUNT_TTL)
+    return total
+
+
+def invalidate_counts(doc=None, method=None):
+    """Drop every cached total. Also wired as a Primary Sales Data doc event."""
+    frappe.cache().set_value(_COUNT_GEN_KEY, frappe.generate_hash(length=8))
@@ -0,0 +1,105 @@
+/* ============================================================================
+ * Scanify — Background export jobs (client side)
+ * ----------------------------------------------------------------------------
+ * Export endpoints queue an Export Job and answer with its status instead of the
+ * file. scanifyExport.run() starts one, follows its progress — through the
+ * `scanify_export_progress` realtime event when the page has a socket, and by
+ * polling get_export_job either way — and downloads the file when it is ready.
+ *
+ *   scanifyExport.run("scanify.api.export_primary_sales_data", { month: m, division: d }, {
+ *       onProgress: function (job) { ... },   // job.status, job.progress
+ *       onDone: function (job) { ... },       // after the download started
+ *       onError: function (message) { ... }
+ *   });
+ *
+ * Requires jQuery. Uses no other globals.
+ * ==========================================================================*/
+(function () {
+    "use strict";
+
+    var POLL_MS = 2000;
+
+    function csrf() {
+        return window.csrf_token || (window.frappe && frappe.csrf_token) || "";
+    }
+
+    function post(method, args) {
+        return $.ajax({
+            url: "/api/method/" + method,
+            type: "POST",
+            contentType: "application/json",
+            headers: { "X-Frappe-CSRF-Token": csrf() },
+            data: JSON.stringify(args || {})
+        });
+    }
+
+    function errorText(xhr) {
+        try {
+            var r = JSON.parse(xhr.responseText || "{}");
+            if (r._server_messages) {
+                var msgs = JSON.parse(r._server_messages);
+                return JSON.parse(msgs[0]).message || msgs[0];
+            }
+            return r.exception || "Export failed";
+        } catch (e) {
+            return "Export failed";
+        }
+    }
+
+    function follow(job, opts) {
+        var finished = false;
+        var timer = null;
+
+        function handle(j) {
+            if (finished || !j || j.name !== job.name) return;
+            if (opts.onProgress) opts.onProgress(j);
+            if (j.status === "Completed") {
+                finish();
+                window.location.href = j.download_url;
+                if (opts.onDone) opts.onDone(j);
+            } else if (j.status === "Failed") {
+                finish();
+                if (opts.onError) opts.onError(j.message || "Export failed");
+            }
+        }
+
+        function finish() {
+            finished = true;
+            if (timer) clearTimeout(timer);
+            if (window.frappe && frappe.realtime && frappe.realtime.off) {
+                frappe.realtime.off("scanify_export_progress", handle);
+            }
+        }
+
+        function poll() {
+            if (finished) return;
+            $.ajax({ url: "/api/method/scanify.api.get_export_job", data: { name: job.name } })
+                .done(function (r) { handle(r.message); })
+                .always(function () { if (!finished) timer = setTimeout(poll, POLL_MS); });
+        }
+
+        if (window.frappe && frappe.realtime && frappe.realtime.on) {
+            frappe.realtime.on("scanify_export_progress", handle);
+        }
+        handle(job);
+        if (!finished) timer = setTimeout(poll, POLL_MS);
+    }
+
+    function run(method, args, opts) {
+        opts = opts || {};
+        post(method, args)
+            .done(function (r) {
+                var job = r.message;
+                if (!job || job.success === false && !job.name) {
+                    if (opts.onError) opts.onError((job && job.message) || "Export failed");
+                    return;
+                }
+                follow(job, opts);
+            })
+            .fail(function (xhr) {
+                if (opts.onError) opts.onError(errorText(xhr));
+            });
+    }
+
+    window.scanifyExport = { run: run, follow: follow };
+})();
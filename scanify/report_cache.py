@@ -0,0 +1,171 @@
+"""Result cache for the portal report endpoints.
+
+Users reopen the same stockist, ranking and trend reports with the same filters many
+times a day. @cached_report stores each result in Redis under
+
+    report name + normalised arguments + the caller's effective scope + data version
+
+The scope (role, allowed divisions, active division, visible region codes, from
+permissions.get_user_scope; scope_key()) keeps a regional user from ever seeing a
+result computed for a wider scope. The data version is a generation stamp
+(generation()): bump() moves it on and orphans every cached result, and every cached
+export file (scanify.export_jobs). Doc events bump it for writes to the report source
+doctypes (WATCHED); the bulk writers that skip doc events (primary upload and delete,
+statement_bulk, statement_chain) call bump() themselves. bump() moves the stamp at once
+and again when the transaction commits (after_commit_once): a report computed in
+between still reads the old rows and would otherwise be cached as current. Entries also expire after
+_TTL as a safety net, and results over _MAX_BYTES are not stored.
+
+Hits, misses and oversized results are counted per report; stats() reports them with
+the hit rate (get_report_cache_stats on the DB Indexes page).
+"""
+
+import functools
+import hashlib
+import inspect
+import json
+import pickle
+
+import frappe
+
+_GEN_KEY = "scanify:report_cache_gen"
+_STATS_KEY = "scanify:report_cache_stats"
+_TTL = 900
+_MAX_BYTES = 4 * 1024 * 1024
+
+# Doctypes whose writes change what some report returns.
+WATCHED = {
+    "Stockist Statement", "Primary Sales Data", "Scheme Request", "Scheme Deduction",
+    "HQ Yearly Target", "Stockist Master", "Product Master", "HQ Master", "Team Master",
+    "Region Master", "Zone Master", "State Master", "Doctor Master", "Division",
+    "Product Excluded Region",
+}
+
+
+def generation():
+    """The current data version (moved on by bump())."""
+    gen = frappe.cache().get_value(_GEN_KEY)
+    if not gen:
+        gen = frappe.generate_hash(length=8)
+        frappe.cache().set_value(_GEN_KEY, gen)
+    return gen
+
+
+def after_commit_once(key, fn):
+    """Run fn once the current transaction commits — once per `key`, however often it
+    is asked for. A rollback discards Frappe's after_commit callbacks, so it also
+    forgets what was queued here and the next write queues fn again."""
+    queued = frappe.flags.get("scanify_after_commit")
+    if queued is None:
+        queued = frappe.flags.scanify_after_commit = set()
+    if key in queued:
+        return
+    queued.add(key)
+
+    def run():
+        queued.discard(key)
+        fn()
+
+    frappe.db.after_commit.add(run)
+    frappe.db.after_rollback.add(queued.clear)
+
+
+def _move_generation():
+    frappe.cache().set_value(_GEN_KEY, frappe.generate_hash(length=8))
+
+
+def bump(doc=None, method=None):
+    """Invalidate every cached report, now and again after the commit. Also wired as a
+    doc event for all doctypes, acting only on WATCHED ones."""
+    if doc is not None and doc.doctype not in WATCHED:
+        return
+    _move_generation()
+    after_commit_once("report_cache", _move_generation)
+
+
+def _normalise(value):
+    """Equal filters give equal keys: surrounding blanks and empty values drop out,
+    and JSON-string lists compare equal to the lists they encode."""
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith("[") or value.startswith("{"):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                return value
+        else:
+            return value or None
+    if isinstance(value, (list, tuple)):
+        return [_normalise(v) for v in value if v not in (None, "")] or None
+    if isinstance(value, dict):
+        return {k: _normalise(v) for k, v in sorted(value.items()) if v not in (None, "")} or None
+    return value
+
+
+def scope_key(division):
+    """The caller's effective scope for `division`, as a JSON-able list."""
+    from scanify.permissions import get_user_scope
+    scope = get_user_scope(division)
+    return [scope["role"], sorted(scope["divisions"]), scope["active_division"],
+            scope["region_codes"]]
+
+
+# The counters are plain Redis hash integers. RedisWrapper's hget / hgetall unpickle
+# their values, so they are written with HINCRBY and read back with HSCAN, neither of
+# which the wrapper overrides.
+def _count(report, outcome):
+    cache = frappe.cache()
+    cache.hincrby(cache.make_key(_STATS_KEY), f"{report}:{outcome}", 1)
+
+
+def cached_report(fn):
+    """Decorator for report endpoints: serve a result cached for the same arguments,
+    scope and data version. Apply it below @frappe.whitelist()."""
+    report = fn.__name__
+    signature = inspect.signature(fn)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind_partial(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = {k: _normalise(v) for k, v in sorted(bound.arguments.items())}
+        digest = hashlib.md5(json.dumps(
+            [arguments, scope_key(arguments.get("division"))], default=str
+        ).encode()).hexdigest()
+        key = f"scanify:report_cache:{generation()}:{report}:{digest}"
+
+        cached = frappe.cache().get_value(key)
+        if cached is not None:
+            _count(report, "hit")
+            return pickle.loads(cached)
+
+        _count(report, "miss")
+        result = fn(*args, **kwargs)
+        if isinstance(result, dict) and result.get("success") is False:
+            return result
+        payload = pickle.dumps(result)
+        if len(payload) > _MAX_BYTES:
+            _count(report, "oversize")
+        else:
+            frappe.cache().set_value(key, payload, expires_in_sec=_TTL)
+        return result
+    return wrapper
+
+
+def stats():
+    """[{report, hits, misses, oversize, hit_rate}] since the last reset, busiest first."""
+    cache = frappe.cache()
+    counts = {}
+    for field, value in cache.hscan_iter(cache.make_key(_STATS_KEY)):
+        report, outcome = frappe.safe_decode(field).rsplit(":", 1)
+        counts.setdefault(report, {"report": report, "hits": 0, "misses": 0, "oversize": 0})
+        counts[report][{"hit": "hits", "miss": "misses"}.get(outcome, outcome)] = int(value)
+    rows = sorted(counts.values(), key=lambda r: r["hits"] + r["misses"], reverse=True)
+    for r in rows:
+        total = r["hits"] + r["misses"]
+        r["hit_rate"] = round(100.0 * r["hits"] / total, 1) if total else 0.0
+    return rows
+
+
+def reset_stats():
+    frappe.cache().delete_value(_STATS_KEY)
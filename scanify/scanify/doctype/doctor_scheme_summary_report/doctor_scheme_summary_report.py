@@ -8,6 +8,8 @@ import openpyxl
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 
+from scanify import org_closure
+
 class DoctorSchemeSummaryReport(Document):
     def validate(self):
         """Validate report parameters"""
@@ -120,19 +122,12 @@ class DoctorSchemeSummaryReport(Document):
         
         # Region filter
         elif self.region:
-            teams = frappe.get_all(
-                "Team Master",
-                filters={"region": self.region, "status": "Active"},
-                pluck="name"
-            )
-            doctors = []
-            for team in teams:
-                team_doctors = frappe.get_all(
-                    "Doctor Master",
-                    filters={"team": team, "status": "Active"},
-                    pluck="doctor_code"
-                )
-                doctors.extend(team_doctors)
+            teams = org_closure.descendants("Region", self.region, "Team")
+            doctors = frappe.get_all(
+                "Doctor Master",
+                filters={"team": ["in", teams], "status": "Active"},
+                pluck="doctor_code"
+            ) if teams else []
             
             if doctors:
                 filters["doctor_code"] = ["in", doctors]
@@ -8,6 +8,8 @@ import openpyxl
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 
+from scanify import org_closure
+
 class ProductMovingTrendReport(Document):
     def validate(self):
         """Validate report parameters"""
@@ -71,55 +73,14 @@ class ProductMovingTrendReport(Document):
         elif self.to_date:
             filters["statement_month"] = ["<=", self.to_date]
         
-        # Stockist hierarchy filters
+        # Stockist hierarchy filters — active stockists under the most specific level
         if self.stockist:
             filters["stockist_code"] = self.stockist
-        elif self.hq:
-            stockists = frappe.get_all(
-                "Stockist Master",
-                filters={"hq": self.hq, "status": "Active"},
-                pluck="stockist_code"
-            )
-            if stockists:
-                filters["stockist_code"] = ["in", stockists]
-        elif self.team:
-            hqs = frappe.get_all(
-                "HQ Master",
-                filters={"team": self.team, "status": "Active"},
-                pluck="name"
-            )
-            stockist_list = []
-            for hq in hqs:
-                stockists = frappe.get_all(
-                    "Stockist Master",
-                    filters={"hq": hq, "status": "Active"},
-                    pluck="stockist_code"
-                )
-                stockist_list.extend(stockists)
-            
-            if stockist_list:
-                filters["stockist_code"] = ["in", stockist_list]
-        elif self.region:
-            teams = frappe.get_all(
-                "Team Master",
-                filters={"region": self.region, "status": "Active"},
-                pluck="name"
-            )
-            stockist_list = []
-            for team in teams:
-                hqs = frappe.get_all(
-                    "HQ Master",
-                    filters={"team": team, "status": "Active"},
-                    pluck="name"
-                )
-                for hq in hqs:
-                    stockists = frappe.get_all(
-                        "Stockist Master",
-                        filters={"hq": hq, "status": "Active"},
-                        pluck="stockist_code"
-                    )
-                    stockist_list.extend(stockists)
-            
+        elif self.hq or self.team or self.region:
+            level, entity = (("HQ", self.hq) if self.hq
+                             else ("Team", self.team) if self.team
+                             else ("Region", self.region))
+            stockist_list = org_closure.descendants(level, entity, "Stockist")
             if stockist_list:
                 filters["stockist_code"] = ["in", stockist_list]
         
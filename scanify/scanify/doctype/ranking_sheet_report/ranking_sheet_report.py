@@ -8,6 +8,8 @@ import openpyxl
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 
+from scanify import org_closure
+
 class RankingSheetReport(Document):
     def validate(self):
         """Validate report parameters"""
@@ -102,28 +104,9 @@ class RankingSheetReport(Document):
         elif self.to_date:
             filters["statement_month"] = ["<=", self.to_date]
         
-        # Region filter
+        # Region filter — active stockists under the region
         if self.region:
-            teams = frappe.get_all(
-                "Team Master",
-                filters={"region": self.region, "status": "Active"},
-                pluck="name"
-            )
-            stockist_list = []
-            for team in teams:
-                hqs = frappe.get_all(
-                    "HQ Master",
-                    filters={"team": team, "status": "Active"},
-                    pluck="name"
-                )
-                for hq in hqs:
-                    stockists = frappe.get_all(
-                        "Stockist Master",
-                        filters={"hq": hq, "status": "Active"},
-                        pluck="stockist_code"
-                    )
-                    stockist_list.extend(stockists)
-            
+            stockist_list = org_closure.descendants("Region", self.region, "Stockist")
             if stockist_list:
                 filters["stockist_code"] = ["in", stockist_list]
         
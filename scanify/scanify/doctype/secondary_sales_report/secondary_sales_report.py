@@ -8,6 +8,8 @@ import openpyxl
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 
+from scanify import org_closure
+
 class SecondarySalesReport(Document):
     def validate(self):
         """Validate report parameters"""
@@ -80,59 +82,14 @@ class SecondarySalesReport(Document):
         elif self.to_date:
             filters["statement_month"] = ["<=", self.to_date]
         
-        # Hierarchy filters
+        # Hierarchy filters — active stockists under the most specific level
         if self.stockist:
             filters["stockist_code"] = self.stockist
-        elif self.hq:
-            # Get all stockists for this HQ
-            stockists = frappe.get_all(
-                "Stockist Master",
-                filters={"hq": self.hq, "status": "Active"},
-                fields=["stockist_code"]
-            )
-            if stockists:
-                stockist_codes = [s["stockist_code"] for s in stockists]
-                filters["stockist_code"] = ["in", stockist_codes]
-        elif self.team:
-            # Get all HQs for this team, then all stockists
-            hqs = frappe.get_all(
-                "HQ Master",
-                filters={"team": self.team, "status": "Active"},
-                fields=["name"]
-            )
-            stockist_list = []
-            for hq in hqs:
-                stockists = frappe.get_all(
-                    "Stockist Master",
-                    filters={"hq": hq["name"], "status": "Active"},
-                    fields=["stockist_code"]
-                )
-                stockist_list.extend([s["stockist_code"] for s in stockists])
-            
-            if stockist_list:
-                filters["stockist_code"] = ["in", stockist_list]
-        elif self.region:
-            # Get all teams for this region
-            teams = frappe.get_all(
-                "Team Master",
-                filters={"region": self.region, "status": "Active"},
-                fields=["name"]
-            )
-            stockist_list = []
-            for team in teams:
-                hqs = frappe.get_all(
-                    "HQ Master",
-                    filters={"team": team["name"], "status": "Active"},
-                    fields=["name"]
-                )
-                for hq in hqs:
-                    stockists = frappe.get_all(
-                        "Stockist Master",
-                        filters={"hq": hq["name"], "status": "Active"},
-                        fields=["stockist_code"]
-                    )
-                    stockist_list.extend([s["stockist_code"] for s in stockists])
-            
+        elif self.hq or self.team or self.region:
+            level, entity = (("HQ", self.hq) if self.hq
+                             else ("Team", self.team) if self.team
+                             else ("Region", self.region))
+            stockist_list = org_closure.descendants(level, entity, "Stockist")
             if stockist_list:
                 filters["stockist_code"] = ["in", stockist_list]
         
@@ -12,53 +12,54 @@ class StockistStatement(Document):
         """Auto-populate previous month closing when creating new statement"""
         self.populate_previous_month_closing()
 
-    def populate_previous_month_closing(self):
+    def populate_previous_month_closing(self, prev_closing_map=None):
         """
-        Fetch previous month's closing qty for each product and populate prev_month_closing field
+        Fetch previous month's closing qty for each product and populate prev_month_closing field.
+
+        Batch callers (secondary upload, bulk OCR) pass the map they preloaded with
+        scanify.statement_chain.load_previous_closings — either as `prev_closing_map`
+        or via doc.flags.prev_closing_map when insert() triggers this from before_insert —
+        so no per-statement lookup runs.
         """
-        if not self.stockist_code or not self.statement_month:
+        # Nothing to fill on an empty statement (e.g. the OCR flows insert the
+        # header first and add items after extraction) — skip the lookup.
+        if not self.stockist_code or not self.statement_month or not self.items:
             return
-        
+
+        if prev_closing_map is None:
+            prev_closing_map = self.flags.get("prev_closing_map")
+
         try:
-            # Calculate previous month
-            previous_month = add_months(self.statement_month, -1)
-            previous_month_first = get_first_day(previous_month)
-            
-            # Find previous month's submitted statement
-            prev_statement = frappe.db.get_value("Stockist Statement", {
-                "stockist_code": self.stockist_code,
-                "statement_month": previous_month_first,
-                "docstatus": 1  # Only submitted statements
-            }, "name")
-            
-            if not prev_statement:
-                # No previous month statement found, set all to 0
-                for item in self.items:
-                    item.prev_month_closing = 0
-                return
-            
-            # Get previous month's closing quantities
-            prev_items = frappe.get_all("Stockist Statement Item",
-                filters={"parent": prev_statement},
-                fields=["product_code", "closing_qty"]
-            )
-            
-            # Create a dict for quick lookup
-            prev_closing_map = {item.product_code: flt(item.closing_qty, 0) for item in prev_items}
-            
-            # Update each item with previous month closing
+            if prev_closing_map is None:
+                from scanify.statement_chain import load_previous_closings, month_start
+
+                prev_closing_map = load_previous_closings(
+                    [(self.stockist_code, self.statement_month)]
+                ).get((self.stockist_code, month_start(self.statement_month)), {})
+
+            # Update each item with previous month closing (0 when no submitted
+            # previous statement / product)
             for item in self.items:
-                if item.product_code in prev_closing_map:
-                    item.prev_month_closing = prev_closing_map[item.product_code]
-                else:
-                    item.prev_month_closing = 0
-            
+                item.prev_month_closing = prev_closing_map.get(item.product_code, 0)
+
         except Exception as e:
             frappe.log_error(frappe.get_traceback(), "Populate Previous Month Closing Error")
             # Set all to 0 on error
             for item in self.items:
                 item.prev_month_closing = 0
 
+    def _master_row(self, doctype, name, fields):
+        """Master lookup used by validate. Bulk creators (scanify.statement_bulk) preload
+        every master they need into doc.flags.master_cache — {(doctype, name): row} — so
+        building hundreds of statements costs no per-item queries; anything not cached
+        falls back to the database."""
+        if not name:
+            return None
+        cache = self.flags.get("master_cache")
+        if cache is not None and (doctype, name) in cache:
+            return cache[(doctype, name)]
+        return frappe.db.get_value(doctype, name, fields, as_dict=True)
+
     def set_division_from_stockist(self):
         if not self.stockist_code:
             return
@@ -67,16 +68,17 @@ class StockistStatement(Document):
         # the caller already supplied (the portal sends the active session division).
         # Only throw when none resolve — otherwise a stockist imported without a
         # division blocks statement creation entirely (this was the prod-only 417).
-        division = frappe.db.get_value("Stockist Master", self.stockist_code, "division")
+        stockist = self._master_row("Stockist Master", self.stockist_code, ["division", "region"]) or {}
+        division = stockist.get("division")
         if not division and self.hq:
-            division = frappe.db.get_value("HQ Master", self.hq, "division")
+            division = (self._master_row("HQ Master", self.hq, ["division"]) or {}).get("division")
         if not division:
             # Last structural fallback before the session value: the stockist's
             # region carries a division too (Region Master.division). Covers
             # stockists imported without a division or HQ but with a region set.
-            region = frappe.db.get_value("Stockist Master", self.stockist_code, "region")
+            region = stockist.get("region")
             if region:
-                division = frappe.db.get_value("Region Master", region, "division")
+                division = (self._master_row("Region Master", region, ["division"]) or {}).get("division")
         if not division:
             division = self.division
         if not division:
@@ -140,33 +142,19 @@ class StockistStatement(Document):
         else:
             self.qc_confidence = "All Matched"
 
-    def calculate_closing_and_totals(self):
-        """Calculate closing qty and value totals with pack-to-strip conversion"""
-
-        total_sales_qty = 0
-        total_operational_sales_qty = 0
-        total_sales_value_pts = 0
-        total_sales_value_ptr = 0
-        total_opening_value = 0
-        total_purchase_value = 0
-        total_closing_value = 0
+    def calculate_item_values(self):
+        """Per-line conversion factor, PTS and values (pack-to-strip conversion).
 
+        Returns the items that were valued (those whose product exists in Product
+        Master) — the rows the document totals are summed over."""
+        valued = []
 
         for item in self.items:
-            row_type = (item.row_type or "product").strip()
-            if row_type in ("others", "branch_transfer"):
-                total_operational_sales_qty += flt(item.operational_sales_qty or item.sales_qty)
-
             if not item.product_code:
                 continue
 
             # -------- FETCH PRODUCT MASTER --------
-            product = frappe.db.get_value(
-                "Product Master",
-                item.product_code,
-                ["pts", "ptr", "pack"],
-                as_dict=True
-            )
+            product = self._master_row("Product Master", item.product_code, ["pts", "ptr", "pack"])
             if not product:
                 continue
 
@@ -208,7 +196,30 @@ class StockistStatement(Document):
             # The last column on physical statements is a stockist reference figure
             # (not a true book value) — never trust the OCR-extracted closing_value.
             item.closing_value = closing_qty_base * pts
-            # -------- TOTALS --------
+            valued.append(item)
+
+        return valued
+
+    def calculate_closing_and_totals(self):
+        """Calculate closing qty and value totals with pack-to-strip conversion"""
+
+        total_sales_qty = 0
+        total_operational_sales_qty = 0
+        total_sales_value_pts = 0
+        total_sales_value_ptr = 0
+        total_opening_value = 0
+        total_purchase_value = 0
+        total_closing_value = 0
+
+        for item in self.items:
+            row_type = (item.row_type or "product").strip()
+            if row_type in ("others", "branch_transfer"):
+                total_operational_sales_qty += flt(item.operational_sales_qty or item.sales_qty)
+
+        # -------- TOTALS --------
+        # (scanify.statement_bulk.update_statement_totals is the set-based SQL twin of
+        # this block — keep the two in step.)
+        for item in self.calculate_item_values():
             total_sales_qty += flt(item.sales_qty)
             total_sales_value_pts += item.sales_value_pts
             total_sales_value_ptr += item.sales_value_ptr
@@ -263,32 +274,11 @@ def validate_closing_balance(doc, method):
 def update_next_month_opening(doc, method):
     """Update next month's opening balance after submission"""
     try:
-        next_month = add_months(doc.statement_month, 1)
-        next_month_first = get_first_day(next_month)
-        
-        # Check if next month's statement exists
-        next_statement = frappe.db.exists("Stockist Statement", {
-            "stockist_code": doc.stockist_code,
-            "statement_month": next_month_first,
-            "docstatus": 0
-        })
-        
-        if next_statement:
-            next_doc = frappe.get_doc("Stockist Statement", next_statement)
-            
-            # Update opening quantities from current closing
-            for item in doc.items:
-                if not item.product_code:
-                    continue
-                
-                for next_item in next_doc.items:
-                    if next_item.product_code == item.product_code:
-                        next_item.opening_qty = flt(item.closing_qty or 0)
-                        break
-            
-            next_doc.calculate_closing_and_totals()
-            next_doc.save()
-            frappe.msgprint(f"Next month's opening balance updated for {next_doc.name}")
-    
+        from scanify.statement_chain import carry_forward_to_next_month
+
+        updated = carry_forward_to_next_month(doc)
+        if updated:
+            frappe.msgprint(f"Next month's opening balance updated for {', '.join(updated)}")
+
     except Exception as e:
         frappe.log_error(frappe.get_traceback(), "Update Next Month Opening Error")
@@ -0,0 +1,31 @@
+# Copyright (c) 2025, Stedman Pharmaceuticals and Contributors
+# See license.txt
+
+from frappe.tests import IntegrationTestCase
+
+from scanify import db_indexes
+
+
+class IntegrationTestHotPathIndexes(IntegrationTestCase):
+	"""
+	EXPLAIN regression test for the report queries in scanify.db_indexes.
+	Fails when a curated index is dropped or a query drifts so that its
+	index is no longer a candidate for the optimiser.
+	"""
+
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+		db_indexes.ensure_indexes()
+
+	def test_curated_indexes_exist(self):
+		usage = db_indexes.index_usage()
+		self.assertEqual(usage["missing"], [])
+
+	def test_hot_queries_can_use_their_index(self):
+		for plan in db_indexes.explain_hot_paths():
+			with self.subTest(query=plan["label"]):
+				self.assertTrue(
+					plan["candidate"],
+					f"{plan['expected']} not in possible_keys ({plan['possible_keys']})",
+				)
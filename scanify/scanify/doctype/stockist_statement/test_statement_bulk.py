@@ -0,0 +1,66 @@
+# Copyright (c) 2025, Stedman Pharmaceuticals and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests import IntegrationTestCase
+from frappe.utils import flt
+
+from scanify.statement_bulk import create_statements
+
+DIVISION = "Prima"
+STATEMENT_MONTH = "2020-01-01"
+
+
+def _insert(doctype, **values):
+	return frappe.get_doc({"doctype": doctype, **values}).insert(ignore_permissions=True)
+
+
+class IntegrationTestStatementBulk(IntegrationTestCase):
+	"""
+	create_statements against the real Stockist Statement tables: the multi-row
+	INSERTs and the set-based totals UPDATE must only touch stored columns.
+	"""
+
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+		tag = frappe.generate_hash(length=6)
+		if not frappe.db.exists("Division", DIVISION):
+			_insert("Division", division_name=DIVISION)
+		region = _insert("Region Master", region_name=f"Bulk Region {tag}", division=DIVISION)
+		team = _insert("Team Master", team_name=f"Bulk Team {tag}", division=DIVISION,
+					   region=region.name)
+		hq = _insert("HQ Master", hq_code=f"BHQ{tag}", hq_name=f"Bulk HQ {tag}", team=team.name,
+					 region=region.name, division=DIVISION)
+		cls.stockist = _insert("Stockist Master", stockist_name=f"Bulk Stockist {tag}",
+							   hq=hq.name, team=team.name, region=region.name)
+		cls.product = _insert("Product Master", product_code=f"BP{tag}",
+							  product_name=f"Bulk Product {tag}", division=DIVISION,
+							  product_group="Others", pts=10, ptr=12)
+
+	def test_create_statements_inserts_and_totals(self):
+		created, errors, duplicates = create_statements([(
+			{"stockist_code": self.stockist.name, "skip_conversion": 1},
+			[{"product_code": self.product.name, "opening_qty": 5, "purchase_qty": 20,
+			  "sales_qty": 15, "closing_qty": 10}],
+		)], STATEMENT_MONTH)
+
+		self.assertEqual(errors, [])
+		self.assertEqual(duplicates, {})
+		self.assertEqual([code for code, _name in created], [self.stockist.name])
+
+		statement = frappe.get_doc("Stockist Statement", created[0][1])
+		self.assertEqual(len(statement.items), 1)
+		self.assertEqual(flt(statement.total_sales_value_pts),
+						 flt(statement.items[0].sales_value_pts))
+		self.assertGreater(flt(statement.total_sales_value_pts), 0)
+
+	def test_second_statement_for_the_month_is_a_duplicate(self):
+		spec = ({"stockist_code": self.stockist.name, "skip_conversion": 1},
+				[{"product_code": self.product.name, "sales_qty": 1}])
+		created, _errors, _duplicates = create_statements([spec], "2020-02-01")
+		again, errors, duplicates = create_statements([spec], "2020-02-01")
+
+		self.assertEqual(again, [])
+		self.assertEqual(errors, [])
+		self.assertEqual(duplicates, {self.stockist.name: created[0][1]})
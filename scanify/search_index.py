@@ -0,0 +1,162 @@
+"""Trigram side index for free-text search on the large sales tables.
+
+`col LIKE '%term%'` cannot use a B-tree index, so the sales list and statement search
+scan every row. This module keeps one row per indexed document in
+`__scanify_search` (named like Frappe's own `__global_search`) whose `grams`
+column holds the trigrams of the searchable fields under a FULLTEXT index:
+
+    product "PARA-500"  ->  ppar para pra5 pa50 p500   (field letter + each trigram
+                                                         of the lower-cased alphanumerics)
+
+A term's trigrams are all required (`+pxxx +pyyy` in BOOLEAN MODE), which narrows
+the candidates to a handful of rows; the caller keeps its LIKE on top for exactness.
+The field letter scopes tokens to a field and keeps every token four characters
+long, clear of InnoDB's minimum token size and stopword list.
+
+Maintenance: doc events cover single-document saves and deletes; the bulk writers
+(primary_sales_bulk, statement_bulk, delete_primary_sales_month) call index_rows /
+remove / remove_where directly. rebuild() backfills a doctype and only then marks it
+ready; until a doctype is ready match_condition returns None and callers keep LIKE.
+"""
+
+import re
+
+import frappe
+
+TABLE = "__scanify_search"
+BATCH_SIZE = 2000
+
+# doctype -> {field letter: [source columns]}
+INDEXED = {
+    "Primary Sales Data": {
+        "s": ["stockist_code", "stockist_name"],
+        "p": ["product"],
+        "c": ["pcode"],
+        "i": ["invoiceno"],
+    },
+    "Stockist Statement": {
+        "s": ["stockist_code", "stockist_name", "name"],
+    },
+}
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def ensure_table():
+    frappe.db.sql_ddl(f"""
+        CREATE TABLE IF NOT EXISTS `{TABLE}` (
+            ref_doctype VARCHAR(140) NOT NULL,
+            ref_name VARCHAR(140) NOT NULL,
+            division VARCHAR(140),
+            grams LONGTEXT,
+            PRIMARY KEY (ref_doctype, ref_name),
+            FULLTEXT KEY grams (grams)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+
+
+def _trigrams(text):
+    text = _NON_ALNUM.sub("", str(text or "").lower())
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def grams_for(doctype, row):
+    """Space-separated index tokens for one document (dict-like row)."""
+    tokens = set()
+    for letter, fields in INDEXED[doctype].items():
+        for field in fields:
+            tokens |= {letter + g for g in _trigrams(row.get(field))}
+    return " ".join(sorted(tokens))
+
+
+def index_rows(doctype, rows):
+    """Upsert index entries for rows (dicts with name, division and the source columns)."""
+    rows = list(rows)
+    for i in range(0, len(rows), BATCH_SIZE):
+        chunk = rows[i:i + BATCH_SIZE]
+        frappe.db.sql(f"""
+            INSERT INTO `{TABLE}` (ref_doctype, ref_name, division, grams)
+            VALUES {", ".join(["(%s, %s, %s, %s)"] * len(chunk))}
+            ON DUPLICATE KEY UPDATE division = VALUES(division), grams = VALUES(grams)
+        """, tuple(v for r in chunk
+                   for v in (doctype, r.get("name"), r.get("division"), grams_for(doctype, r))))
+
+
+def remove(doctype, names):
+    names = list(names)
+    for i in range(0, len(names), BATCH_SIZE):
+        chunk = names[i:i + BATCH_SIZE]
+        frappe.db.sql(
+            f"DELETE FROM `{TABLE}` WHERE ref_doctype = %s AND ref_name IN ({', '.join(['%s'] * len(chunk))})",
+            (doctype, *chunk),
+        )
+
+
+def remove_where(doctype, where_clause, params):
+    """Drop index entries for the rows of `tab{doctype}` matching where_clause — call
+    before a bulk DELETE with the same conditions."""
+    frappe.db.sql(f"""
+        DELETE s FROM `{TABLE}` s
+        INNER JOIN `tab{doctype}` t ON t.name = s.ref_name
+         WHERE s.ref_doctype = %(search_doctype)s AND {where_clause}
+    """, dict(params, search_doctype=doctype))
+
+
+def _ready_key(doctype):
+    return f"scanify_search_ready:{doctype}"
+
+
+def is_ready(doctype):
+    return bool(frappe.cache().get_value(
+        _ready_key(doctype), generator=lambda: frappe.db.get_global(_ready_key(doctype)) or ""))
+
+
+def match_condition(doctype, letter, term, params, name_column="name"):
+    """SQL condition restricting `name_column` to documents whose field `letter`
+    contains every trigram of `term`, or None when the term is too short to index
+    (fewer than three alphanumerics) or the index is still being built — the caller
+    then keeps a plain LIKE."""
+    grams = _trigrams(term)
+    if not grams or not is_ready(doctype):
+        return None
+    key = f"search_{letter}"
+    params[key] = " ".join(f"+{letter}{g}" for g in sorted(grams))
+    params["search_doctype"] = doctype
+    return (f"{name_column} IN (SELECT ref_name FROM `{TABLE}`"
+            f" WHERE ref_doctype = %(search_doctype)s"
+            f" AND MATCH(grams) AGAINST (%({key})s IN BOOLEAN MODE))")
+
+
+def _source_fields(doctype):
+    return sorted({"name", "division"} | {f for fields in INDEXED[doctype].values() for f in fields})
+
+
+def on_update(doc, method=None):
+    if doc.doctype in INDEXED:
+        index_rows(doc.doctype, [{f: doc.get(f) for f in _source_fields(doc.doctype)}])
+
+
+def on_trash(doc, method=None):
+    if doc.doctype in INDEXED:
+        remove(doc.doctype, [doc.name])
+
+
+def rebuild(doctype=None):
+    """(Re)index every document of one or all indexed doctypes, keyset-batched."""
+    ensure_table()
+    for dt in ([doctype] if doctype else list(INDEXED)):
+        fields = ", ".join(f"`{f}`" for f in _source_fields(dt))
+        last = ""
+        while True:
+            rows = frappe.db.sql(
+                f"SELECT {fields} FROM `tab{dt}` WHERE name > %s ORDER BY name LIMIT {BATCH_SIZE}",
+                (last,), as_dict=True,
+            )
+            if not rows:
+                break
+            index_rows(dt, rows)
+            frappe.db.commit()
+            last = rows[-1].name
+        frappe.db.set_global(_ready_key(dt), "1")
+        frappe.cache().delete_value(_ready_key(dt))
+        frappe.db.commit()
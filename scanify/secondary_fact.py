@@ -0,0 +1,235 @@
+"""Monthly secondary sales fact table.
+
+The stockist, trend, ranking and organisational reports all re-aggregate Stockist
+Statement x Stockist Statement Item from raw rows on every call. This module keeps
+the aggregate in `__scanify_secondary_monthly`, one row per
+
+    division, statement_month, stockist_code, product_code, docstatus
+
+with the statement's zone / region / team / hq alongside (a statement belongs to one
+stockist and month, so they are fixed per row) and the measures the reports sum:
+
+    sales_qty, free_qty, scheme_free_qty      raw line quantities
+    sales_boxes                               sales_qty / conversion factor
+    qty_before / value_before                 (sales + free) boxes, x PTS
+    qty_after  / value_after                  (sales + free - scheme free) boxes, x PTS
+    sales_value_pts, sales_value_ptr          line values as stored
+    closing_boxes, closing_value              closing stock
+
+Only live statements (docstatus 0 and 1, as the reports read) are aggregated.
+
+Maintenance is per (stockist, month): refresh_pairs() deletes the pair's fact rows
+and re-inserts them from the statements in one INSERT ... SELECT. Statement save,
+submit, cancel, amend and delete, and Scheme Deduction submit / cancel, refresh their
+pair through doc events; statement_bulk, which writes without them, calls
+refresh_pairs directly (statement_chain only moves openings, which are not kept).
+rebuild() recomputes everything month by month and marks the table ready — until
+then is_ready() is False and reports keep the raw join.
+check_drift() compares the table against the raw join and can repair what differs;
+it runs daily over the last three months.
+
+    bench --site <site> execute scanify.secondary_fact.rebuild
+    bench --site <site> execute scanify.secondary_fact.check_drift \
+        --kwargs "{'from_month': '2026-04-01', 'repair': 1}"
+"""
+
+import frappe
+from frappe.utils import add_months, flt, getdate, nowdate
+
+from scanify.statement_chain import month_start
+from scanify.utils import chunked
+
+TABLE = "__scanify_secondary_monthly"
+_READY_KEY = "scanify_secondary_fact_ready"
+# Value differences below this are Float round-trip noise, not drift.
+_TOLERANCE = 0.01
+
+_CONV = "IFNULL(NULLIF(si.conversion_factor, 0), 1)"
+_BEFORE = "(IFNULL(si.sales_qty, 0) + IFNULL(si.free_qty, 0))"
+_AFTER = "(IFNULL(si.sales_qty, 0) + IFNULL(si.free_qty, 0) - IFNULL(si.free_qty_scheme, 0))"
+
+MEASURES = (
+    ("sales_qty", "SUM(IFNULL(si.sales_qty, 0))"),
+    ("free_qty", "SUM(IFNULL(si.free_qty, 0))"),
+    ("scheme_free_qty", "SUM(IFNULL(si.free_qty_scheme, 0))"),
+    ("sales_boxes", f"SUM(IFNULL(si.sales_qty, 0) / {_CONV})"),
+    ("qty_before", f"SUM({_BEFORE} / {_CONV})"),
+    ("qty_after", f"SUM({_AFTER} / {_CONV})"),
+    ("value_before", f"SUM({_BEFORE} / {_CONV} * IFNULL(si.pts, 0))"),
+    ("value_after", f"SUM({_AFTER} / {_CONV} * IFNULL(si.pts, 0))"),
+    ("sales_value_pts", "SUM(IFNULL(si.sales_value_pts, 0))"),
+    ("sales_value_ptr", "SUM(IFNULL(si.sales_value_ptr, 0))"),
+    ("closing_boxes", f"SUM(IFNULL(si.closing_qty, 0) / {_CONV})"),
+    ("closing_value", "SUM(IFNULL(si.closing_value, 0))"),
+)
+
+
+def ensure_table():
+    measures = ",\n".join(f"            {m} DECIMAL(21, 6) NOT NULL DEFAULT 0" for m, _e in MEASURES)
+    frappe.db.sql_ddl(f"""
+        CREATE TABLE IF NOT EXISTS `{TABLE}` (
+            division VARCHAR(140) NOT NULL,
+            statement_month DATE NOT NULL,
+            stockist_code VARCHAR(140) NOT NULL,
+            product_code VARCHAR(140) NOT NULL,
+            docstatus TINYINT NOT NULL,
+            zone VARCHAR(140) NOT NULL DEFAULT '',
+            region VARCHAR(140) NOT NULL DEFAULT '',
+            team VARCHAR(140) NOT NULL DEFAULT '',
+            hq VARCHAR(140) NOT NULL DEFAULT '',
+{measures},
+            PRIMARY KEY (division, statement_month, stockist_code, product_code, docstatus),
+            KEY stockist_month (stockist_code, statement_month),
+            KEY division_hq_month (division, hq, statement_month),
+            KEY division_region_month (division, region, statement_month)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+
+
+def _insert_select(where_clause):
+    """INSERT ... SELECT of the aggregate for the statements matching where_clause
+    (over `ss`)."""
+    measure_cols = ", ".join(m for m, _e in MEASURES)
+    measure_sql = ",\n               ".join(f"{e} AS {m}" for m, e in MEASURES)
+    return f"""
+        INSERT INTO `{TABLE}` (division, statement_month, stockist_code, product_code, docstatus,
+                               zone, region, team, hq, {measure_cols})
+        SELECT ss.division, ss.statement_month, ss.stockist_code, IFNULL(si.product_code, ''),
+               ss.docstatus,
+               MAX(IFNULL(ss.zone, '')), MAX(IFNULL(ss.region, '')),
+               MAX(IFNULL(ss.team, '')), MAX(IFNULL(ss.hq, '')),
+               {measure_sql}
+          FROM `tabStockist Statement` ss
+    INNER JOIN `tabStockist Statement Item` si
+            ON si.parent = ss.name AND si.parenttype = 'Stockist Statement'
+         WHERE ss.docstatus < 2 AND ss.division IS NOT NULL AND {where_clause}
+      GROUP BY ss.division, ss.statement_month, ss.stockist_code,
+               IFNULL(si.product_code, ''), ss.docstatus
+    """
+
+
+def _pair_condition(chunk, alias):
+    cond = " OR ".join([f"({alias}stockist_code = %s AND {alias}statement_month = %s)"] * len(chunk))
+    return f"({cond})", tuple(v for s, m in chunk for v in (s, str(m)))
+
+
+def refresh_pairs(pairs):
+    """Recompute the fact rows of the given (stockist, month) pairs."""
+    pairs = sorted({(s, getdate(m)) for s, m in pairs if s and m})
+    for chunk in chunked(pairs):
+        cond, params = _pair_condition(chunk, "")
+        frappe.db.sql(f"DELETE FROM `{TABLE}` WHERE {cond}", params)
+        cond, params = _pair_condition(chunk, "ss.")
+        frappe.db.sql(_insert_select(cond), params)
+
+
+def refresh_statements(names):
+    """refresh_pairs for the (stockist, month) of the given statements."""
+    pairs = set()
+    for chunk in chunked(names):
+        pairs |= {(r[0], r[1]) for r in frappe.db.sql(f"""
+            SELECT stockist_code, statement_month FROM `tabStockist Statement`
+             WHERE name IN ({', '.join(['%s'] * len(chunk))})
+        """, tuple(chunk))}
+    refresh_pairs(pairs)
+
+
+def on_statement_change(doc, method=None):
+    """Doc event for Stockist Statement: refresh the statement's pair, and its old pair
+    when the stockist or month was edited."""
+    pairs = {(doc.stockist_code, doc.statement_month)}
+    before = doc.get_doc_before_save() if hasattr(doc, "get_doc_before_save") else None
+    if before:
+        pairs.add((before.stockist_code, before.statement_month))
+    refresh_pairs(pairs)
+
+
+def on_deduction_change(doc, method=None):
+    """Doc event for Scheme Deduction: the deducted statement's figures moved."""
+    if doc.stockist_statement:
+        refresh_statements([doc.stockist_statement])
+
+
+def rebuild(from_month=None):
+    """Recompute the table (from `from_month` on, or entirely), one month per
+    transaction, then mark it ready."""
+    ensure_table()
+    conditions, params = ["docstatus < 2"], []
+    if from_month:
+        conditions.append("statement_month >= %s")
+        params.append(month_start(from_month))
+    months = [r[0] for r in frappe.db.sql(f"""
+        SELECT DISTINCT statement_month FROM `tabStockist Statement`
+         WHERE {' AND '.join(conditions)} ORDER BY statement_month
+    """, tuple(params))]
+    if from_month:
+        frappe.db.sql(f"DELETE FROM `{TABLE}` WHERE statement_month >= %s", (month_start(from_month),))
+    else:
+        frappe.db.sql_ddl(f"TRUNCATE TABLE `{TABLE}`")
+    for month in months:
+        frappe.db.sql(_insert_select("ss.statement_month = %s"), (month,))
+        frappe.db.commit()
+    frappe.db.set_global(_READY_KEY, "1")
+    frappe.cache().delete_value(_READY_KEY)
+    frappe.db.commit()
+    return {"months": len(months)}
+
+
+def is_ready():
+    return bool(frappe.cache().get_value(
+        _READY_KEY, generator=lambda: frappe.db.get_global(_READY_KEY) or ""))
+
+
+_DRIFT_MEASURES = ("qty_before", "qty_after", "value_after", "closing_value")
+
+
+def check_drift(from_month=None, to_month=None, repair=False):
+    """Compare per-(stockist, month) totals of the table with the raw join.
+
+    Returns {"checked": pairs compared, "drifted": [{stockist_code, statement_month,
+    measure, fact, raw}]}; with `repair` the drifted pairs are refreshed."""
+    from_month = month_start(from_month or add_months(nowdate(), -2))
+    to_month = month_start(to_month or nowdate())
+    sums = ", ".join(f"SUM({m}) AS {m}" for m in _DRIFT_MEASURES)
+
+    fact = {(r.stockist_code, str(r.statement_month)): r for r in frappe.db.sql(f"""
+        SELECT stockist_code, statement_month, {sums} FROM `{TABLE}`
+         WHERE statement_month BETWEEN %s AND %s
+      GROUP BY stockist_code, statement_month
+    """, (from_month, to_month), as_dict=True)}
+    raw_sums = ", ".join(f"{e} AS {m}" for m, e in MEASURES if m in _DRIFT_MEASURES)
+    raw = {(r.stockist_code, str(r.statement_month)): r for r in frappe.db.sql(f"""
+        SELECT ss.stockist_code, ss.statement_month, {raw_sums}
+          FROM `tabStockist Statement` ss
+    INNER JOIN `tabStockist Statement Item` si
+            ON si.parent = ss.name AND si.parenttype = 'Stockist Statement'
+         WHERE ss.docstatus < 2 AND ss.division IS NOT NULL
+           AND ss.statement_month BETWEEN %s AND %s
+      GROUP BY ss.stockist_code, ss.statement_month
+    """, (from_month, to_month), as_dict=True)}
+
+    drifted = []
+    for key in sorted(set(fact) | set(raw)):
+        f, r = fact.get(key) or {}, raw.get(key) or {}
+        for m in _DRIFT_MEASURES:
+            if abs(flt(f.get(m)) - flt(r.get(m))) > _TOLERANCE:
+                drifted.append({"stockist_code": key[0], "statement_month": key[1],
+                                "measure": m, "fact": flt(f.get(m)), "raw": flt(r.get(m))})
+                break
+    if repair and drifted:
+        refresh_pairs((d["stockist_code"], getdate(d["statement_month"])) for d in drifted)
+        frappe.db.commit()
+    return {"checked": len(set(fact) | set(raw)), "drifted": drifted}
+
+
+def scheduled_drift_check():
+    """Daily: repair drift in the last three months and log what was found."""
+    if not is_ready():
+        return
+    result = check_drift(repair=True)
+    if result["drifted"]:
+        frappe.log_error(
+            "\n".join(f"{d['stockist_code']} {d['statement_month']} {d['measure']}: "
+                      f"fact {d['fact']:g} vs raw {d['raw']:g}" for d in result["drifted"][:200]),
+            "Secondary Fact Drift Repaired",
+        )
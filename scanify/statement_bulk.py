@@ -0,0 +1,237 @@
+"""Bulk creation path for Stockist Statements.
+
+doc.insert() runs the whole document lifecycle per statement: link validation with a
+query per Link field, a Product Master read per item in validate, the previous-month
+lookup in before_insert and one INSERT per row. For a month's secondary backfill that
+is tens of thousands of round trips inside one job.
+
+This module builds the same documents in memory with the controller's own methods,
+fed from caches loaded once per batch, and writes them with multi-row INSERTs:
+
+  * load_master_cache      — every Stockist / HQ / Region / Product row the batch
+                             needs, in one query per doctype.
+  * build_statement        — a new Stockist Statement with fetch_from fields, names,
+                             previous-month closings and per-line values set exactly
+                             as insert() + validate would set them.
+  * bulk_insert_statements — parents and items with multi-row INSERTs. Parents skip
+                             rows hitting the unique key (ON DUPLICATE KEY UPDATE), so
+                             a stockist whose month is already taken (statement_unique)
+                             is detected, not raised; any other bad row still raises.
+  * update_statement_totals — the document totals, recomputed set-based in SQL from
+                             the stored items (the twin of the totals block in
+                             StockistStatement.calculate_closing_and_totals).
+"""
+
+import frappe
+from frappe.utils import getdate
+
+from scanify import kpi_snapshot, report_cache, search_index, secondary_fact, statement_unique
+from scanify.statement_chain import load_previous_closings, month_start
+from scanify.utils import chunked
+
+STATEMENT = "Stockist Statement"
+STATEMENT_ITEM = "Stockist Statement Item"
+
+# Link field -> master doctype for the fetch_from fields on statements and items.
+_FETCH_SOURCES = {
+    "stockist_code": "Stockist Master",
+    "product_code": "Product Master",
+}
+
+
+def _fetch_fields(doctype, link_field):
+    """[(fieldname, source field, fetch_if_empty)] pulled from `link_field` via fetch_from."""
+    out = []
+    for df in frappe.get_meta(doctype).fields:
+        if df.fetch_from and df.fetch_from.split(".", 1)[0] == link_field:
+            out.append((df.fieldname, df.fetch_from.split(".", 1)[1], df.fetch_if_empty))
+    return out
+
+
+def load_master_cache(stockists, products):
+    """{(doctype, name): row} for the stockists and products a batch touches, plus the
+    HQ / Region rows the division fallback reads. Plugged into doc.flags.master_cache."""
+    cache = {}
+    stockist_fields = {"name", "division", "region", "hq"}
+    stockist_fields |= {src for _f, src, _e in _fetch_fields(STATEMENT, "stockist_code")}
+    product_fields = {"name", "pts", "ptr", "pack"}
+    product_fields |= {src for _f, src, _e in _fetch_fields(STATEMENT_ITEM, "product_code")}
+
+    def _load(doctype, names, fields):
+        for chunk in chunked(sorted({n for n in names if n})):
+            for r in frappe.get_all(doctype, filters={"name": ["in", chunk]},
+                                    fields=sorted(fields), limit_page_length=0):
+                cache[(doctype, r.name)] = r
+
+    _load("Stockist Master", stockists, stockist_fields)
+    _load("Product Master", products, product_fields)
+    _load("HQ Master", [r.hq for (dt, _n), r in cache.items() if dt == "Stockist Master"],
+          {"name", "division"})
+    _load("Region Master", [r.region for (dt, _n), r in cache.items() if dt == "Stockist Master"],
+          {"name", "division"})
+    return cache
+
+
+def _apply_fetch_from(d, link_field, master_doctype, cache):
+    row = cache.get((master_doctype, d.get(link_field)))
+    if not row:
+        return
+    for fieldname, src, fetch_if_empty in _fetch_fields(d.doctype, link_field):
+        if fetch_if_empty and d.get(fieldname):
+            continue
+        d.set(fieldname, row.get(src))
+
+
+def build_statement(values, items, master_cache, prev_closing_map=None):
+    """A new, fully computed (but unsaved) Stockist Statement.
+
+    Mirrors insert(): fetch_from values, before_insert (previous-month closing),
+    autoname + child names, validate (division, line values, QC status) and the
+    owner/creation stamps. Only the document totals are left to
+    update_statement_totals, which sums the stored rows set-based after the insert."""
+    doc = frappe.new_doc(STATEMENT)
+    doc.update(values)
+    for it in items:
+        doc.append("items", it)
+    doc.flags.master_cache = master_cache
+    doc.flags.prev_closing_map = prev_closing_map
+
+    _apply_fetch_from(doc, "stockist_code", _FETCH_SOURCES["stockist_code"], master_cache)
+    for item in doc.items:
+        _apply_fetch_from(item, "product_code", _FETCH_SOURCES["product_code"], master_cache)
+
+    doc.populate_previous_month_closing()
+    doc.set_new_name()
+    doc.set_parent_in_children()
+    doc.set_division_from_stockist()
+    doc.calculate_item_values()
+    doc.calculate_qc_confidence()
+    doc.set_user_and_timestamp()
+    return doc
+
+
+def _bulk_insert(doctype, rows):
+    if rows:
+        fields = list(rows[0].keys())
+        frappe.db.bulk_insert(doctype, fields, [[r.get(f) for f in fields] for r in rows])
+
+
+def _insert_skipping_duplicates(doctype, rows):
+    """Multi-row INSERT that skips rows colliding with a unique key. Unlike INSERT
+    IGNORE, every other error (truncation, bad date, NOT NULL) still raises."""
+    if not rows:
+        return
+    fields = list(rows[0].keys())
+    columns = ", ".join(f"`{f}`" for f in fields)
+    row_sql = "(" + ", ".join(["%s"] * len(fields)) + ")"
+    for chunk in chunked(rows):
+        frappe.db.sql(f"""
+            INSERT INTO `tab{doctype}` ({columns})
+            VALUES {", ".join([row_sql] * len(chunk))}
+            ON DUPLICATE KEY UPDATE `name` = `name`
+        """, tuple(r.get(f) for r in chunk for f in fields))
+
+
+def bulk_insert_statements(docs):
+    """Write built statements and their items with multi-row INSERTs.
+
+    Returns (inserted docs, {stockist_code: existing statement name}) — the second
+    holds stockists that already had a live statement for the month. With the unique
+    key enforced the parents are written with INSERT ... ON DUPLICATE KEY UPDATE (a
+    no-op) and the rows that did not land are the duplicates; without it the month is
+    looked up first."""
+    if not docs:
+        return [], {}
+    month_of = {d.name: str(getdate(d.statement_month)) for d in docs}
+
+    if statement_unique.is_enforced():
+        _insert_skipping_duplicates(
+            STATEMENT, [d.get_valid_dict(convert_dates_to_str=True) for d in docs])
+        landed = set()
+        for chunk in chunked([d.name for d in docs]):
+            for r in frappe.db.sql(f"""
+                SELECT name, stockist_code, statement_month FROM `tabStockist Statement`
+                 WHERE name IN ({', '.join(['%s'] * len(chunk))})
+            """, tuple(chunk), as_dict=True):
+                landed.add((r.name, r.stockist_code, str(r.statement_month)))
+        inserted = [d for d in docs if (d.name, d.stockist_code, month_of[d.name]) in landed]
+    else:
+        taken = statement_unique.find_live({(d.stockist_code, month_of[d.name]) for d in docs})
+        inserted = [d for d in docs if (d.stockist_code, month_of[d.name]) not in taken]
+        _bulk_insert(STATEMENT, [d.get_valid_dict(convert_dates_to_str=True) for d in inserted])
+
+    skipped = [d for d in docs if d not in inserted]
+    existing = statement_unique.find_live({(d.stockist_code, month_of[d.name]) for d in skipped})
+    duplicates = {d.stockist_code: existing.get((d.stockist_code, month_of[d.name]), "?")
+                  for d in skipped}
+
+    _bulk_insert(STATEMENT_ITEM, [i.get_valid_dict(convert_dates_to_str=True)
+                                  for d in inserted for i in d.items])
+    search_index.index_rows(STATEMENT, inserted)
+    return inserted, duplicates
+
+
+def update_statement_totals(names):
+    """Recompute every document total of the given statements from their stored items
+    in one UPDATE per batch. Same rules as calculate_closing_and_totals: value totals
+    over lines whose product exists in Product Master, operational qty over 'others' /
+    'branch_transfer' lines. (The controller's total_sales_qty is not a stored field.)"""
+    for chunk in chunked(names):
+        frappe.db.sql(f"""
+            UPDATE `tabStockist Statement` ss
+            INNER JOIN (
+                SELECT si.parent,
+                       SUM(IF(TRIM(IFNULL(si.row_type, '')) IN ('others', 'branch_transfer'),
+                              IF(IFNULL(si.operational_sales_qty, 0) != 0,
+                                 si.operational_sales_qty, IFNULL(si.sales_qty, 0)),
+                              0))                                                  AS operational_qty,
+                       SUM(IF(pm.name IS NULL, 0, IFNULL(si.sales_value_pts, 0))) AS sales_value_pts,
+                       SUM(IF(pm.name IS NULL, 0, IFNULL(si.sales_value_ptr, 0))) AS sales_value_ptr,
+                       SUM(IF(pm.name IS NULL, 0, IFNULL(si.opening_value, 0)))   AS opening_value,
+                       SUM(IF(pm.name IS NULL, 0, IFNULL(si.purchase_value, 0)))  AS purchase_value,
+                       SUM(IF(pm.name IS NULL, 0, IFNULL(si.closing_value, 0)))   AS closing_value
+                  FROM `tabStockist Statement Item` si
+             LEFT JOIN `tabProduct Master` pm ON pm.name = si.product_code
+                 WHERE si.parenttype = 'Stockist Statement'
+                   AND si.parent IN ({', '.join(['%s'] * len(chunk))})
+              GROUP BY si.parent
+            ) t ON t.parent = ss.name
+               SET ss.total_operational_sales_qty = t.operational_qty,
+                   ss.total_sales_value_pts = t.sales_value_pts,
+                   ss.total_sales_value_ptr = t.sales_value_ptr,
+                   ss.total_opening_value = t.opening_value,
+                   ss.total_purchase_value = t.purchase_value,
+                   ss.total_closing_value = t.closing_value
+        """, tuple(chunk))
+
+
+def create_statements(specs, statement_month):
+    """Build, insert and total a batch of statements. `specs` is a list of
+    (values dict, item dicts) pairs — values must include stockist_code.
+    Returns (created, errors, duplicates): created is [(stockist_code, statement name)],
+    errors is [(stockist_code, message)] for statements that could not be built and
+    duplicates is {stockist_code: existing statement name} for stockists whose month
+    already had a live statement."""
+    stockists = [v["stockist_code"] for v, _items in specs]
+    products = [it.get("product_code") for _v, items in specs for it in items]
+    cache = load_master_cache(stockists, products)
+
+    prev_closings = load_previous_closings([(s, statement_month) for s in stockists])
+
+    docs, errors = [], []
+    for values, items in specs:
+        try:
+            values = dict(values, statement_month=statement_month)
+            docs.append(build_statement(
+                values, items, cache,
+                prev_closings.get((values["stockist_code"], month_start(statement_month)), {})))
+        except Exception as e:
+            errors.append((values.get("stockist_code"), str(e)))
+
+    inserted, duplicates = bulk_insert_statements(docs)
+    update_statement_totals([d.name for d in inserted])
+    secondary_fact.refresh_pairs((d.stockist_code, d.statement_month) for d in inserted)
+    if inserted:
+        report_cache.bump()
+        kpi_snapshot.refresh(STATEMENT, {d.division for d in inserted if d.division})
+    return [(d.stockist_code, d.name) for d in inserted], errors, duplicates
@@ -0,0 +1,350 @@
+"""Opening-balance carry-forward across a stockist's month chain.
+
+Every Stockist Statement item carries two "from last month" figures:
+
+  * prev_month_closing — the previous month's SUBMITTED closing qty for the product
+    (set on insert by StockistStatement.populate_previous_month_closing).
+  * opening_qty        — the statement's own opening. On a DRAFT it is overwritten with
+    the previous month's closing when that month is submitted
+    (update_next_month_opening). Submitted statements are never re-opened.
+
+When an old month is corrected, every later month's figures drift. This module
+recomputes "opening = previous closing" for a set of stockists from a starting month
+forward in one pass: all statements + items in the window are read with two queries,
+the new values are worked out in memory, and the changed rows are written back with
+batched CASE updates — never one document load/save per statement.
+
+load_previous_closings is the same read path for statements being created: the
+secondary upload and bulk OCR jobs resolve every new statement's previous-month
+closings in one batch instead of two queries per stockist.
+
+Run it from the portal (start_opening_chain_repair in scanify.api) or directly:
+
+    bench --site <site> execute scanify.statement_chain.propagate_opening_chain \
+        --kwargs "{'stockists': ['S0001'], 'from_month': '2026-04-01', 'dry_run': 1}"
+"""
+
+import frappe
+from frappe.utils import add_months, flt, get_first_day, getdate, now
+
+from scanify import report_cache
+from scanify.utils import chunked
+
+# Item rows whose statement is still a draft (the only ones the chain writes).
+_DRAFT_PARENT = """parent IN (SELECT name FROM `tabStockist Statement` WHERE docstatus = 0)"""
+
+# Quantities closer than this are treated as equal (Float columns round-trip noise).
+_EPSILON = 0.0005
+
+
+def month_start(value):
+    """Normalise a date / 'YYYY-MM' / 'YYYY-MM-DD' to the first of its month."""
+    value = str(value)
+    if len(value) == 7:
+        value += "-01"
+    return getdate(get_first_day(value))
+
+
+def load_statements(stockists, from_month, to_month=None, docstatus=(0, 1)):
+    """Statements for `stockists` dated on/after `from_month` (and on/before
+    `to_month` when given), oldest first."""
+    rows = []
+    upper = "AND statement_month <= %s" if to_month else ""
+    for chunk in chunked(stockists):
+        params = (*chunk, from_month, *([to_month] if to_month else []), *docstatus)
+        rows += frappe.db.sql(f"""
+            SELECT name, stockist_code, statement_month, docstatus
+              FROM `tabStockist Statement`
+             WHERE stockist_code IN ({', '.join(['%s'] * len(chunk))})
+               AND statement_month >= %s
+               {upper}
+               AND docstatus IN ({', '.join(['%s'] * len(docstatus))})
+          ORDER BY statement_month, creation
+        """, params, as_dict=True)
+    return rows
+
+
+def load_items(statement_names, fields=("name", "parent", "product_code", "closing_qty")):
+    """{statement name: [item rows in idx order]} for the given statements."""
+    by_parent = {}
+    cols = ", ".join(f"`{f}`" for f in fields)
+    for chunk in chunked(statement_names):
+        for r in frappe.db.sql(f"""
+            SELECT {cols}
+              FROM `tabStockist Statement Item`
+             WHERE parenttype = 'Stockist Statement'
+               AND parent IN ({', '.join(['%s'] * len(chunk))})
+          ORDER BY parent, idx
+        """, tuple(chunk), as_dict=True):
+            by_parent.setdefault(r.parent, []).append(r)
+    return by_parent
+
+
+def closing_map(items):
+    """{product_code: closing_qty} for one statement's items. A product listed twice
+    keeps its LAST row, matching populate_previous_month_closing."""
+    return {it.product_code: flt(it.closing_qty, 0) for it in items if it.product_code}
+
+
+def load_previous_statement_items(pairs, fields=("name", "parent", "product_code", "closing_qty")):
+    """Batch form of "find last month's submitted statement and read its items".
+
+    `pairs` is an iterable of (stockist_code, statement_month) for the statements being
+    built. Returns {(stockist_code, month_start(statement_month)): [item rows]} — the
+    previous month's SUBMITTED statement items, or [] when there is none. Two queries
+    per batch of pairs (utils.BATCH_SIZE), however many stockists are involved."""
+    wanted = {}
+    for stockist, month in pairs:
+        if stockist and month:
+            key = (stockist, month_start(month))
+            wanted[(stockist, getdate(get_first_day(add_months(key[1], -1))))] = key
+
+    result = {key: [] for key in wanted.values()}
+    prev_names = {}
+    for chunk in chunked(sorted(wanted)):
+        stockists = sorted({s for s, _m in chunk})
+        months = sorted({m for _s, m in chunk})
+        # Oldest-modified first so the latest submitted statement wins on duplicates.
+        for st in frappe.db.sql(f"""
+            SELECT name, stockist_code, statement_month
+              FROM `tabStockist Statement`
+             WHERE docstatus = 1
+               AND stockist_code IN ({', '.join(['%s'] * len(stockists))})
+               AND statement_month IN ({', '.join(['%s'] * len(months))})
+          ORDER BY modified
+        """, (*stockists, *months), as_dict=True):
+            key = wanted.get((st.stockist_code, getdate(st.statement_month)))
+            if key:
+                prev_names[key] = st.name
+
+    items_by_parent = load_items(list(prev_names.values()), fields=fields)
+    for key, name in prev_names.items():
+        result[key] = items_by_parent.get(name, [])
+    return result
+
+
+def load_previous_closings(pairs):
+    """{(stockist_code, month_start(statement_month)): {product_code: closing_qty}} for
+    every requested pair — the previous month's submitted closings, {} when missing.
+    Feed the per-pair map to StockistStatement.populate_previous_month_closing."""
+    return {key: closing_map(items)
+            for key, items in load_previous_statement_items(pairs).items()}
+
+
+def compute_chain_changes(stockists, from_month, to_month=None):
+    """Work out every item whose opening / previous-closing must change.
+
+    Statements dated AFTER `from_month` are targets; `from_month` itself is only a
+    source. The previous month's closing comes from its SUBMITTED statement (same
+    rule as populate_previous_month_closing):
+      * prev_month_closing ← that closing (0 when the product/statement is missing).
+      * opening_qty        ← that closing, only for products the previous statement
+        lists — the rule update_next_month_opening applies.
+    Both are written on DRAFTS only: submitted statements are never touched (neither
+    field is allow_on_submit).
+
+    Returns (changes, stats). Each change is a dict with item, statement, stockist,
+    month, product, field, old, new (+ conversion_factor/pts for openings)."""
+    from_month = month_start(from_month)
+    stockists = sorted({s for s in stockists if s})
+    statements = load_statements(stockists, from_month, month_start(to_month) if to_month else None)
+    items_by_parent = load_items(
+        [s.name for s in statements],
+        fields=("name", "parent", "product_code", "closing_qty", "opening_qty",
+                "prev_month_closing", "conversion_factor", "pts"),
+    )
+
+    closings = {}
+    for st in statements:
+        if st.docstatus == 1:
+            closings[(st.stockist_code, getdate(st.statement_month))] = closing_map(
+                items_by_parent.get(st.name, []))
+
+    changes = []
+    for st in statements:
+        month = getdate(st.statement_month)
+        if month <= from_month or st.docstatus != 0:
+            continue
+        prev = closings.get((st.stockist_code, getdate(get_first_day(add_months(month, -1)))))
+        for it in items_by_parent.get(st.name, []):
+            if not it.product_code:
+                continue
+            base = {"item": it.name, "statement": st.name, "stockist": st.stockist_code,
+                    "month": month, "product": it.product_code}
+
+            new_prev = flt((prev or {}).get(it.product_code, 0))
+            if abs(flt(it.prev_month_closing) - new_prev) > _EPSILON:
+                changes.append(dict(base, field="prev_month_closing",
+                                    old=flt(it.prev_month_closing), new=new_prev))
+
+            if prev and it.product_code in prev:
+                new_open = flt(prev[it.product_code])
+                if abs(flt(it.opening_qty) - new_open) > _EPSILON:
+                    changes.append(dict(base, field="opening_qty",
+                                        old=flt(it.opening_qty), new=new_open,
+                                        conversion_factor=flt(it.conversion_factor) or 1,
+                                        pts=flt(it.pts)))
+
+    stats = {
+        "stockists_scanned": len(stockists),
+        "statements_scanned": len(statements),
+    }
+    return changes, stats
+
+
+def apply_chain_changes(changes):
+    """Write computed changes back with batched CASE updates, then re-sum the
+    opening totals of the drafts whose openings moved. Values follow the controller:
+    opening_value = opening_qty / conversion_factor x pts. Only rows of draft
+    statements are written, whatever the change list holds."""
+    prev_rows = [c for c in changes if c["field"] == "prev_month_closing"]
+    open_rows = [c for c in changes if c["field"] == "opening_qty"]
+
+    for chunk in chunked(prev_rows):
+        case = " ".join(["WHEN %s THEN %s"] * len(chunk))
+        params = [v for c in chunk for v in (c["item"], c["new"])]
+        params += [c["item"] for c in chunk]
+        frappe.db.sql(f"""
+            UPDATE `tabStockist Statement Item`
+               SET prev_month_closing = CASE name {case} END
+             WHERE name IN ({', '.join(['%s'] * len(chunk))}) AND {_DRAFT_PARENT}
+        """, tuple(params))
+
+    for chunk in chunked(open_rows):
+        qty_case = " ".join(["WHEN %s THEN %s"] * len(chunk))
+        val_case = " ".join(["WHEN %s THEN %s"] * len(chunk))
+        params = [v for c in chunk for v in (c["item"], c["new"])]
+        params += [v for c in chunk
+                   for v in (c["item"], c["new"] / (c["conversion_factor"] or 1) * c["pts"])]
+        params += [c["item"] for c in chunk]
+        frappe.db.sql(f"""
+            UPDATE `tabStockist Statement Item`
+               SET opening_qty = CASE name {qty_case} END,
+                   opening_value = CASE name {val_case} END
+             WHERE name IN ({', '.join(['%s'] * len(chunk))}) AND {_DRAFT_PARENT}
+        """, tuple(params))
+
+    # Re-sum opening totals on the drafts that changed, and bump `modified` on every
+    # touched draft so a form left open in another tab can't save stale values.
+    touched = sorted({c["statement"] for c in changes})
+    reopened = sorted({c["statement"] for c in open_rows})
+    ts = now()
+    for chunk in chunked(reopened):
+        frappe.db.sql(f"""
+            UPDATE `tabStockist Statement` ss
+               SET ss.total_opening_value = (
+                    SELECT IFNULL(SUM(si.opening_value), 0)
+                      FROM `tabStockist Statement Item` si
+                     WHERE si.parent = ss.name
+                       AND si.parenttype = 'Stockist Statement'
+                       AND IFNULL(si.product_code, '') != '')
+             WHERE ss.name IN ({', '.join(['%s'] * len(chunk))}) AND ss.docstatus = 0
+        """, tuple(chunk))
+    for chunk in chunked(touched):
+        frappe.db.sql(f"""
+            UPDATE `tabStockist Statement` SET modified = %s
+             WHERE name IN ({', '.join(['%s'] * len(chunk))}) AND docstatus = 0
+        """, (ts, *chunk))
+    if touched:
+        report_cache.bump()
+    return {"statements_updated": len(touched), "items_updated": len({c["item"] for c in changes})}
+
+
+def format_change_report(changes, limit=None):
+    """Human-readable change report, one line per changed value."""
+    lines = []
+    for c in changes[:limit] if limit else changes:
+        lines.append(
+            f"{c['statement']} | {c['product']} | {c['field']}: "
+            f"{c['old']:g} → {c['new']:g}"
+        )
+    return "\n".join(lines)
+
+
+def propagate_opening_chain(stockists, from_month, dry_run=False):
+    """Recompute opening = previous closing for `stockists` from `from_month` forward.
+    Returns the counts plus the change list; commits unless `dry_run`."""
+    changes, stats = compute_chain_changes(stockists, from_month)
+    result = dict(stats, statements_updated=0, items_updated=0, changes=changes)
+    if dry_run or not changes:
+        result["statements_updated"] = len({c["statement"] for c in changes})
+        result["items_updated"] = len({c["item"] for c in changes})
+        return result
+    result.update(apply_chain_changes(changes))
+    frappe.db.commit()
+    return result
+
+
+def carry_forward_to_next_month(doc):
+    """Single-step carry-forward for one freshly submitted statement: copy its
+    closings into next month's DRAFT openings. The set-based replacement for the old
+    per-item nested loop in update_next_month_opening."""
+    if not doc.stockist_code or not doc.statement_month:
+        return None
+    month = month_start(doc.statement_month)
+    next_month = getdate(get_first_day(add_months(month, 1)))
+    changes, _stats = compute_chain_changes([doc.stockist_code], month, to_month=next_month)
+    if not changes:
+        return None
+    apply_chain_changes(changes)
+    return sorted({c["statement"] for c in changes})
+
+
+def _division_stockists(division):
+    return frappe.get_all(
+        "Stockist Master",
+        filters={"division": ["in", [division, "Both"]]},
+        pluck="name",
+        limit_page_length=0,
+    )
+
+
+def run_opening_chain_repair(docname):
+    """Background job body for an Opening Chain Repair record."""
+    doc = frappe.get_doc("Opening Chain Repair", docname)
+    try:
+        doc.status = "In Progress"
+        doc.progress = 0
+        doc.save(ignore_permissions=True)
+        frappe.db.commit()
+
+        stockists = [s.strip() for s in (doc.stockist_codes or "").splitlines() if s.strip()]
+        if not stockists:
+            stockists = _division_stockists(doc.division)
+
+        result = propagate_opening_chain(stockists, doc.from_month, dry_run=doc.dry_run)
+        changes = result["changes"]
+
+        header = [
+            f"Opening chain repair — {doc.division}, corrected month {doc.from_month}"
+            + (" (DRY RUN — nothing written)" if doc.dry_run else ""),
+            f"Run by {doc.requested_by} at {now()}",
+            "",
+            f"Stockists scanned   : {result['stockists_scanned']}",
+            f"Statements scanned  : {result['statements_scanned']}",
+            f"Statements updated  : {result['statements_updated']}",
+            f"Item rows updated   : {result['items_updated']}",
+            f"Values changed      : {len(changes)}",
+        ]
+        if changes:
+            header += ["", "── Changes (statement | product | field: old → new) ──"]
+        report = "\n".join(header) + ("\n" + format_change_report(changes) if changes else "")
+
+        doc.reload()
+        doc.status = "Completed"
+        doc.progress = 100
+        doc.stockists_scanned = result["stockists_scanned"]
+        doc.statements_scanned = result["statements_scanned"]
+        doc.statements_updated = result["statements_updated"]
+        doc.items_updated = result["items_updated"]
+        doc.report = report[:140000]
+        doc.save(ignore_permissions=True)
+        frappe.db.commit()
+    except Exception as e:
+        frappe.db.rollback()
+        frappe.log_error(frappe.get_traceback(), "Opening Chain Repair Error")
+        doc.reload()
+        doc.status = "Failed"
+        doc.report = f"Job failed: {e!s}"
+        doc.save(ignore_permissions=True)
+        frappe.db.commit()
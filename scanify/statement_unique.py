@@ -0,0 +1,133 @@
+"""One live Stockist Statement per stockist per month, enforced by the database.
+
+Every creation path (manual entry, single and bulk OCR, secondary backfill) used to
+look the pair up before inserting, which costs a round trip per statement and still
+lets two concurrent jobs both see "no statement" and both insert. Instead the table
+carries a unique key on (stockist_code, statement_month, live_flag), where live_flag
+is a stored generated column: 1 for drafts and submitted statements, NULL once
+cancelled. NULLs never collide, so any number of cancelled statements (and the
+amendment that replaces one) can share the month with the live one.
+
+Writers insert first and treat a violation of that key as "already exists":
+
+  * insert_statement — insert() one document, returning the existing statement's
+                       name instead of raising when the month is taken.
+  * is_duplicate     — True for the key's violation, raw or wrapped by insert().
+  * find_live        — the live statements for (stockist, month) pairs.
+
+The key can only be added once existing duplicates are resolved; find_duplicates()
+reports them (the add_statement_unique_key patch prints the report). Until then
+is_enforced() is False and the writers keep their lookup before inserting.
+"""
+
+import frappe
+from frappe.utils import getdate
+
+from scanify.utils import chunked
+
+DOCTYPE = "Stockist Statement"
+KEY_NAME = "unique_stockist_month_live"
+LIVE_COLUMN = "live_flag"
+_ENFORCED_KEY = "scanify_statement_unique_key"
+
+
+def find_duplicates():
+    """[{stockist_code, statement_month, names}] for every pair with more than one
+    live (non-cancelled) statement, oldest first."""
+    rows = frappe.db.sql("""
+        SELECT stockist_code, statement_month,
+               GROUP_CONCAT(name ORDER BY creation, name SEPARATOR ',') AS names
+          FROM `tabStockist Statement`
+         WHERE docstatus < 2
+      GROUP BY stockist_code, statement_month
+        HAVING COUNT(*) > 1
+      ORDER BY statement_month, stockist_code
+    """, as_dict=True)
+    for r in rows:
+        r["names"] = r.names.split(",")
+    return rows
+
+
+def _has_column():
+    return bool(frappe.db.sql(f"SHOW COLUMNS FROM `tab{DOCTYPE}` LIKE %s", LIVE_COLUMN))
+
+
+def _has_key():
+    return bool(frappe.db.sql(f"SHOW INDEX FROM `tab{DOCTYPE}` WHERE Key_name = %s", KEY_NAME))
+
+
+def ensure_unique_key():
+    """Add live_flag and the unique key. Returns the duplicate report — when it is not
+    empty nothing is changed and the key stays unenforced."""
+    duplicates = find_duplicates()
+    if duplicates:
+        return duplicates
+    if not _has_column():
+        frappe.db.sql_ddl(f"""
+            ALTER TABLE `tab{DOCTYPE}`
+            ADD COLUMN `{LIVE_COLUMN}` TINYINT AS (IF(docstatus = 2, NULL, 1)) STORED
+        """)
+    if not _has_key():
+        frappe.db.sql_ddl(f"""
+            ALTER TABLE `tab{DOCTYPE}`
+            ADD UNIQUE INDEX `{KEY_NAME}` (`stockist_code`, `statement_month`, `{LIVE_COLUMN}`)
+        """)
+    frappe.db.set_global(_ENFORCED_KEY, "1")
+    frappe.cache().delete_value(_ENFORCED_KEY)
+    return []
+
+
+def is_enforced():
+    return bool(frappe.cache().get_value(
+        _ENFORCED_KEY, generator=lambda: frappe.db.get_global(_ENFORCED_KEY) or ""))
+
+
+def is_duplicate(exc):
+    """True when exc is (or wraps) a violation of the one-statement-per-month key: a
+    MySQL duplicate-entry error (1062) naming KEY_NAME. insert() raises its own
+    error while handling the database one, so both the cause and context chains are
+    followed."""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if exc.args and frappe.db.is_unique_key_violation(exc) and KEY_NAME in str(exc):
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+def find_live(pairs):
+    """{(stockist id, month as YYYY-MM-DD): statement name} of the live statements for
+    the given (stockist, month) pairs."""
+    found = {}
+    for chunk in chunked(list(pairs)):
+        conditions = " OR ".join(["(stockist_code = %s AND statement_month = %s)"] * len(chunk))
+        for r in frappe.db.sql(f"""
+            SELECT stockist_code, statement_month, name FROM `tabStockist Statement`
+             WHERE docstatus < 2 AND ({conditions})
+        """, tuple(v for s, m in chunk for v in (s, m)), as_dict=True):
+            found.setdefault((r.stockist_code, str(r.statement_month)), r.name)
+    return found
+
+
+def insert_statement(doc, **insert_kwargs):
+    """doc.insert(), or the name of the live statement already holding the stockist's
+    month. Returns (doc, None) when inserted and (None, existing name) otherwise."""
+    month = str(getdate(doc.statement_month))
+    if not is_enforced():
+        existing = find_live([(doc.stockist_code, month)]).get((doc.stockist_code, month))
+        if existing:
+            return None, existing
+        doc.insert(**insert_kwargs)
+        return doc, None
+
+    frappe.db.savepoint("statement_insert")
+    try:
+        doc.insert(**insert_kwargs)
+    except (frappe.UniqueValidationError, frappe.DuplicateEntryError) as e:
+        if not is_duplicate(e):
+            raise
+        frappe.db.rollback(save_point="statement_insert")
+        frappe.clear_last_message()
+        return None, find_live([(doc.stockist_code, month)]).get((doc.stockist_code, month)) or "?"
+    return doc, None
@@ -0,0 +1,42 @@
+"""Streaming reads and raw dumps for the bulk data exports.
+
+The primary and secondary sales exports used to fetch a whole month into a list of
+dicts before writing a row, so a multi-million-row month was capped by worker memory.
+iter_rows() reads through an unbuffered server-side cursor instead: rows come off the
+connection as they are consumed and go straight into a streaming writer —
+xlsx_stream for Excel, write_csv_gz() for a gzipped CSV dump.
+
+An unbuffered cursor holds the connection until its last row is read, so the consumer
+must not query the database mid-stream: resolve lookups (master_dict, scope) before
+iterating. Export progress goes to the cache for that reason (export_jobs).
+"""
+
+import csv
+import gzip
+import tempfile
+
+import frappe
+
+
+def iter_rows(query, values=None, as_dict=True):
+    """Yield the rows of `query` from an unbuffered server-side cursor."""
+    with frappe.db.unbuffered_cursor():
+        yield from frappe.db.sql(query, values, as_dict=as_dict, as_iterator=True)
+
+
+def write_csv_gz(headers, rows):
+    """Write `headers` and `rows` (value lists, consumed once) to a gzipped CSV temp
+    file and return its path."""
+    with tempfile.NamedTemporaryFile(suffix=".csv.gz", delete=False) as tmp:
+        path = tmp.name
+    with gzip.open(path, "wt", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        writer.writerows(rows)
+    return path
+
+
+def temp_path(suffix):
+    """Path of a new temp file, for a writer that saves by path."""
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        return tmp.name
@@ -1,4 +1,5 @@
 import frappe
+from scanify.api import get_user_division
 
 def get_context(context):
     if frappe.session.user == "Guest":
@@ -6,7 +7,4 @@ def get_context(context):
 
     context.no_cache = 1
 
-    user_division = frappe.db.get_value("User", frappe.session.user, "division") or "Prima"
-    if hasattr(frappe.session, "user_division") and frappe.session.user_division:
-        user_division = frappe.session.user_division
-    context.division = user_division
+    context.division = get_user_division()
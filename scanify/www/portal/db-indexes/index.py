@@ -0,0 +1,9 @@
+import frappe
+
+
+def get_context(context):
+    if frappe.session.user == "Guest":
+        frappe.throw("Please login to continue", frappe.PermissionError)
+
+    context.no_cache = 1
+    return context
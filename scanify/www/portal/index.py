@@ -1,5 +1,4 @@
 import frappe
-from frappe.utils import get_first_day, nowdate
 from scanify.api import get_user_division
 
 def get_context(context):
@@ -49,112 +48,28 @@ def get_user_role(user):
 
 def get_dashboard_stats(user, division):
     """Get dashboard statistics filtered by division and, for non-admins, by the
-    regions they are mapped to (Admin sees the whole division)."""
+    regions they are mapped to (Admin sees the whole division). Read from the
+    division's cached KPI snapshot (scanify.kpi_snapshot)."""
     stats = {}
 
     try:
-        # None for admin (= every region); a list confines every figure below.
+        # None for admin (= every region); a list confines every figure below, and an
+        # empty one (the user may see nothing) zeroes them.
+        from scanify import kpi_snapshot
         from scanify.permissions import get_allowed_region_codes
-        regions = get_allowed_region_codes(user, division)
-        # SQL fragment + params for the region restriction. An empty allowed list means
-        # the user may see nothing, so force a no-rows condition.
-        def _rgn(col):
-            if regions is None:
-                return "", []
-            if not regions:
-                return " AND 1=0", []
-            return " AND {} IN ({})".format(col, ", ".join(["%s"] * len(regions))), list(regions)
-
-        def _rgn_filter(base):
-            if regions is None:
-                return base
-            base = dict(base)
-            base["region"] = ["in", regions or ["__none__"]]
-            return base
-
-        # Pending schemes count (division + region scoped)
-        stats["pending_schemes"] = frappe.db.count(
-            "Scheme Request",
-            _rgn_filter({"approval_status": "Pending", "docstatus": 0, "division": division})
-        )
-
-        # Approved this month (division + region scoped)
-        _c, _p = _rgn("sr.region")
-        stats["approved_this_month"] = frappe.db.sql("""
-            SELECT COUNT(DISTINCT sr.name)
-            FROM `tabScheme Request` sr
-            INNER JOIN `tabScheme Approval Log` sal ON sal.parent = sr.name
-            WHERE sr.division = %s
-            AND sal.action = 'Approved'
-            AND sal.action_date >= %s
-        """ + _c, tuple([division, get_first_day(nowdate())] + _p))[0][0]
-
-        # Statements with completed OCR extraction (division + region scoped).
-        # These are AI-extracted statements — measured by extraction status, not docstatus
-        # (all extracted statements sit in draft/docstatus 0 by design).
-        stats["completed_statements"] = frappe.db.count(
-            "Stockist Statement",
-            _rgn_filter({"extracted_data_status": "Completed", "division": division})
-        )
-
-        # Active HQ Count for this division (region scoped)
-        stats["active_hqs"] = frappe.db.count(
-            "HQ Master", _rgn_filter({"division": division, "status": "Active"}))
-
-        # Chart 1 & 2 shared: build last 14 day date series
-        from frappe.utils import add_days, getdate
-        start_date = add_days(nowdate(), -13)
-
-        # Scheme requests per day (last 14 days)
-        _c, _p = _rgn("region")
-        scheme_activity = frappe.db.sql("""
-            SELECT DATE(creation) as date, COUNT(*) as count
-            FROM `tabScheme Request`
-            WHERE division = %s AND creation >= %s
-        """ + _c + """
-            GROUP BY DATE(creation)
-            ORDER BY DATE(creation) ASC
-        """, tuple([division, start_date] + _p), as_dict=1)
-        for d in scheme_activity:
-            if d.get('date'): d['date'] = str(d['date'])
-        stats["scheme_activity"] = scheme_activity
-
-        # Stock statements per day (last 14 days). Division-scoped too — without it this
-        # chart counted every division's statements.
-        _c, _p = _rgn("region")
-        statement_activity = frappe.db.sql("""
-            SELECT DATE(creation) as date, COUNT(*) as count
-            FROM `tabStockist Statement`
-            WHERE division = %s AND creation >= %s
-        """ + _c + """
-            GROUP BY DATE(creation)
-            ORDER BY DATE(creation) ASC
-        """, tuple([division, start_date] + _p), as_dict=1)
-        for d in statement_activity:
-            if d.get('date'): d['date'] = str(d['date'])
-        stats["statement_activity"] = statement_activity
-
-        # Chart 2: Top HQs by approved scheme value — last 6 months.
-        # hq stores the HQ Master PK, so resolve to the readable HQ name for labels.
-        _c, _p = _rgn("sr.region")
-        top_hqs = frappe.db.sql("""
-            SELECT COALESCE(hm.hq_name, sr.hq) as hq,
-                   COALESCE(SUM(sr.total_scheme_value), 0) as value,
-                   COUNT(*) as cnt
-            FROM `tabScheme Request` sr
-            LEFT JOIN `tabHQ Master` hm ON hm.name = sr.hq
-            WHERE sr.division = %s
-              AND sr.approval_status = 'Approved'
-              AND sr.creation >= DATE_SUB(NOW(), INTERVAL 6 MONTH)
-              AND sr.hq IS NOT NULL AND sr.hq != ''
-        """ + _c + """
-            GROUP BY sr.hq, hm.hq_name
-            ORDER BY value DESC
-            LIMIT 8
-        """, tuple([division] + _p), as_dict=1)
-        for h in top_hqs:
-            h["value"] = float(h.get("value") or 0)
-        stats["top_hqs"] = top_hqs
+        kpis = kpi_snapshot.dashboard(division, get_allowed_region_codes(user, division))
+
+        stats["pending_schemes"] = kpis["pending_schemes"]
+        stats["approved_this_month"] = kpis["approved_this_month"]
+        # Statements with completed OCR extraction: measured by extraction status, not
+        # docstatus (all extracted statements sit in draft/docstatus 0 by design).
+        stats["completed_statements"] = kpis["completed_statements"]
+        stats["active_hqs"] = kpis["active_hqs"]
+        # Scheme requests / stock statements per day (last 14 days)
+        stats["scheme_activity"] = kpis["scheme_activity"]
+        stats["statement_activity"] = kpis["statement_activity"]
+        # Top HQs by approved scheme value — last 6 months, by HQ name
+        stats["top_hqs"] = kpis["top_hqs"]
 
     except Exception as e:
         frappe.log_error(f"Error getting dashboard stats: {str(e)}")
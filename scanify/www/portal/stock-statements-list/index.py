@@ -8,18 +8,7 @@ def get_context(context):
 
     context.no_cache = 1
 
-    # Priority 1: Check session first (for current page load)
-    user_division = None
-    if hasattr(frappe.session, "user_division") and frappe.session.user_division:
-        user_division = frappe.session.user_division
-
-    # Priority 2: Check User document
-    if not user_division:
-        user_division = frappe.db.get_value("User", frappe.session.user, "division")
-
-    if not user_division:
-        user_division = "Prima"
-
+    user_division = get_user_division()
     context.division = user_division
 
     # Load filter options (zones, regions, teams, hqs) for the division
@@ -0,0 +1,244 @@
+"""Streaming Excel writer for the exports.
+
+The exports used to build a full openpyxl workbook in memory, style every cell one by
+one and then walk every column again to fit widths — a large month of primary or
+secondary sales pushed a worker into gigabytes. This engine writes through openpyxl's
+write-only worksheets instead: each row is serialised to the sheet's temp file as it
+is appended, so memory stays flat and write time is linear in rows.
+
+    book = XlsxStream()
+    sheet = book.sheet("Primary Sales", freeze="A2", pad=3, max_width=30)
+    sheet.title("Primary Sales - Prima")        # title / subtitle / note rows
+    sheet.header(["Code", "Name", "Qty"])        # sets the sheet's column count
+    sheet.rows(rows, template=["code", "name", "qty"])
+    sheet.totals("Total", {3: total_qty})        # group-styled row, label in column A
+    content = book.save()                        # bytes; save(path) writes a file
+
+Cells take one of the named style presets in PRESETS (registered once per workbook).
+A row template is a list of keys read from dict rows, or a callable returning the
+row's values.
+
+Write-only sheets fix their column widths and frozen panes before the first row goes
+out, so a sheet holds back its first `sample` rows, sizes the columns from them (as the
+old exports did from their first rows) and then streams everything else straight
+through. Explicit `widths` skip the sampling.
+"""
+
+from io import BytesIO
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+from openpyxl.utils import get_column_letter
+
+
+def _border(color=None):
+    side = Side(style="thin", color=color)
+    return Border(left=side, right=side, top=side, bottom=side)
+
+
+def _fill(color):
+    return PatternFill(start_color=color, end_color=color, fill_type="solid")
+
+
+_CENTER_WRAP = {"horizontal": "center", "vertical": "center", "wrap_text": True}
+
+# preset -> NamedStyle arguments
+PRESETS = {
+    "title": {"font": {"bold": True, "size": 14}},
+    "subtitle": {"font": {"size": 11, "italic": True}},
+    "note": {"font": {"size": 10, "color": "64748b"}},
+    # Centred banner rows of the master exports
+    "company": {"font": {"bold": True, "size": 14, "color": "1e293b"},
+                "alignment": {"horizontal": "center"}},
+    "heading": {"font": {"bold": True, "size": 12, "color": "4f46e5"},
+                "alignment": {"horizontal": "center"}},
+    "banner_note": {"font": {"size": 10, "color": "64748b"}, "alignment": {"horizontal": "center"}},
+    "footer": {"font": {"bold": True, "size": 10, "color": "64748b"}},
+    # Blue / green headers on black borders (sales and scheme exports)
+    "header": {"font": {"bold": True, "size": 11, "color": "FFFFFF"}, "fill": "4472C4",
+               "alignment": _CENTER_WRAP, "border": None},
+    "header_green": {"font": {"bold": True, "size": 11, "color": "FFFFFF"}, "fill": "217346",
+                     "alignment": _CENTER_WRAP, "border": None},
+    "cell": {"border": None},
+    "group": {"font": {"bold": True, "size": 11}, "fill": "D9E2F3", "border": None},
+    # Slate headers on grey borders (master and ranking exports)
+    "header_dark": {"font": {"bold": True, "size": 10, "color": "FFFFFF"}, "fill": "1e293b",
+                    "alignment": _CENTER_WRAP, "border": "d1d5db"},
+    "cell_light": {"border": "d1d5db"},
+    "cell_wrap": {"alignment": {"vertical": "center", "wrap_text": True}, "border": "d1d5db"},
+    "cell_wrap_alt": {"alignment": {"vertical": "center", "wrap_text": True}, "border": "d1d5db",
+                      "fill": "f8fafc"},
+}
+
+
+def _named_style(preset):
+    spec = PRESETS[preset]
+    style = NamedStyle(name=f"scanify {preset}")
+    if "font" in spec:
+        style.font = Font(**spec["font"])
+    if "fill" in spec:
+        style.fill = _fill(spec["fill"])
+    if "alignment" in spec:
+        style.alignment = Alignment(**spec["alignment"])
+    if "border" in spec:
+        style.border = _border(spec["border"])
+    return style
+
+
+class XlsxStream:
+    """A write-only workbook whose sheets stream their rows to disk."""
+
+    def __init__(self):
+        self._wb = Workbook(write_only=True)
+        self._styles = set()
+        self._sheets = []
+
+    def style(self, preset):
+        """Registered name of a preset, registering it on first use."""
+        if preset not in self._styles:
+            self._wb.add_named_style(_named_style(preset))
+            self._styles.add(preset)
+        return f"scanify {preset}"
+
+    def sheet(self, title, widths=None, freeze=None, pad=4, max_width=50, sample=100):
+        """Add a sheet. `widths` (one per column) skips width sampling; otherwise the
+        first `sample` rows size the columns at min(longest value + pad, max_width)."""
+        sheet = StreamSheet(self, title, widths, freeze, pad, max_width, sample)
+        self._sheets.append(sheet)
+        return sheet
+
+    def save(self, target=None):
+        """Write the workbook to `target` (a path or file object), or return its bytes.
+        A streamed workbook can be saved once."""
+        for sheet in self._sheets:
+            sheet.close()
+        if target is not None:
+            self._wb.save(target)
+            return target
+        output = BytesIO()
+        self._wb.save(output)
+        return output.getvalue()
+
+
+class StreamSheet:
+    def __init__(self, book, title, widths, freeze, pad, max_width, sample):
+        self._book = book
+        self._ws = book._wb.create_sheet(title=title[:31])
+        self._widths = list(widths) if widths else None
+        self._freeze = freeze
+        self._pad = pad
+        self._max_width = max_width
+        self._sample = sample
+        self._measured = {}
+        self._pending = []
+        self._sampled = 0
+        self._streaming = False
+        self.columns = len(self._widths or [])
+        self.row_count = 0
+
+    # ── Output ──
+
+    def _cells(self, values, preset):
+        if not preset:
+            return list(values)
+        name = self._book.style(preset)
+        cells = []
+        for value in values:
+            cell = WriteOnlyCell(self._ws, value=value)
+            cell.style = name
+            cells.append(cell)
+        return cells
+
+    def _emit(self, values, preset, measure=True):
+        values = list(values)
+        self.row_count += 1
+        if self._streaming:
+            self._ws.append(self._cells(values, preset))
+            return
+        self._pending.append((values, preset))
+        if measure and self._widths is None:
+            for col, value in enumerate(values, 1):
+                if value is not None and value != "":
+                    self._measured[col] = max(self._measured.get(col, 0), len(str(value)))
+        self._sampled += measure
+        if self._widths is not None or self._sampled >= self._sample:
+            self._start_streaming()
+
+    def _start_streaming(self):
+        if self._widths is not None:
+            widths = dict(enumerate(self._widths, 1))
+        else:
+            widths = {col: min(length + self._pad, self._max_width)
+                      for col, length in self._measured.items()}
+        for col, width in widths.items():
+            self._ws.column_dimensions[get_column_letter(col)].width = width
+        if self._freeze:
+            self._ws.freeze_panes = self._freeze
+        self._streaming = True
+        for values, preset in self._pending:
+            self._ws.append(self._cells(values, preset))
+        self._pending = []
+
+    def close(self):
+        if not self._streaming:
+            self._start_streaming()
+
+    # ── Rows ──
+
+    def title(self, title, subtitle="", note="", title_style="title",
+              subtitle_style="subtitle", note_style="note", gap=1):
+        """Title and subtitle rows (an empty subtitle leaves its row blank), an
+        optional note row, then `gap` blank rows; none of them count towards widths.
+        Returns the row numbers of the title, subtitle and note rows."""
+        lines = [(title, title_style), (subtitle, subtitle_style)]
+        if note:
+            lines.append((note, note_style))
+        written = []
+        for text, preset in lines:
+            self._emit([text] if text else [], preset if text else None, measure=False)
+            written.append(self.row_count)
+        for _ in range(gap):
+            self.blank()
+        return written
+
+    def blank(self):
+        self._emit([], None, measure=False)
+
+    def merge(self, start_col, end_col, row):
+        """Merge columns of a written row (row_count is the last one written)."""
+        self._ws.merged_cells.add(
+            f"{get_column_letter(start_col)}{row}:{get_column_letter(end_col)}{row}")
+
+    def header(self, labels, style="header"):
+        self.columns = max(self.columns, len(labels))
+        self._emit(labels, style)
+
+    def row(self, values, style="cell"):
+        self._emit(values, style)
+
+    def rows(self, rows, template=None, style="cell", alt_style=None):
+        """Stream `rows` (any iterable, consumed once) through `template`; every other
+        row takes `alt_style` when given. Returns the number of rows written."""
+        if template is None:
+            to_values = list
+        elif callable(template):
+            to_values = template
+        else:
+            keys = list(template)
+            def to_values(r):
+                return [r.get(k, "") for k in keys]
+        count = 0
+        for count, r in enumerate(rows, 1):
+            self._emit(to_values(r), alt_style if alt_style and count % 2 == 0 else style)
+        return count
+
+    def group(self, label, values=None, style="group"):
+        """A row styled across all columns: `label` in column A and `values` as
+        {column number: value}."""
+        cells = [label] + [None] * (max(self.columns, 1) - 1)
+        for col, value in (values or {}).items():
+            cells[col - 1] = value
+        self._emit(cells, style)
+
+    totals = group